@@ -46,6 +46,10 @@ public class PatientDemographicsAnalysis {
             org.apache.hadoop.mapreduce.Counters counters = job.getCounters();
             System.out.println("Malformed Records: " +
                     counters.findCounter("DATA_QUALITY", "MALFORMED_RECORDS").getValue());
+            for (String reason : new String[] { "EMPTY_FIELDS", "INVALID_AGE", "NEGATIVE_LEAD_TIME" }) {
+                System.out.println("Rejected Records (" + reason + "): " +
+                        counters.findCounter("DATA_QUALITY", reason).getValue());
+            }
         } else {
             System.out.println("Job failed!");
             System.exit(1);
@@ -38,15 +38,19 @@ public class PatientDemographicsMapper extends Mapper<Object, Text, Text, IntWri
             // Validate data completeness
             if (gender.isEmpty() || ageStr.isEmpty() || noShow.isEmpty() ||
                     scheduledDay.isEmpty() || appointmentDay.isEmpty()) {
+                context.getCounter("DATA_QUALITY", "EMPTY_FIELDS").increment(1);
                 return;
             }
 
             int age;
             try {
                 age = Integer.parseInt(ageStr);
-                if (age < 0 || age > 120)
+                if (age < 0 || age > 120) {
+                    context.getCounter("DATA_QUALITY", "INVALID_AGE").increment(1);
                     return; // Filter invalid ages
+                }
             } catch (NumberFormatException e) {
+                context.getCounter("DATA_QUALITY", "INVALID_AGE").increment(1);
                 return;
             }
 
@@ -55,6 +59,7 @@ public class PatientDemographicsMapper extends Mapper<Object, Text, Text, IntWri
             // === 1. Scheduling Lead Time Analysis ===
             boolean valid = analyzeSchedulingLeadTime(context, scheduledDay, appointmentDay, attendanceStatus);
             if (!valid) {
+                context.getCounter("DATA_QUALITY", "NEGATIVE_LEAD_TIME").increment(1);
                 return; // Skip further analysis for invalid lead time records
             }
 
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+In-Process Patient Demographics Aggregation Engine
+zeli8888.ccproject.patient_behavior
+
+Reproduces PatientDemographicsMapper + PatientDemographicsReducer with
+vectorized pandas/NumPy operations, reading the appointment CSV directly
+out of data/archive.zip.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+import zipfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from key_grammar import format_key
+
+ARCHIVE_PATH = 'data/archive.zip'
+CSV_MEMBER = 'KaggleV2-May-2016.csv'
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# PatientId,AppointmentID,Gender,ScheduledDay,AppointmentDay,Age,Neighbourhood,Scholarship,Hipertension,Diabetes,Alcoholism,Handcap,SMS_received,No-show
+FIELD_COUNT = 14
+(PATIENT_ID, APPOINTMENT_ID, GENDER, SCHEDULED_DAY, APPOINTMENT_DAY, AGE, NEIGHBOURHOOD,
+ SCHOLARSHIP, HYPERTENSION, DIABETES, ALCOHOLISM, HANDICAP, SMS_RECEIVED, NO_SHOW) = range(FIELD_COUNT)
+
+# Java's String.trim() strips every char <= U+0020
+JAVA_WHITESPACE = ''.join(chr(c) for c in range(0x21))
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# Row outcomes; the mapper checks fields, emptiness, age, dates, then lead time
+VALID = 0
+MALFORMED = 1          # exception in map(): missing fields
+EMPTY_FIELD = 2        # gender/age/no-show/dates empty after trim
+INVALID_AGE = 3        # not an int or outside 0..120
+NEGATIVE_LEAD_TIME = 4
+HEADER = 5
+INVALID_DATE = 6       # exception in map(): unparseable dates
+OUTCOME_COUNT = 7
+# Outcomes the Java mapper counts as DATA_QUALITY.MALFORMED_RECORDS
+JAVA_MALFORMED = [MALFORMED, INVALID_DATE]
+
+LEAD_TIME_BINS = np.array([0, 3, 7, 30, 90])
+LEAD_TIME_CATEGORIES = np.array(['SAME_DAY', 'SHORT', 'MEDIUM', 'LONG', 'VERY_LONG', 'EXTREMELY_LONG'])
+AGE_GROUP_BINS = np.array([18, 35, 55])
+AGE_GROUP_CATEGORIES = np.array(['CHILDREN_YOUTH', 'YOUNG_ADULTS', 'MIDDLE_AGED', 'SENIORS'])
+
+
+def open_appointments(path=ARCHIVE_PATH, member=CSV_MEMBER):
+    """Open the appointment CSV as text, streaming it out of a zip if needed"""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        raw = archive.open(member)
+    else:
+        raw = open(path, 'rb')
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+
+
+def iter_text_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield blocks of roughly chunk_size characters that end on a line boundary"""
+    while True:
+        text = stream.read(chunk_size)
+        if not text:
+            return
+        text += stream.readline()
+        if not text.endswith('\n'):
+            text += '\n'
+        yield text
+
+
+def split_fields(text):
+    """Split a block of CSV lines into FIELD_COUNT string columns plus the Java field count"""
+    try:
+        parts = pd.read_csv(io.StringIO(text), header=None, names=range(FIELD_COUNT),
+                            dtype=object, na_filter=False, quoting=csv.QUOTE_NONE,
+                            skip_blank_lines=False, engine='c')
+        # Extra fields on the first line make read_csv turn the surplus into an index
+        if len(parts) != text.count('\n') or not isinstance(parts.index, pd.RangeIndex):
+            raise ValueError("line count mismatch")
+        columns = [parts[i].to_numpy(dtype=object) for i in range(FIELD_COUNT)]
+        # At most FIELD_COUNT fields, so the line is complete iff the last one is set
+        field_count = np.where(columns[-1] != '', FIELD_COUNT, FIELD_COUNT - 1)
+        return columns, field_count
+    except (pd.errors.ParserError, ValueError):
+        pass
+
+    # Lines with extra fields: fall back to a plain split
+    parts = pd.Series(text[:-1].split('\n'), dtype=object).str.split(',', expand=True)
+    parts = parts.reindex(columns=range(max(FIELD_COUNT, parts.shape[1]))).fillna('')
+    columns = [parts[i].to_numpy(dtype=object) for i in range(parts.shape[1])]
+    # String.split(",") drops trailing empty strings, so the usable field
+    # count is one past the last non-empty field
+    nonempty = np.column_stack([c != '' for c in columns])
+    field_count = np.where(nonempty.any(axis=1), nonempty.shape[1] - np.argmax(nonempty[:, ::-1], axis=1), 0)
+    return columns[:FIELD_COUNT], field_count
+
+
+def trim(column):
+    """Vectorized Java String.trim(), applied once per distinct value"""
+    codes, uniques = pd.factorize(column)
+    trimmed = np.array([value.strip(JAVA_WHITESPACE) for value in uniques], dtype=object)
+    return trimmed[codes] if len(trimmed) else np.array([''] * len(column), dtype=object)
+
+
+def is_blank(column):
+    """trim(column) == '' without trimming every value"""
+    blank = column == ''
+    leading = ~blank & (np.asarray(column).astype('U1') <= ' ')
+    if leading.any():
+        blank[leading] = trim(column[leading]) == ''
+    return blank
+
+
+def equals_ignore_case(column, text):
+    """Vectorized String.equalsIgnoreCase against a constant"""
+    codes, uniques = pd.factorize(column)
+    matches = np.array([value.lower() == text for value in uniques], dtype=bool)
+    return matches[codes] if len(matches) else np.zeros(len(column), dtype=bool)
+
+
+def parse_dates(column):
+    """Day numbers for 'YYYY-MM-DD...' strings; -1 and a False mask where LocalDate.parse would fail"""
+    # trim().substring(0, 10) only differs from a plain 10-char prefix
+    # when there is leading whitespace, which is rare enough to do slowly
+    prefix = np.asarray(column).astype('U10')
+    leading = np.asarray(column).astype('U1') <= ' '
+    if leading.any():
+        prefix[leading] = trim(column[leading]).astype('U10')
+    codes, uniques = pd.factorize(prefix)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques.where(uniques.str.len() == 10, None), format='%Y-%m-%d', errors='coerce')
+    ok = parsed.notna().to_numpy()
+    unique_days = np.full(len(uniques), -1, dtype='int32')
+    unique_days[ok] = (parsed[ok].to_numpy().astype('datetime64[D]') - EPOCH).astype('int32')
+    return unique_days[codes], ok[codes]
+
+
+def parse_ids(column):
+    """Numeric patient IDs as int64 (-1 where unparseable)"""
+    try:
+        values = np.asarray(column).astype('U32').astype('float64')
+    except ValueError:
+        values = pd.to_numeric(pd.Series(column, dtype=object), errors='coerce').to_numpy(dtype='float64')
+    return np.where(np.isfinite(values), values, -1).astype('int64')
+
+
+def parse_chunk(text):
+    """Parse a block of CSV lines into typed appointment records and a per-line outcome code"""
+    columns, field_count = split_fields(text)
+    n = len(field_count)
+    outcome = np.full(n, VALID, dtype='int8')
+
+    header = columns[PATIENT_ID] == 'PatientId'
+    outcome[header] = HEADER
+    outcome[(outcome == VALID) & (field_count < FIELD_COUNT)] = MALFORMED
+
+    fields = {i: trim(columns[i]) for i in (GENDER, AGE, NEIGHBOURHOOD, SCHOLARSHIP, HYPERTENSION,
+                                             DIABETES, ALCOHOLISM, HANDICAP, SMS_RECEIVED, NO_SHOW)}
+    empty = ((fields[GENDER] == '') | (fields[AGE] == '') | (fields[NO_SHOW] == '') |
+             is_blank(columns[SCHEDULED_DAY]) | is_blank(columns[APPOINTMENT_DAY]))
+    outcome[(outcome == VALID) & empty] = EMPTY_FIELD
+
+    # Integer.parseInt: optional sign and digits only
+    age_codes, age_uniques = pd.factorize(fields[AGE])
+    age_uniques = pd.Series(age_uniques, dtype=object)
+    is_int = age_uniques.str.fullmatch(r'[+-]?\d{1,10}').fillna(False).to_numpy(dtype=bool)
+    unique_ages = np.full(len(age_uniques), -1, dtype='int64')
+    unique_ages[is_int] = age_uniques[is_int].astype('int64').to_numpy()
+    age = unique_ages[age_codes]
+    outcome[(outcome == VALID) & (~is_int[age_codes] | (age < 0) | (age > 120))] = INVALID_AGE
+
+    scheduled, scheduled_ok = parse_dates(columns[SCHEDULED_DAY])
+    appointment, appointment_ok = parse_dates(columns[APPOINTMENT_DAY])
+    outcome[(outcome == VALID) & ~(scheduled_ok & appointment_ok)] = INVALID_DATE
+    lead_days = appointment.astype('int64') - scheduled
+    outcome[(outcome == VALID) & (lead_days < 0)] = NEGATIVE_LEAD_TIME
+
+    valid = outcome == VALID
+    hypertension = fields[HYPERTENSION][valid]
+    diabetes = fields[DIABETES][valid]
+    alcoholism = fields[ALCOHOLISM][valid]
+    handicap = fields[HANDICAP][valid]
+    no_show = fields[NO_SHOW][valid]
+    records = pd.DataFrame({
+        'patient_id': parse_ids(columns[PATIENT_ID][valid]),
+        'gender': pd.Categorical(fields[GENDER][valid]),
+        'scheduled_day': scheduled[valid],
+        'appointment_day': appointment[valid],
+        'lead_days': lead_days[valid].astype('int32'),
+        'age': age[valid].astype('int16'),
+        'neighbourhood': pd.Categorical(fields[NEIGHBOURHOOD][valid]),
+        'scholarship': fields[SCHOLARSHIP][valid] == '1',
+        'hypertension': hypertension == '1',
+        'diabetes': diabetes == '1',
+        'alcoholism': alcoholism == '1',
+        'handicap': handicap != '0',
+        'healthy': (hypertension == '0') & (diabetes == '0') & (alcoholism == '0') & (handicap == '0'),
+        'sms': fields[SMS_RECEIVED][valid] == '1',
+        'noshow': equals_ignore_case(no_show, 'yes')
+    })
+    return records, outcome
+
+
+def categorize_lead_time(lead_days):
+    """Vectorized PatientDemographicsMapper.categorizeLeadTime"""
+    return LEAD_TIME_CATEGORIES[np.searchsorted(LEAD_TIME_BINS, lead_days, side='left')]
+
+
+def categorize_age(age):
+    """Vectorized PatientDemographicsMapper.categorizeAge"""
+    return AGE_GROUP_CATEGORIES[np.searchsorted(AGE_GROUP_BINS, age, side='left')]
+
+
+def detailed_age_start(age):
+    """First year of the 10-year band used by getDetailedAgeGroup"""
+    return (np.asarray(age) // 10) * 10
+
+
+def disease_count(records):
+    """Vectorized PatientDemographicsMapper.countDiseases"""
+    return (records['hypertension'].to_numpy().astype('int8') + records['diabetes'].to_numpy() +
+            records['alcoholism'].to_numpy() + records['handicap'].to_numpy())
+
+
+def _count_keys(counts, prefix, categories, noshow, mask=None, label=str):
+    """Add (category, status) group sizes to counts under prefix"""
+    if mask is not None:
+        categories = categories[mask]
+        noshow = noshow[mask]
+    codes, uniques = pd.factorize(categories)
+    if len(uniques) == 0:
+        return
+    sizes = np.bincount(codes * 2 + noshow, minlength=2 * len(uniques)).reshape(-1, 2)
+    for category, (attended, noshows) in zip(uniques, sizes.tolist()):
+        name = label(category)
+        if attended:
+            counts[format_key(prefix, name, 'Attended')] += attended
+        if noshows:
+            counts[format_key(prefix, name, 'NoShow')] += noshows
+
+
+def aggregate_records(records, counts=None):
+    """Fold parsed records into mapper key counts"""
+    counts = Counter() if counts is None else counts
+    noshow = records['noshow'].to_numpy()
+
+    _count_keys(counts, 'LEAD_TIME_', categorize_lead_time(records['lead_days'].to_numpy()), noshow)
+    _count_keys(counts, 'GENDER_', records['gender'].to_numpy(dtype=object), noshow)
+
+    age = records['age'].to_numpy()
+    _count_keys(counts, 'AGE_GROUP_', categorize_age(age), noshow)
+    _count_keys(counts, 'DETAILED_AGE_', detailed_age_start(age), noshow,
+                label=lambda start: f"{start}-{start + 9}")
+
+    neighbourhood = records['neighbourhood'].to_numpy(dtype=object)
+    _count_keys(counts, 'NEIGHBOURHOOD_', neighbourhood, noshow,
+                mask=(neighbourhood != '') & (neighbourhood != 'NULL'))
+
+    for flag, condition in (('hypertension', 'HYPERTENSION'), ('diabetes', 'DIABETES'),
+                            ('alcoholism', 'ALCOHOLISM'), ('handicap', 'HANDICAP'),
+                            ('healthy', 'HEALTHY')):
+        mask = records[flag].to_numpy()
+        for status, hits in (('Attended', mask & ~noshow), ('NoShow', mask & noshow)):
+            total = int(hits.sum())
+            if total:
+                counts[format_key('HEALTH_', condition, status)] += total
+    diseases = disease_count(records)
+    _count_keys(counts, 'HEALTH_MULTIPLE_DISEASES_', diseases, noshow, mask=diseases >= 2)
+
+    sms = np.where(records['sms'].to_numpy(), 'SMS_RECEIVED', 'NO_SMS')
+    _count_keys(counts, 'SMS_', sms, noshow)
+    return counts
+
+
+def aggregate(path=ARCHIVE_PATH, chunk_size=DEFAULT_CHUNK_SIZE, member=CSV_MEMBER, sketch=None, quality=None):
+    """Stream the CSV in bounded chunks; return (key counts, outcome counts)
+
+    When sketch (a sketches.SketchState) is given, every chunk is folded into it too.
+    When quality (a data_quality.QualityStage) is given, every chunk's rejects are
+    counted and quarantined by it.
+    """
+    counts = Counter()
+    outcomes = np.zeros(OUTCOME_COUNT, dtype='int64')
+    with open_appointments(path, member) as stream:
+        for text in iter_text_chunks(stream, chunk_size):
+            records, outcome = parse_chunk(text)
+            aggregate_records(records, counts)
+            if sketch is not None:
+                sketch.add(records)
+            if quality is not None:
+                quality.add(text, outcome)
+            outcomes += np.bincount(outcome, minlength=len(outcomes))
+    return counts, outcomes
+
+
+def format_results(counts):
+    """Render counts exactly like Hadoop's TextOutputFormat (keys in byte order)"""
+    keys = sorted(counts, key=lambda k: k.encode('utf-8'))
+    return ''.join(f"{key}\t{counts[key]}\n" for key in keys).encode('utf-8')
+
+
+def write_results(counts, output_path):
+    """Write counts to a result file the dashboard can load"""
+    with open(output_path, 'wb') as f:
+        f.write(format_results(counts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute patient demographics counters without Hadoop")
+    parser.add_argument('--input', default=ARCHIVE_PATH, help="appointment CSV or zip archive")
+    parser.add_argument('--member', default=CSV_MEMBER, help="CSV file name inside the zip archive")
+    parser.add_argument('--output', default='patient_demographics_results.txt')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="characters parsed per chunk; bounds peak memory on large extracts")
+    parser.add_argument('--sketches', default=None,
+                        help="also write unique-patient and heavy-hitter sketches to this .npz")
+    parser.add_argument('--quarantine', default=None,
+                        help="file for rejected lines with their byte offsets "
+                             "(default: next to the output; empty to skip)")
+    parser.add_argument('--ledger', default=None,
+                        help="incremental ingestion ledger to restart from this build's input "
+                             "(default: data/ingest_ledger.json when writing the ingested result file; "
+                             "empty to skip)")
+    args = parser.parse_args(argv)
+
+    print("Starting Patient Demographics Analysis...")
+    print("Input Path: " + args.input)
+    print("Output Path: " + args.output)
+
+    import data_quality
+    start_time = time.perf_counter()
+    sketch = None
+    if args.sketches:
+        from sketches import SketchState
+        sketch = SketchState()
+    quarantine_path = data_quality.quarantine_path(args.output) if args.quarantine is None else args.quarantine
+    with open(quarantine_path or os.devnull, 'w', encoding='utf-8') as quarantine:
+        quality = data_quality.QualityStage(args.input, quarantine if quarantine_path else None)
+        counts, outcomes = aggregate(args.input, args.chunk_size, args.member, sketch, quality)
+    write_results(counts, args.output)
+    data_quality.write_counters(quality.counters(), data_quality.quality_path(args.output))
+    # Later incremental ingests of the same input must not count it a second time
+    import incremental_ingest
+    ledger = args.ledger
+    if ledger is None and os.path.abspath(args.output) == os.path.abspath(incremental_ingest.RESULTS_PATH):
+        ledger = incremental_ingest.LEDGER_PATH
+    if ledger:
+        incremental_ingest.seed_ledger(args.input, ledger)
+    if sketch is not None:
+        sketch.save(args.sketches)
+    end_time = time.perf_counter()
+
+    print("Analysis completed successfully!")
+    print(f"Execution Time: {(end_time - start_time) * 1000:.0f} ms")
+    print(f"Records Counted: {outcomes[VALID]}")
+    print(f"Malformed Records: {outcomes[JAVA_MALFORMED].sum()}")
+    print("Rejected Records: " + ", ".join(f"{reason} {count}" for reason, count
+                                            in quality.counters()['rejected'].items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Headless JSON API
+zeli8888.ccproject.patient_behavior
+
+Serves the dashboard's statistics over HTTP/JSON from an asyncio event
+loop, reading through the same result and cube caches as the Streamlit
+app. Every response body is serialized once per data version and carries
+a strong ETag, so pollers revalidating with If-None-Match get a 304 from
+memory without touching the data layer.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+from count_cube import CUBE_PATH, FILTER_AXES, get_cube_cache, parse_filters
+from key_grammar import DIMENSIONS
+from result_cache import file_version, get_result_cache
+from result_shards import IncompleteOutputError
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8502
+DATA_FILE = 'patient_demographics_results.txt'
+POLL_SECONDS = 1.0
+SLICE_CACHE_SIZE = 256
+MAX_HEADER_LINES = 100
+
+Response = namedtuple('Response', ['status', 'etag', 'body', 'head'])
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 503: 'Service Unavailable'}
+
+
+def _json_default(value):
+    # NumPy scalars from the frames
+    return value.item()
+
+
+def make_response(status, payload):
+    """Serialize payload once, with its ETag and pre-rendered headers"""
+    body = json.dumps(payload, default=_json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"ETag: {etag}\r\n"
+            f"Cache-Control: no-cache\r\n").encode('latin-1')
+    return Response(status, etag, body, head)
+
+
+def error(status, message):
+    return make_response(status, {'error': message})
+
+
+def view_payload(view):
+    """Column names plus row lists of a display frame"""
+    return {'columns': list(view.columns), 'rows': view.to_numpy().tolist()}
+
+
+def slice_response(cube, tag, filters):
+    """Response for one cube slice (runs off the event loop)"""
+    views = cube.views(filters)
+    return make_response(200, {
+        'version': tag,
+        'filters': {axis: list(values) for axis, values in filters},
+        'dimensions': {dimension: view_payload(view) for dimension, view in views.items()}})
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header value covers etag (weak comparison)"""
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith('W/') else tag) == etag:
+            return True
+    return False
+
+
+class ApiServer:
+    """Precomputed responses for one data version, rebuilt when the files change"""
+
+    def __init__(self, data_file=DATA_FILE, cube_file=CUBE_PATH, poll_seconds=POLL_SECONDS):
+        self.data_file = data_file
+        self.cube_file = cube_file
+        self.poll_seconds = poll_seconds
+        self.version = None
+        self.tag = None
+        self.responses = {}
+        self.cube = None
+        self.slices = OrderedDict()
+        self.requests = 0
+        self.not_modified = 0
+        self.problem = None
+
+    def current_version(self):
+        """(result file version, cube version or None)"""
+        try:
+            cube_version = file_version(self.cube_file)
+        except FileNotFoundError:
+            cube_version = None
+        return file_version(self.data_file), cube_version
+
+    def build(self, version):
+        """Every fixed response for version (runs off the event loop)"""
+        snapshot = get_result_cache().get(self.data_file)
+        cube = get_cube_cache().get(self.cube_file) if version[1] is not None else None
+        tag = hashlib.blake2b(repr(version).encode('utf-8'), digest_size=8).hexdigest()
+        responses = {
+            '/api/version': make_response(200, {
+                'version': tag,
+                'results': {'file': os.path.basename(version[0][0]), 'mtime_ns': version[0][1]},
+                'cube': version[1] is not None,
+            }),
+            '/api/dimensions': make_response(200, {'version': tag, 'dimensions': list(DIMENSIONS)}),
+            '/api/rates': make_response(200, {'version': tag, 'rates': {
+                dimension: dict(zip(view.iloc[:, 0].tolist(), view['No_Show_Rate'].tolist()))
+                for dimension, view in snapshot.views.items()}}),
+            '/api/stats': make_response(200, {'version': tag, 'dimensions': {
+                dimension: view_payload(view) for dimension, view in snapshot.views.items()}}),
+        }
+        for dimension, view in snapshot.views.items():
+            responses['/api/stats/' + dimension] = make_response(200, dict(
+                {'version': tag, 'dimension': dimension}, **view_payload(view)))
+        if cube is not None:
+            responses['/api/cube/options'] = make_response(200, {'version': tag, 'axes': {
+                axis: cube.options(axis) for axis in FILTER_AXES}})
+        return tag, responses, cube
+
+    async def refresh(self):
+        """Rebuild the responses if a file changed; True when a new version was installed
+
+        Missing, incomplete or half-written files keep the current version (503
+        before the first one) until a later poll finds them valid.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            version = self.current_version()
+            if version == self.version:
+                return False
+            tag, responses, cube = await loop.run_in_executor(None, self.build, version)
+        except (FileNotFoundError, IncompleteOutputError, ValueError) as e:
+            if str(e) != self.problem:
+                print(f"Data not ready: {e}", file=sys.stderr)
+            self.problem = str(e)
+            return False
+        self.problem = None
+        # One assignment each, so requests see either the old or the new version
+        self.slices = OrderedDict()
+        self.cube = cube
+        self.responses = responses
+        self.tag = tag
+        self.version = version
+        return True
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Refresh failed: {e}", file=sys.stderr)
+
+    async def cube_slice(self, query):
+        """Response for /api/cube?axis=label,label&..., memoized per data version"""
+        cube, tag, slices = self.cube, self.tag, self.slices
+        if cube is None:
+            return error(404, "No count cube loaded")
+        key = parse_filters(query)
+        try:
+            cube.check_filters(key)
+        except ValueError as e:
+            return error(400, str(e))
+        response = slices.get(key)
+        if response is None:
+            # Cold slices are computed and serialized off the event loop, like build()
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, slice_response, cube, tag, key)
+            slices[key] = response
+            if len(slices) > SLICE_CACHE_SIZE:
+                slices.popitem(last=False)
+        else:
+            slices.move_to_end(key)
+        return response
+
+    async def route(self, target):
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        if path == '/api/cube':
+            return await self.cube_slice(url.query)
+        response = self.responses.get(path)
+        if response is None:
+            if not self.responses:
+                return error(503, "Data not loaded yet")
+            return error(404, f"No such endpoint: {path}")
+        return response
+
+    async def respond(self, method, target, headers):
+        """Full HTTP response bytes for one request"""
+        self.requests += 1
+        if method not in ('GET', 'HEAD'):
+            response = error(405, "Only GET and HEAD are supported")
+        else:
+            response = await self.route(target)
+        date = f"Date: {formatdate(usegmt=True)}\r\n".encode('latin-1')
+        match = headers.get('if-none-match')
+        if response.status == 200 and match is not None and etag_matches(match, response.etag):
+            self.not_modified += 1
+            return (f"HTTP/1.1 304 Not Modified\r\nETag: {response.etag}\r\n"
+                    f"Cache-Control: no-cache\r\n").encode('latin-1') + date + b"\r\n"
+        body = b"" if method == 'HEAD' else response.body
+        return response.head + date + b"\r\n" + body
+
+    async def handle(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                for _ in range(MAX_HEADER_LINES):
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    response = error(400, "Malformed request line")
+                    writer.write(response.head + b"Connection: close\r\n\r\n" + response.body)
+                    break
+                method, target, protocol = parts
+                length = int(headers.get('content-length', '0') or 0)
+                if length:
+                    await reader.readexactly(length)
+                writer.write(await self.respond(method, target, headers))
+                await writer.drain()
+                connection = headers.get('connection', '').lower()
+                if connection == 'close' or (protocol == 'HTTP/1.0' and connection != 'keep-alive'):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        await self.refresh()
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        poller = asyncio.ensure_future(self.poll())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard statistics as a JSON API")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--results', default=DATA_FILE, help="result file, output directory or glob")
+    parser.add_argument('--cube', default=CUBE_PATH)
+    parser.add_argument('--poll-seconds', type=float, default=POLL_SECONDS,
+                        help="how often to check the files for a new data version")
+    args = parser.parse_args(argv)
+
+    server = ApiServer(args.results, args.cube, args.poll_seconds)
+    start_time = time.perf_counter()
+    print(f"Starting API Server on http://{args.host}:{args.port}/api/stats ...")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(f"Requests Served: {server.requests} ({server.not_modified} not modified)")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Dashboard and Ingestion Benchmarks
+zeli8888.ccproject.patient_behavior
+
+Times MedicalDashboard.load_data, process_data and every display_* method
+on synthetic result files of growing key counts, and each ingestion engine
+on synthetic appointment CSVs of growing row counts. Display methods run
+against a recording stand-in for Streamlit, so building the DataFrames and
+figures is timed separately from serializing them, once with an empty
+render cache (cold) and then warm. Every run is appended
+to a JSON-lines history and checked against stored thresholds.
+The views over outputs built from raw appointments (patient history,
+sketches, data quality) do not depend on the result file, so they are
+timed per CSV row count on outputs built from that CSV instead.
+The --startup mode instead times cold starts in fresh interpreters,
+split into imports, data load and first render of the overview, with
+and without the prebuilt startup artifact.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+BENCHMARK_DIR = 'data/benchmark'
+HISTORY_PATH = 'data/benchmark/history.jsonl'
+THRESHOLDS_PATH = 'data/benchmark/thresholds.json'
+DEFAULT_KEYS = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+DEFAULT_ROWS = (10 ** 5, 10 ** 6)
+ENGINES = ('aggregation_engine', 'streaming_job', 'columnar_store', 'count_cube')
+STARTUP_MODES = ('parse', 'artifact')
+DEFAULT_TOLERANCE = 0.25
+# Views that read outputs of the raw appointments rather than the result file
+RAW_INPUT_VIEWS = ('display_data_quality', 'display_patient_history', 'display_sketches')
+# Absolute slack so noise on tiny cases is not reported as a regression
+MIN_REGRESSION = {'wall_ms': 5.0, 'peak_rss_mb': 16.0}
+
+
+class _NullBlock:
+    """Stand-in for st and its containers: records charts and tables, renders nothing"""
+
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    @property
+    def sidebar(self):
+        return self
+
+    def columns(self, spec, **kwargs):
+        return [_NullBlock(self._recorder) for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def expander(self, *args, **kwargs):
+        return _NullBlock(self._recorder)
+
+    def container(self, *args, **kwargs):
+        return _NullBlock(self._recorder)
+
+    def selectbox(self, label, options, index=0, **kwargs):
+        options = list(options)
+        return options[index] if options else None
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return list(default or [])
+
+    def number_input(self, label, min_value=None, value='min', **kwargs):
+        return min_value if value == 'min' else value
+
+    def plotly_chart(self, figure, *args, **kwargs):
+        self._recorder.append(('chart', figure))
+
+    def dataframe(self, data, *args, **kwargs):
+        self._recorder.append(('table', data))
+
+    table = dataframe
+
+
+def serialize(kind, obj):
+    """What Streamlit does to ship an element to the browser"""
+    if kind == 'chart':
+        if isinstance(obj, dict):   # startup payloads; Streamlit builds the figure first
+            import plotly.graph_objects as go
+            obj = go.Figure(obj)
+        return obj.to_json()
+    import pyarrow as pa
+    from pandas.io.formats.style import Styler
+    if isinstance(obj, Styler):
+        obj.to_html()   # apply every cell format
+        obj = obj.data
+    return pa.Table.from_pandas(obj)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (or its largest child) so far"""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _timed(fn, repeat):
+    """(median wall ms, last result) of repeat calls"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start_time) * 1000)
+    times.sort()
+    return times[len(times) // 2], result
+
+
+def _bare_dashboard(result_file, recorder):
+    """Dashboard over result_file with private caches, rendering into recorder"""
+    # Bare mode: silence the missing ScriptRunContext warnings
+    import streamlit.logger
+    streamlit.logger.set_log_level('ERROR')
+    import medical_dashboard
+    from render_cache import RenderCache
+    from result_cache import ResultCache
+
+    medical_dashboard.st = _NullBlock(recorder)
+    # No startup artifact, and no cube or time series built from other data
+    return medical_dashboard.MedicalDashboard(result_file, cube_file='', series_file='',
+                                              cache=ResultCache(), renders=RenderCache())
+
+
+def _bench_views(dashboard, recorder, views, repeat):
+    """{stage: (wall ms, peak RSS)} of building (cold and warm) and serializing every view"""
+    results = {}
+    for name, view in views.items():
+        def build():
+            del recorder[:]
+            view()
+            return list(recorder)
+        # Cold: figures and tables built from scratch; warm: served by the render cache
+        dashboard.renders.clear()
+        wall, elements = _timed(build, 1)
+        results[name + '/cold'] = wall, peak_rss_mb()
+        wall, elements = _timed(build, repeat)
+        results[name] = wall, peak_rss_mb()
+        wall, _ = _timed(lambda: [serialize(kind, obj) for kind, obj in elements], repeat)
+        results[name + '/serialize'] = wall, peak_rss_mb()
+    return results
+
+
+def bench_dashboard(result_file, repeat):
+    """Time every dashboard stage on one result file; runs in a fresh process"""
+    recorder = []
+    dashboard = _bare_dashboard(result_file, recorder)
+
+    results = {}
+
+    def load():
+        dashboard.cache.invalidate()        # cold: parse the file every time
+        return dashboard.load_data(result_file)
+
+    results['load_data'] = _timed(load, repeat)[0], peak_rss_mb()
+    results['process_data'] = _timed(dashboard.process_data, repeat)[0], peak_rss_mb()
+
+    methods = sorted(name for name in dir(dashboard)
+                     if name.startswith('display_') and name not in ('display_cross_filters',
+                                                                     'display_date_range',
+                                                                     'display_run_comparison')
+                     and name not in RAW_INPUT_VIEWS)
+    results.update(_bench_views(dashboard, recorder, {name: getattr(dashboard, name) for name in methods},
+                                repeat))
+    return results
+
+
+def raw_view_inputs(work_dir):
+    """(result, patient history, sketch, quality) files of the raw-input views in work_dir"""
+    import data_quality
+    result_file = os.path.join(work_dir, 'results.txt')
+    return (result_file, os.path.join(work_dir, 'history_results.txt'), os.path.join(work_dir, 'sketches.npz'),
+            data_quality.quality_path(result_file))
+
+
+def build_raw_view_inputs(csv_path, work_dir):
+    """Build the raw-input view files from one CSV; runs in a fresh process"""
+    import aggregation_engine
+    import data_quality
+    import patient_history
+    from sketches import SketchState
+
+    os.makedirs(work_dir, exist_ok=True)
+    result_file, history_file, sketch_file, quality_file = raw_view_inputs(work_dir)
+    sketch = SketchState()
+    with open(data_quality.quarantine_path(result_file), 'w', encoding='utf-8') as quarantine:
+        quality = data_quality.QualityStage(csv_path, quarantine)
+        counts, _ = aggregation_engine.aggregate(csv_path, sketch=sketch, quality=quality)
+    aggregation_engine.write_results(counts, result_file)
+    data_quality.write_counters(quality.counters(), quality_file)
+    sketch.save(sketch_file)
+    aggregation_engine.write_results(patient_history.analyze(csv_path, work_dir=work_dir)[0], history_file)
+
+
+def bench_raw_views(work_dir, repeat):
+    """Time the patient history, sketch and data-quality views on files built from one CSV; runs in a fresh process"""
+    result_file, history_file, sketch_file, quality_file = raw_view_inputs(work_dir)
+    recorder = []
+    dashboard = _bare_dashboard(result_file, recorder)
+    return _bench_views(dashboard, recorder, {
+        'display_data_quality': lambda: dashboard.display_data_quality(quality_file),
+        'display_patient_history': lambda: dashboard.display_patient_history(history_file),
+        'display_sketches': lambda: dashboard.display_sketches(sketch_file),
+    }, repeat)
+
+
+def bench_startup(result_file, artifact_path):
+    """Time one cold dashboard start up to the serialized overview; runs in a fresh process"""
+    # '' disables the artifact; read when the dashboard modules are imported
+    os.environ['DASHBOARD_STARTUP_ARTIFACT'] = artifact_path or ''
+    results = {}
+    start_time = time.perf_counter()
+    mark = [start_time]
+
+    def stage(name):
+        now = time.perf_counter()
+        results[name] = (now - mark[0]) * 1000, peak_rss_mb()
+        mark[0] = now
+
+    # Paid by the Streamlit server before the script first runs
+    import streamlit.logger
+    streamlit.logger.set_log_level('ERROR')
+    stage('import_streamlit')
+    script_start = mark[0]
+    import medical_dashboard
+    stage('import_dashboard')
+
+    recorder = []
+    medical_dashboard.st = _NullBlock(recorder)
+    overview = medical_dashboard.load_overview(result_file) if artifact_path else None
+    if overview is not None:
+        medical_dashboard.display_startup_overview(overview)
+        [serialize(kind, obj) for kind, obj in recorder]
+        stage('render')
+        results['first_render'] = (mark[0] - script_start) * 1000, peak_rss_mb()
+        medical_dashboard.MedicalDashboard(result_file)
+        stage('load')
+    else:
+        dashboard = medical_dashboard.MedicalDashboard(result_file)
+        stage('load')
+        dashboard.display_overview()
+        [serialize(kind, obj) for kind, obj in recorder]
+        stage('render')
+        results['first_render'] = (mark[0] - script_start) * 1000, peak_rss_mb()
+    return results
+
+
+def build_startup_artifact(result_file, artifact_path):
+    """Prebuild the startup artifact for result_file; runs in a fresh process"""
+    import startup_artifact
+    startup_artifact.build_artifact(result_file, artifact_path)
+
+
+def bench_engine(engine_name, csv_path, work_dir):
+    """Time one ingestion engine over one CSV; runs in a fresh process"""
+    start_time = time.perf_counter()
+    if engine_name == 'aggregation_engine':
+        import aggregation_engine
+        aggregation_engine.write_results(aggregation_engine.aggregate(csv_path)[0],
+                                         os.path.join(work_dir, 'results.txt'))
+    elif engine_name == 'streaming_job':
+        import streaming_job
+        streaming_job.run_local(csv_path, os.path.join(work_dir, 'streaming_output'))
+    elif engine_name == 'columnar_store':
+        import columnar_store
+        columnar_store.build_store(csv_path, os.path.join(work_dir, 'store'))
+    else:
+        import count_cube
+        count_cube.build_cube(csv_path).save(os.path.join(work_dir, 'cube.npz'))
+    return {engine_name: ((time.perf_counter() - start_time) * 1000, peak_rss_mb())}
+
+
+def _run_isolated(fn, *args):
+    """Run fn in a fresh interpreter so peak RSS belongs to this case alone"""
+    # Executor workers are not daemonic, so engines may start their own pools
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def ensure_inputs(keys, rows, data_dir=BENCHMARK_DIR):
+    """Generate (or reuse) the synthetic inputs for every scale"""
+    import synthetic_data
+    os.makedirs(data_dir, exist_ok=True)
+    result_files, csv_files = {}, {}
+    for n in keys:
+        path = os.path.join(data_dir, f"results_{n}.txt")
+        if not os.path.exists(path):
+            synthetic_data.write_result_file(path, n)
+        result_files[n] = path
+    for n in rows:
+        path = os.path.join(data_dir, f"appointments_{n}.csv")
+        if not os.path.exists(path):
+            synthetic_data.write_csv(path, n)
+        csv_files[n] = path
+    return result_files, csv_files
+
+
+def run_benchmarks(keys=DEFAULT_KEYS, rows=DEFAULT_ROWS, engines=ENGINES, repeat=3, data_dir=BENCHMARK_DIR):
+    """{case name: {'wall_ms', 'peak_rss_mb'}} for every scale"""
+    result_files, csv_files = ensure_inputs(keys, rows, data_dir)
+    cases = {}
+    for n, path in result_files.items():
+        for stage, (wall, rss) in _run_isolated(bench_dashboard, path, repeat).items():
+            cases[f"dashboard/keys={n}/{stage}"] = {'wall_ms': round(wall, 2), 'peak_rss_mb': round(rss, 1)}
+    work_dir = os.path.join(data_dir, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    for n, path in csv_files.items():
+        for engine_name in engines:
+            for name, (wall, rss) in _run_isolated(bench_engine, engine_name, path, work_dir).items():
+                cases[f"ingest/rows={n}/{name}"] = {'wall_ms': round(wall, 2), 'peak_rss_mb': round(rss, 1)}
+        # Rebuilt on every run, so the views never read files of another CSV
+        views_dir = os.path.join(work_dir, f"views_{n}")
+        _run_isolated(build_raw_view_inputs, path, views_dir)
+        for stage, (wall, rss) in _run_isolated(bench_raw_views, views_dir, repeat).items():
+            cases[f"views/rows={n}/{stage}"] = {'wall_ms': round(wall, 2), 'peak_rss_mb': round(rss, 1)}
+    return cases
+
+
+def run_startup_benchmarks(keys=DEFAULT_KEYS, repeat=3, data_dir=BENCHMARK_DIR):
+    """{case name: {'wall_ms', 'peak_rss_mb'}} of cold starts at every scale, median of repeat starts"""
+    result_files, _ = ensure_inputs(keys, (), data_dir)
+    cases = {}
+    for n, path in result_files.items():
+        artifact_path = os.path.join(data_dir, f"startup_{n}.pkl")
+        _run_isolated(build_startup_artifact, path, artifact_path)
+        for mode in STARTUP_MODES:
+            runs = [_run_isolated(bench_startup, path, artifact_path if mode == 'artifact' else None)
+                    for _ in range(repeat)]
+            for stage in runs[0]:
+                walls = sorted(run[stage][0] for run in runs)
+                cases[f"startup/keys={n}/{mode}/{stage}"] = {
+                    'wall_ms': round(walls[len(walls) // 2], 2),
+                    'peak_rss_mb': round(max(run[stage][1] for run in runs), 1)
+                }
+    return cases
+
+
+def check_thresholds(cases, thresholds, tolerance=DEFAULT_TOLERANCE):
+    """Messages for every case slower or larger than its threshold plus tolerance"""
+    failures = []
+    for name, limits in thresholds.items():
+        if name not in cases:
+            continue
+        for metric, limit in limits.items():
+            value = cases[name][metric]
+            if value > limit * (1 + tolerance) and value - limit > MIN_REGRESSION[metric]:
+                failures.append(f"{name}: {metric} {value:,.1f} > {limit:,.1f} (+{tolerance:.0%})")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard and the ingestion engines")
+    parser.add_argument('--keys', type=int, nargs='*', default=list(DEFAULT_KEYS),
+                        help="result file sizes in keys")
+    parser.add_argument('--rows', type=int, nargs='*', default=list(DEFAULT_ROWS),
+                        help="appointment CSV sizes in rows (up to 10^8)")
+    parser.add_argument('--engines', nargs='*', choices=ENGINES, default=list(ENGINES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=BENCHMARK_DIR)
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--save-thresholds', action='store_true',
+                        help="store this run's measurements as the new thresholds")
+    parser.add_argument('--startup', action='store_true',
+                        help="only time cold starts (imports, load, first render) with and without the artifact")
+    args = parser.parse_args(argv)
+
+    print("Starting Benchmarks...")
+    start_time = time.perf_counter()
+    if args.startup:
+        cases = run_startup_benchmarks(args.keys, args.repeat, args.data_dir)
+    else:
+        cases = run_benchmarks(args.keys, args.rows, args.engines, args.repeat, args.data_dir)
+    for name, case in cases.items():
+        print(f"{name:<70} {case['wall_ms']:>12,.1f} ms {case['peak_rss_mb']:>10,.1f} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'cases': cases,
+        }) + '\n')
+
+    status = 0
+    if args.save_thresholds:
+        with open(args.thresholds, 'w', encoding='utf-8') as f:
+            json.dump(cases, f, indent=2)
+        print(f"Thresholds saved to {args.thresholds}")
+    elif os.path.exists(args.thresholds):
+        with open(args.thresholds, 'r', encoding='utf-8') as f:
+            failures = check_thresholds(cases, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        status = 1 if failures else 0
+    else:
+        print(f"No thresholds at {args.thresholds}; run with --save-thresholds to record a baseline")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
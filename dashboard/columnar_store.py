@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Columnar Memory-Mapped Appointment Store
+zeli8888.ccproject.patient_behavior
+
+One-time conversion of the appointment CSV into fixed-width binary columns
+that are memory-mapped back as NumPy arrays, so repeated scans skip text
+parsing entirely. Only records the mapper would count are stored.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+
+STORE_PATH = 'data/appointments_store'
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+COLUMNS = {
+    'patient_id': 'int64',
+    'gender': 'uint8',          # code into the gender dictionary
+    'neighbourhood': 'uint16',  # code into the neighbourhood dictionary
+    'age': 'int8',
+    'scheduled_day': 'int32',   # days since 1970-01-01
+    'appointment_day': 'int32',
+    'flags': 'uint8',           # FLAGS bitmask
+}
+
+DICTIONARY_COLUMNS = ('gender', 'neighbourhood')
+
+FLAGS = {
+    'hypertension': 1,
+    'diabetes': 2,
+    'alcoholism': 4,
+    'handicap': 8,
+    'healthy': 16,
+    'sms': 32,
+    'noshow': 64,
+    'scholarship': 128,
+}
+DISEASE_FLAGS = FLAGS['hypertension'] | FLAGS['diabetes'] | FLAGS['alcoholism'] | FLAGS['handicap']
+
+OUTCOME_NAMES = {
+    'valid': engine.VALID,
+    'malformed': engine.MALFORMED,
+    'empty_field': engine.EMPTY_FIELD,
+    'invalid_age': engine.INVALID_AGE,
+    'negative_lead_time': engine.NEGATIVE_LEAD_TIME,
+    'invalid_date': engine.INVALID_DATE,
+}
+
+
+class ColumnarStoreWriter:
+    """Append parsed record batches to a new store, published atomically on close"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.files = {name: open(os.path.join(self.tmp_path, name + '.bin'), 'wb') for name in COLUMNS}
+        self.dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+        self.rows = 0
+        self.outcomes = np.zeros(engine.OUTCOME_COUNT, dtype='int64')
+
+    def _encode(self, name, values):
+        """Map a categorical column onto stable store-wide codes"""
+        dictionary = self.dictionaries[name]
+        categorical = pd.Categorical(values)
+        lookup = np.array([dictionary.setdefault(c, len(dictionary)) for c in categorical.categories],
+                          dtype='int64')
+        if len(dictionary) > np.iinfo(COLUMNS[name]).max + 1:
+            raise OverflowError(f"Too many distinct {name} values for {COLUMNS[name]}")
+        return lookup[categorical.codes].astype(COLUMNS[name])
+
+    def append(self, records, outcome=None):
+        """Write one batch of records from aggregation_engine.parse_chunk"""
+        flags = np.zeros(len(records), dtype='uint8')
+        for flag, bit in FLAGS.items():
+            flags |= np.where(records[flag].to_numpy(), bit, 0).astype('uint8')
+        columns = {
+            'patient_id': records['patient_id'].to_numpy(dtype='int64'),
+            'gender': self._encode('gender', records['gender']),
+            'neighbourhood': self._encode('neighbourhood', records['neighbourhood']),
+            'age': records['age'].to_numpy().astype('int8'),
+            'scheduled_day': records['scheduled_day'].to_numpy(dtype='int32'),
+            'appointment_day': records['appointment_day'].to_numpy(dtype='int32'),
+            'flags': flags,
+        }
+        for name, values in columns.items():
+            self.files[name].write(np.ascontiguousarray(values, dtype=COLUMNS[name]).tobytes())
+        self.rows += len(records)
+        if outcome is not None:
+            self.outcomes += np.bincount(outcome, minlength=len(self.outcomes))
+
+    def meta(self, source=None):
+        """Metadata describing everything appended so far"""
+        return {
+            'format_version': FORMAT_VERSION,
+            'rows': self.rows,
+            'columns': COLUMNS,
+            'flags': FLAGS,
+            'dictionaries': {name: list(d) for name, d in self.dictionaries.items()},
+            'source': source,
+            'outcomes': {name: int(self.outcomes[code]) for name, code in OUTCOME_NAMES.items()},
+        }
+
+    def close(self, source=None):
+        """Write metadata and swap the finished store into place"""
+        for f in self.files.values():
+            f.close()
+        with open(os.path.join(self.tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.meta(source), f, ensure_ascii=False, indent=2)
+        if os.path.exists(self.path):
+            old_path = self.path + '.old'
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(self.path, old_path)
+            os.replace(self.tmp_path, self.path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            os.replace(self.tmp_path, self.path)
+        return self.path
+
+
+class ColumnarStoreAppender(ColumnarStoreWriter):
+    """Append records to an existing store in place
+
+    Column bytes past meta['rows'] are invisible to readers, so rows are
+    only published when the new meta.json replaces the old one.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format {meta['format_version']}")
+        self.rows = meta['rows']
+        self.source = meta.get('source')
+        self.dictionaries = {name: {value: code for code, value in enumerate(values)}
+                             for name, values in meta['dictionaries'].items()}
+        self.outcomes = np.zeros(engine.OUTCOME_COUNT, dtype='int64')
+        for name, code in OUTCOME_NAMES.items():
+            self.outcomes[code] = meta['outcomes'].get(name, 0)
+        self.files = {}
+        for name, dtype in COLUMNS.items():
+            f = open(os.path.join(path, name + '.bin'), 'r+b')
+            # Drop bytes left behind by an append that was never published
+            f.truncate(self.rows * np.dtype(dtype).itemsize)
+            f.seek(0, os.SEEK_END)
+            self.files[name] = f
+
+    def prepare(self, source=None):
+        """Flush column bytes and write the new metadata next to the old one"""
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        tmp_meta = os.path.join(self.path, META_FILE + '.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(self.meta(source or self.source), f, ensure_ascii=False, indent=2)
+        return tmp_meta, os.path.join(self.path, META_FILE)
+
+    def close(self, source=None):
+        """Publish the appended rows"""
+        tmp_meta, meta_path = self.prepare(source)
+        os.replace(tmp_meta, meta_path)
+        return self.path
+
+
+def build_store(input_path=engine.ARCHIVE_PATH, store_path=STORE_PATH,
+                chunk_size=engine.DEFAULT_CHUNK_SIZE, member=engine.CSV_MEMBER):
+    """Convert the appointment CSV (or zip) into a columnar store"""
+    writer = ColumnarStoreWriter(store_path)
+    with engine.open_appointments(input_path, member) as stream:
+        for text in engine.iter_text_chunks(stream, chunk_size):
+            records, outcome = engine.parse_chunk(text)
+            writer.append(records, outcome)
+    return writer.close(source={'path': os.path.abspath(input_path), 'member': member})
+
+
+class ColumnarStore:
+    """Read-only, zero-copy view over a columnar store directory"""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format {self.meta['format_version']}")
+        self.rows = self.meta['rows']
+        self.dictionaries = {name: np.array(values, dtype=object)
+                             for name, values in self.meta['dictionaries'].items()}
+        self._columns = {}
+
+    def column(self, name):
+        """Memory-mapped column as a read-only NumPy array"""
+        if name not in self._columns:
+            dtype = np.dtype(self.meta['columns'][name])
+            if self.rows == 0:
+                self._columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(os.path.join(self.path, name + '.bin'),
+                                                dtype=dtype, mode='r', shape=(self.rows,))
+        return self._columns[name]
+
+    def flag(self, name):
+        """Boolean array for one bit of the flags column"""
+        return (self.column('flags') & FLAGS[name]) != 0
+
+    def decode(self, name):
+        """Dictionary-decoded values of gender or neighbourhood"""
+        return self.dictionaries[name][self.column(name)]
+
+    def disease_count(self):
+        """Number of health conditions per record (countDiseases)"""
+        bits = self.column('flags') & DISEASE_FLAGS
+        return ((bits & 1) + ((bits >> 1) & 1) + ((bits >> 2) & 1) + ((bits >> 3) & 1)).astype('int8')
+
+    def lead_days(self):
+        """Days between scheduling and the appointment"""
+        return self.column('appointment_day') - self.column('scheduled_day')
+
+    def records(self):
+        """Records frame compatible with aggregation_engine.aggregate_records"""
+        frame = pd.DataFrame({
+            'patient_id': self.column('patient_id'),
+            'gender': pd.Categorical.from_codes(self.column('gender'), self.dictionaries['gender']),
+            'scheduled_day': self.column('scheduled_day'),
+            'appointment_day': self.column('appointment_day'),
+            'lead_days': self.lead_days(),
+            'age': self.column('age').astype('int16'),
+            'neighbourhood': pd.Categorical.from_codes(self.column('neighbourhood'),
+                                                       self.dictionaries['neighbourhood']),
+        }, copy=False)
+        for name in FLAGS:
+            frame[name] = self.flag(name)
+        return frame
+
+    def nbytes(self):
+        """On-disk size of the column files"""
+        return sum(os.path.getsize(os.path.join(self.path, name + '.bin')) for name in self.meta['columns'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar store for the appointment CSV")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="convert the CSV (or zip archive) into a store")
+    build_parser.add_argument('--input', default=engine.ARCHIVE_PATH)
+    build_parser.add_argument('--member', default=engine.CSV_MEMBER)
+    build_parser.add_argument('--store', default=STORE_PATH)
+    build_parser.add_argument('--chunk-size', type=int, default=engine.DEFAULT_CHUNK_SIZE)
+    results_parser = subparsers.add_parser('results', help="write the MapReduce result file from a store")
+    results_parser.add_argument('--store', default=STORE_PATH)
+    results_parser.add_argument('--output', default='patient_demographics_results.txt')
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    if args.command == 'build':
+        build_store(args.input, args.store, args.chunk_size, args.member)
+        store = ColumnarStore(args.store)
+        print(f"Stored {store.rows:,} records in {store.nbytes():,} bytes")
+    else:
+        store = ColumnarStore(args.store)
+        engine.write_results(engine.aggregate_records(store.records()), args.output)
+        print(f"Wrote results for {store.rows:,} records to {args.output}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Multi-Dimensional No-Show Count Cube
+zeli8888.ccproject.patient_behavior
+
+Sparse count cube over gender x age group x decade x neighbourhood x
+lead-time bucket x SMS x health-condition mask x attendance, built in one
+pass from raw appointments. Any combination of cross-filters is answered
+by masking the non-empty cells, never by rescanning records.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+from urllib.parse import parse_qsl
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from key_grammar import DIMENSIONS, add_rate_statistics, dimension_view, empty_frame
+from result_cache import ResultCache
+
+CUBE_PATH = 'data/count_cube.npz'
+SLICE_CACHE_SIZE = 256
+
+AXES = ('gender', 'age_group', 'decade', 'neighbourhood', 'lead_time', 'sms', 'health', 'noshow')
+# Axes a cross-filter can select on
+FILTER_AXES = tuple(axis for axis in AXES if axis != 'noshow')
+
+# Radix of each axis in the linear cell index used while building
+AXIS_SIZES = {
+    'gender': 256,
+    'age_group': len(engine.AGE_GROUP_CATEGORIES),
+    'decade': 13,
+    'neighbourhood': 65536,
+    'lead_time': len(engine.LEAD_TIME_CATEGORIES),
+    'sms': 2,
+    'health': 32,
+    'noshow': 2,
+}
+
+# Bits of the health axis; HEALTHY is kept separately because the mapper
+# only counts a record as healthy when every field is exactly "0"
+HEALTH_BITS = {
+    'HYPERTENSION': 1,
+    'DIABETES': 2,
+    'ALCOHOLISM': 4,
+    'HANDICAP': 8,
+    'HEALTHY': 16,
+}
+DISEASE_BITS = 15
+
+SMS_LABELS = np.array(['NO_SMS', 'SMS_RECEIVED'], dtype=object)
+DECADE_LABELS = np.array([f"{start}-{start + 9}" for start in range(0, 130, 10)], dtype=object)
+
+
+def _popcount4(mask):
+    """Number of disease bits set"""
+    return (mask & 1) + ((mask >> 1) & 1) + ((mask >> 2) & 1) + ((mask >> 3) & 1)
+
+
+def _linearize(coords):
+    """Mixed-radix cell index over AXES"""
+    linear = np.zeros(len(coords[AXES[0]]), dtype='int64')
+    for axis in AXES:
+        linear = linear * AXIS_SIZES[axis] + coords[axis]
+    return linear
+
+
+class CubeBuilder:
+    """Accumulate record batches into cube cells with store-wide label codes"""
+
+    def __init__(self):
+        self.labels = {'gender': {}, 'neighbourhood': {}}
+        self.partials = []
+
+    def _encode(self, name, values):
+        labels = self.labels[name]
+        categorical = pd.Categorical(values)
+        lookup = np.array([labels.setdefault(c, len(labels)) for c in categorical.categories], dtype='int64')
+        if len(labels) > AXIS_SIZES[name]:
+            raise OverflowError(f"Too many distinct {name} values for the cube")
+        return lookup[categorical.codes]
+
+    def add(self, records):
+        """Fold one batch of records (aggregation_engine / columnar store schema)"""
+        age = records['age'].to_numpy().astype('int64')
+        health = np.zeros(len(records), dtype='int64')
+        for flag, name in (('hypertension', 'HYPERTENSION'), ('diabetes', 'DIABETES'),
+                           ('alcoholism', 'ALCOHOLISM'), ('handicap', 'HANDICAP'), ('healthy', 'HEALTHY')):
+            health |= np.where(records[flag].to_numpy(), HEALTH_BITS[name], 0)
+        coords = {
+            'gender': self._encode('gender', records['gender']),
+            'age_group': np.searchsorted(engine.AGE_GROUP_BINS, age, side='left'),
+            'decade': age // 10,
+            'neighbourhood': self._encode('neighbourhood', records['neighbourhood']),
+            'lead_time': np.searchsorted(engine.LEAD_TIME_BINS, records['lead_days'].to_numpy(), side='left'),
+            'sms': records['sms'].to_numpy().astype('int64'),
+            'health': health,
+            'noshow': records['noshow'].to_numpy().astype('int64'),
+        }
+        cells, counts = np.unique(_linearize(coords), return_counts=True)
+        self.partials.append((cells, counts))
+
+    def add_cube(self, cube):
+        """Fold the cells of an existing cube, remapping its label codes"""
+        coords = {axis: cube.coords[axis].astype('int64') for axis in AXES}
+        for name in ('gender', 'neighbourhood'):
+            labels = self.labels[name]
+            lookup = np.array([labels.setdefault(c, len(labels)) for c in cube.labels[name]], dtype='int64')
+            if len(labels) > AXIS_SIZES[name]:
+                raise OverflowError(f"Too many distinct {name} values for the cube")
+            coords[name] = lookup[coords[name]] if len(lookup) else coords[name]
+        self.partials.append((_linearize(coords), cube.counts.astype('int64')))
+
+    def build(self):
+        """Merge partial cells into a CountCube"""
+        if self.partials:
+            cells = np.concatenate([p[0] for p in self.partials])
+            weights = np.concatenate([p[1] for p in self.partials])
+            cells, inverse = np.unique(cells, return_inverse=True)
+            counts = np.bincount(inverse, weights=weights).astype('int64')
+        else:
+            cells = np.zeros(0, dtype='int64')
+            counts = np.zeros(0, dtype='int64')
+        coords = {}
+        for axis in reversed(AXES):
+            coords[axis] = (cells % AXIS_SIZES[axis]).astype('uint16')
+            cells = cells // AXIS_SIZES[axis]
+        labels = {
+            'gender': list(self.labels['gender']),
+            'age_group': list(engine.AGE_GROUP_CATEGORIES),
+            'decade': list(DECADE_LABELS),
+            'neighbourhood': list(self.labels['neighbourhood']),
+            'lead_time': list(engine.LEAD_TIME_CATEGORIES),
+            'sms': list(SMS_LABELS),
+            'health': list(HEALTH_BITS),
+            'noshow': ['Attended', 'NoShow'],
+        }
+        return CountCube({axis: coords[axis] for axis in AXES}, counts, labels)
+
+
+class CountCube:
+    """Immutable sparse cube: one coordinate array per axis plus cell counts"""
+
+    def __init__(self, coords, counts, labels):
+        self.coords = coords
+        self.counts = counts
+        self.labels = {axis: np.array(values, dtype=object) for axis, values in labels.items()}
+        for array in list(coords.values()) + [counts]:
+            array.flags.writeable = False
+        # Bounded per-instance memo so a reloaded cube drops its old slices
+        self.frame = lru_cache(maxsize=SLICE_CACHE_SIZE)(self._frame)
+        self.views = lru_cache(maxsize=SLICE_CACHE_SIZE)(self._views)
+
+    @classmethod
+    def from_records(cls, records):
+        builder = CubeBuilder()
+        builder.add(records)
+        return builder.build()
+
+    def merge(self, other):
+        """New cube holding the cell-wise sum of self and other"""
+        builder = CubeBuilder()
+        builder.add_cube(self)
+        builder.add_cube(other)
+        return builder.build()
+
+    @property
+    def cells(self):
+        return len(self.counts)
+
+    def options(self, axis):
+        """Labels a cross-filter on axis can choose from"""
+        return list(self.labels[axis])
+
+    def check_filters(self, filters):
+        """Raise ValueError naming the first unknown axis or label in filters"""
+        for axis, values in filters:
+            if axis not in FILTER_AXES:
+                raise ValueError(f"Unknown axis '{axis}'; expected one of {', '.join(FILTER_AXES)}")
+            unknown = sorted(set(values) - set(self.options(axis)))
+            if unknown:
+                raise ValueError(f"Unknown {axis} label(s): {', '.join(unknown)}")
+
+    def mask(self, filters):
+        """Cells matching filters: ((axis, (label, ...)), ...); health labels must all be present"""
+        selected = np.ones(self.cells, dtype=bool)
+        for axis, values in filters:
+            if not values:
+                continue
+            if axis == 'health':
+                required = 0
+                for value in values:
+                    required |= HEALTH_BITS[value]
+                selected &= (self.coords['health'] & required) == required
+            else:
+                codes = np.flatnonzero(np.isin(self.labels[axis], list(values)))
+                selected &= np.isin(self.coords[axis], codes)
+        return selected
+
+    def _group(self, codes, noshow, counts, size):
+        """(attended, noshow) totals per code"""
+        sums = np.bincount(codes.astype('int64') * 2 + noshow, weights=counts, minlength=2 * size)
+        sums = sums.reshape(-1, 2).astype('int64')
+        return sums[:, 0], sums[:, 1]
+
+    def _frame(self, filters=()):
+        """Tidy (dimension, category, ...) frame for the cells matching filters"""
+        selected = self.mask(filters)
+        coords = {axis: self.coords[axis][selected] for axis in AXES}
+        counts = self.counts[selected]
+        noshow = coords['noshow'].astype('int64')
+        if len(counts) == 0:
+            return empty_frame()
+
+        pieces = []
+
+        def add(dimension, categories, attended, noshows):
+            keep = (attended + noshows) > 0
+            pieces.append(pd.DataFrame({
+                'dimension': dimension,
+                'category': np.asarray(categories, dtype=object)[keep],
+                'attended': attended[keep],
+                'noshow': noshows[keep]
+            }))
+
+        for dimension, axis in (('gender', 'gender'), ('age_groups', 'age_group'),
+                                ('detailed_age', 'decade'), ('lead_time', 'lead_time'),
+                                ('sms_intervention', 'sms')):
+            labels = self.labels[axis]
+            add(dimension, labels, *self._group(coords[axis], noshow, counts, len(labels)))
+
+        labels = self.labels['neighbourhood']
+        attended, noshows = self._group(coords['neighbourhood'], noshow, counts, len(labels))
+        countable = (labels != '') & (labels != 'NULL')
+        add('neighbourhoods', labels[countable], attended[countable], noshows[countable])
+
+        health = coords['health'].astype('int64')
+        conditions, attended, noshows = [], [], []
+        for name, bit in HEALTH_BITS.items():
+            hit = (health & bit) != 0
+            conditions.append(name)
+            attended.append(int(counts[hit & (noshow == 0)].sum()))
+            noshows.append(int(counts[hit & (noshow == 1)].sum()))
+        diseases = _popcount4(health & DISEASE_BITS)
+        for n in range(2, 5):
+            hit = diseases == n
+            conditions.append(f"MULTIPLE_DISEASES_{n}")
+            attended.append(int(counts[hit & (noshow == 0)].sum()))
+            noshows.append(int(counts[hit & (noshow == 1)].sum()))
+        add('health_conditions', conditions, np.array(attended, dtype='int64'), np.array(noshows, dtype='int64'))
+
+        frame = pd.concat(pieces, ignore_index=True)
+        frame['dimension'] = pd.Categorical(frame['dimension'], categories=DIMENSIONS)
+        frame['category'] = frame['category'].astype('category')
+        return add_rate_statistics(frame)
+
+    def _views(self, filters=()):
+        """Display frames for every dimension under filters"""
+        frame = self.frame(filters)
+        return {dimension: dimension_view(frame, dimension) for dimension in DIMENSIONS}
+
+    def cache_info(self):
+        return self.frame.cache_info()
+
+    def save(self, path=CUBE_PATH):
+        """Write the cube as a compressed .npz (atomically)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, counts=self.counts,
+                            labels=np.array(json.dumps({a: list(v) for a, v in self.labels.items()},
+                                                       ensure_ascii=False)),
+                            **{'axis_' + axis: self.coords[axis] for axis in AXES})
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        with np.load(path) as data:
+            labels = json.loads(str(data['labels']))
+            coords = {axis: data['axis_' + axis] for axis in AXES}
+            counts = data['counts']
+        return cls(coords, counts, labels)
+
+
+def load_cube(file_path, version=None):
+    """ResultCache loader for cube files"""
+    return CountCube.load(file_path)
+
+
+_shared_cube_cache = ResultCache(loader=load_cube)
+
+
+def parse_filters(text):
+    """Canonical ((axis, (label, ...)), ...) filters of a query such as gender=F&age_group=SENIORS,MIDDLE_AGED
+
+    A repeated axis is merged with the earlier ones, so gender=F&gender=M means gender=F,M.
+    """
+    labels = {}
+    for axis, values in parse_qsl(text, keep_blank_values=True):
+        labels.setdefault(axis, set()).update(v for v in values.split(',') if v)
+    return tuple(sorted((axis, tuple(sorted(values))) for axis, values in labels.items()))
+
+
+def get_cube_cache():
+    """Return the cube cache shared by every session in this process"""
+    return _shared_cube_cache
+
+
+def build_cube(input_path=engine.ARCHIVE_PATH, chunk_size=engine.DEFAULT_CHUNK_SIZE, member=engine.CSV_MEMBER):
+    """Build the cube from a columnar store directory or the raw CSV/zip"""
+    builder = CubeBuilder()
+    if os.path.isdir(input_path):
+        from columnar_store import ColumnarStore
+        builder.add(ColumnarStore(input_path).records())
+    else:
+        with engine.open_appointments(input_path, member) as stream:
+            for text in engine.iter_text_chunks(stream, chunk_size):
+                records, _ = engine.parse_chunk(text)
+                builder.add(records)
+    return builder.build()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the no-show count cube")
+    parser.add_argument('--input', default=engine.ARCHIVE_PATH,
+                        help="appointment CSV, zip archive or columnar store directory")
+    parser.add_argument('--member', default=engine.CSV_MEMBER)
+    parser.add_argument('--output', default=CUBE_PATH)
+    parser.add_argument('--chunk-size', type=int, default=engine.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    cube = build_cube(args.input, args.chunk_size, args.member)
+    cube.save(args.output)
+    print(f"Cube with {cube.cells:,} non-empty cells written to {args.output}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
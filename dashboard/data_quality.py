@@ -0,0 +1,178 @@
+"""
+Data-Quality Validation Stage
+zeli8888.ccproject.patient_behavior
+
+Streaming reject accounting for the ingestion path. parse_chunk already
+classifies every line of a chunk in one vectorized pass; this stage folds
+those outcome codes into per-reason counters with a bincount, appends the
+rejected lines to a quarantine file with their byte offsets in the input,
+and publishes the counters as JSON next to the result file, where the
+dashboard reads them without rescanning the input.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from result_shards import is_sharded
+
+# Reject reasons in the order the mapper checks them. EMPTY_FIELDS, INVALID_AGE and
+# NEGATIVE_LEAD_TIME match the Hadoop job's DATA_QUALITY counters; it counts
+# MISSING_FIELDS and INVALID_DATE together as MALFORMED_RECORDS
+REASONS = {
+    engine.MALFORMED: 'MISSING_FIELDS',
+    engine.EMPTY_FIELD: 'EMPTY_FIELDS',
+    engine.INVALID_AGE: 'INVALID_AGE',
+    engine.INVALID_DATE: 'INVALID_DATE',
+    engine.NEGATIVE_LEAD_TIME: 'NEGATIVE_LEAD_TIME',
+}
+QUALITY_FORMAT = 1
+
+_REJECTED = np.zeros(engine.OUTCOME_COUNT, dtype=bool)
+_REJECTED[list(REASONS)] = True
+
+
+def _stem(results_path):
+    if is_sharded(results_path):
+        directory = results_path if os.path.isdir(results_path) else os.path.dirname(results_path)
+        # Underscore names are skipped by the part file reader
+        return os.path.join(directory, '_')
+    return os.path.splitext(results_path)[0] + '_'
+
+
+def quality_path(results_path):
+    """Where the counters of a result file (or output directory) are published"""
+    return _stem(results_path) + 'quality.json'
+
+
+def quarantine_path(results_path):
+    """Default quarantine file of a result file"""
+    return _stem(results_path) + 'quarantine.tsv'
+
+
+def empty_counters():
+    """Counters of an empty input"""
+    return {
+        'format': QUALITY_FORMAT,
+        'lines': 0,
+        'headers': 0,
+        'records': 0,
+        'rejected': {reason: 0 for reason in REASONS.values()},
+        'sources': [],
+        'quarantine': None,
+        'quarantined': 0,
+        'updated': None,
+    }
+
+
+class QualityStage:
+    """Per-reason reject counts and quarantined lines of one input stream
+
+    Offsets count the UTF-8 bytes of the lines as the chunk reader returned
+    them, starting at offset; they are file offsets for newline-terminated
+    input (universal-newline reading folds a CRLF into one byte).
+    """
+
+    def __init__(self, source, quarantine=None, offset=0):
+        self.source = source
+        self.quarantine = quarantine
+        self.start = offset
+        self.offset = offset
+        self.outcomes = np.zeros(engine.OUTCOME_COUNT, dtype='int64')
+        self.quarantined = 0
+        if quarantine is not None:
+            quarantine.write(f"# source: {source}\n")
+
+    def add(self, text, outcome):
+        """Count one parsed chunk and quarantine its rejected lines"""
+        self.outcomes += np.bincount(outcome, minlength=engine.OUTCOME_COUNT)
+        rejected = np.flatnonzero(_REJECTED[outcome]) if self.quarantine is not None else ()
+        if len(rejected):
+            data = text.encode('utf-8')
+            ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            self.quarantine.writelines(
+                f"{self.offset + start}\t{REASONS[code]}\t{data[start:end].decode('utf-8')}\n"
+                for start, end, code in zip(starts[rejected].tolist(), ends[rejected].tolist(),
+                                            outcome[rejected].tolist()))
+            self.quarantined += len(rejected)
+            self.offset += len(data)
+        else:
+            self.offset += len(text) if text.isascii() else len(text.encode('utf-8'))
+
+    def counters(self):
+        """Counters of this stream in the published layout"""
+        counters = empty_counters()
+        counters['lines'] = int(self.outcomes.sum())
+        counters['headers'] = int(self.outcomes[engine.HEADER])
+        counters['records'] = int(self.outcomes[engine.VALID])
+        counters['rejected'] = {reason: int(self.outcomes[code]) for code, reason in REASONS.items()}
+        counters['sources'] = [{'path': self.source, 'start': self.start, 'end': self.offset}]
+        if self.quarantine is not None:
+            counters['quarantine'] = getattr(self.quarantine, 'name', None)
+        counters['quarantined'] = self.quarantined
+        counters['updated'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        return counters
+
+
+def merge_counters(old, new):
+    """Counters of two runs over disjoint input, e.g. a result file and an ingested batch"""
+    merged = dict(new)
+    for name in ('lines', 'headers', 'records', 'quarantined'):
+        merged[name] = old.get(name, 0) + new[name]
+    merged['rejected'] = {reason: old.get('rejected', {}).get(reason, 0) + count
+                          for reason, count in new['rejected'].items()}
+    merged['sources'] = old.get('sources', []) + new['sources']
+    merged['quarantine'] = new['quarantine'] or old.get('quarantine')
+    return merged
+
+
+def load_counters(path):
+    """Published counters, or None when there are none (or they are unreadable)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            counters = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(counters, dict) or counters.get('format') != QUALITY_FORMAT:
+        return None
+    return counters
+
+
+def write_counters(counters, path):
+    """Publish counters atomically"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(counters, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def reject_frame(counters):
+    """Reason, rejected lines and share of all data lines, in check order"""
+    data_lines = max(counters['lines'] - counters['headers'], 1)
+    frame = pd.DataFrame({
+        'Reason': list(counters['rejected']),
+        'Rejected_Lines': list(counters['rejected'].values()),
+    })
+    frame['Share'] = frame['Rejected_Lines'] / data_lines * 100
+    return frame
+
+
+def read_quarantine(path, limit):
+    """First limit quarantined lines as (source, byte offset, reason, line), without reading the rest"""
+    rows = []
+    source = None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for row in f:
+            if row.startswith('# source: '):
+                source = row[len('# source: '):].rstrip('\n')
+                continue
+            offset, reason, line = row.rstrip('\n').split('\t', 2)
+            rows.append((source, int(offset), reason, line))
+            if len(rows) >= limit:
+                break
+    return rows
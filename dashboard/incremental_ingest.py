@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Incremental Appointment Ingestion
+zeli8888.ccproject.patient_behavior
+
+Folds a new CSV batch into the result file, count cube, daily time series,
+sketches, columnar store and data-quality counters (quarantining its rejected
+lines) without re-reading earlier data. A ledger records how many bytes of each
+input file have been ingested, so replaying a batch is a no-op and a file
+that keeps growing only has its new lines read. All outputs are staged
+next to their targets and published together through a write-ahead
+journal, so a crash leaves either the old state or the new one; rejected
+lines are appended to the quarantine file in place, and a crash before the
+commit truncates them again.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+import aggregation_engine as engine
+import data_quality
+from columnar_store import STORE_PATH, ColumnarStoreAppender
+from count_cube import CUBE_PATH, CountCube, CubeBuilder, get_cube_cache
+from result_cache import get_result_cache, read_results
+from sketches import SKETCH_PATH, SketchState, get_sketch_cache
+from time_series import TIME_SERIES_PATH, DailySeries, SeriesBuilder, get_time_series_cache
+
+RESULTS_PATH = 'patient_demographics_results.txt'
+LEDGER_PATH = 'data/ingest_ledger.json'
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def fingerprint(path, length):
+    """Hash of the first bytes of an already ingested prefix"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(length, FINGERPRINT_BYTES)))
+    return digest.hexdigest()
+
+
+def load_ledger(path=LEDGER_PATH):
+    """Ingested files keyed by absolute path"""
+    if not os.path.exists(path):
+        return {'files': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(data, path):
+    """Write JSON durably to path (callers publish it with os.replace)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def seed_ledger(path, ledger_path=LEDGER_PATH):
+    """Start a new ledger holding all of path, after a full build of the results from it"""
+    recover(ledger_path)
+    end = os.path.getsize(path)
+    entry = {'offset': end, 'fingerprint': fingerprint(path, end),
+             'ingested': [{'start': 0, 'end': end, 'build': True,
+                           'at': datetime.now(timezone.utc).isoformat(timespec='seconds')}]}
+    os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+    write_json({'files': {os.path.abspath(path): entry}}, ledger_path + '.tmp')
+    os.replace(ledger_path + '.tmp', ledger_path)
+
+
+def recover(ledger_path=LEDGER_PATH):
+    """Finish publishing a batch whose journal was committed before a crash"""
+    journal_path = ledger_path + '.journal'
+    if not os.path.exists(journal_path):
+        return False
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        journal = json.load(f)
+    # An uncommitted journal only records the published length of files appended in place
+    for path, length in journal.get('truncate', ()):
+        if os.path.exists(path):
+            with open(path, 'r+b') as f:
+                f.truncate(length)
+    for staged, target in journal.get('replace', ()):
+        if os.path.exists(staged):
+            os.replace(staged, target)
+    os.remove(journal_path)
+    return True
+
+
+def pending_range(path, entry):
+    """(start, end) byte range of complete lines not yet ingested"""
+    size = os.path.getsize(path)
+    start = 0
+    if entry is not None:
+        start = entry['offset']
+        if size < start or fingerprint(path, start) != entry['fingerprint']:
+            raise ValueError(f"{path} has changed since it was ingested")
+    if size == start:
+        return start, start
+    # Only ingest up to the last newline; a partial final line waits for the next run
+    with open(path, 'rb') as f:
+        position = size
+        while position > start:
+            step = min(FINGERPRINT_BYTES, position - start)
+            f.seek(position - step)
+            block = f.read(step)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start, position - step + newline + 1
+            position -= step
+    return start, start
+
+
+def iter_batch_chunks(path, start, end, chunk_size=engine.DEFAULT_CHUNK_SIZE):
+    """Decoded blocks of whole lines from the byte range [start, end)"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            remaining -= len(data)
+            if remaining > 0:
+                tail = f.readline(remaining)
+                remaining -= len(tail)
+                data += tail
+            yield data.decode('utf-8', errors='replace')
+
+
+def ingest(batch_paths, results_path=RESULTS_PATH, cube_path=CUBE_PATH, store_path=STORE_PATH,
+           ledger_path=LEDGER_PATH, chunk_size=engine.DEFAULT_CHUNK_SIZE, series_path=TIME_SERIES_PATH,
+           sketch_path=SKETCH_PATH):
+    """Fold new lines of batch_paths into every derived output; return a summary"""
+    recover(ledger_path)
+    ledger = load_ledger(ledger_path)
+
+    ranges = []
+    for path in batch_paths:
+        key = os.path.abspath(path)
+        start, end = pending_range(path, ledger['files'].get(key))
+        if end > start:
+            ranges.append((path, key, start, end))
+    summary = {'files': len(ranges), 'bytes': 0, 'records': 0, 'malformed': 0, 'rejected': {}}
+    if not ranges:
+        return summary
+
+    delta = Counter()
+    outcomes = np.zeros(engine.OUTCOME_COUNT, dtype='int64')
+    store = ColumnarStoreAppender(store_path) if os.path.isdir(store_path) else None
+    cube = None
+    if os.path.exists(cube_path):
+        cube = CubeBuilder()
+        cube.add_cube(CountCube.load(cube_path))
+    series = None
+    if os.path.exists(series_path):
+        series = SeriesBuilder()
+        series.add_series(DailySeries.load(series_path))
+    sketches = SketchState.load(sketch_path) if os.path.exists(sketch_path) else None
+    # Rejected lines are appended to the quarantine file in place; until the commit
+    # the journal holds its published length, so recover() drops them after a crash
+    quality_path = data_quality.quality_path(results_path)
+    quarantine_path = data_quality.quarantine_path(results_path)
+    quality = data_quality.load_counters(quality_path) or data_quality.empty_counters()
+    journal_path = ledger_path + '.journal'
+    published = os.path.getsize(quarantine_path) if os.path.exists(quarantine_path) else 0
+    os.makedirs(os.path.dirname(os.path.abspath(ledger_path)), exist_ok=True)
+    write_json({'truncate': [[quarantine_path, published]]}, journal_path + '.tmp')
+    os.replace(journal_path + '.tmp', journal_path)
+    with open(quarantine_path, 'a', encoding='utf-8') as quarantine:
+        for path, key, start, end in ranges:
+            stage = data_quality.QualityStage(path, quarantine, start)
+            for text in iter_batch_chunks(path, start, end, chunk_size):
+                records, outcome = engine.parse_chunk(text)
+                engine.aggregate_records(records, delta)
+                outcomes += np.bincount(outcome, minlength=len(outcomes))
+                stage.add(text, outcome)
+                if cube is not None:
+                    cube.add(records)
+                if series is not None:
+                    series.add(records)
+                if sketches is not None:
+                    sketches.add(records)
+                if store is not None:
+                    store.append(records, outcome)
+            quality = data_quality.merge_counters(quality, stage.counters())
+            summary['bytes'] += end - start
+            entry = ledger['files'].get(key, {'ingested': []})
+            entry['offset'] = end
+            entry['fingerprint'] = fingerprint(path, end)
+            entry['ingested'].append({'start': start, 'end': end,
+                                      'at': datetime.now(timezone.utc).isoformat(timespec='seconds')})
+            ledger['files'][key] = entry
+        quarantine.flush()
+        os.fsync(quarantine.fileno())
+    summary['records'] = int(outcomes[engine.VALID])
+    summary['malformed'] = int(outcomes[engine.JAVA_MALFORMED].sum())
+    summary['rejected'] = {reason: int(outcomes[code]) for code, reason in data_quality.REASONS.items()}
+    quality['quarantine'] = quarantine_path
+
+    # Stage every output next to its target
+    replace = []
+    counts = Counter()
+    if os.path.exists(results_path):
+        counts.update(read_results(results_path).to_dict())
+    counts.update(delta)
+    staged = results_path + '.ingest'
+    with open(staged, 'wb') as f:
+        f.write(engine.format_results(counts))
+        f.flush()
+        os.fsync(f.fileno())
+    replace.append((staged, results_path))
+
+    if cube is not None:
+        staged = cube.build().save(cube_path + '.ingest.npz')
+        replace.append((staged, cube_path))
+
+    if series is not None:
+        staged = series.build().save(series_path + '.ingest.npz')
+        replace.append((staged, series_path))
+
+    if sketches is not None:
+        staged = sketches.save(sketch_path + '.ingest.npz')
+        replace.append((staged, sketch_path))
+
+    if store is not None:
+        replace.append(store.prepare())
+
+    staged = quality_path + '.ingest'
+    write_json(quality, staged)
+    replace.append((staged, quality_path))
+
+    staged = ledger_path + '.ingest'
+    write_json(ledger, staged)
+    replace.append((staged, ledger_path))
+
+    # Committing the journal is the point of no return; recover() rolls it forward
+    write_json({'replace': replace}, journal_path + '.tmp')
+    os.replace(journal_path + '.tmp', journal_path)
+    recover(ledger_path)
+
+    get_result_cache().invalidate(results_path)
+    get_cube_cache().invalidate(cube_path)
+    get_time_series_cache().invalidate(series_path)
+    get_sketch_cache().invalidate(sketch_path)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new appointment CSV batches incrementally")
+    parser.add_argument('batches', nargs='+', help="appointment CSV files (headers allowed)")
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--cube', default=CUBE_PATH, help="updated when it exists")
+    parser.add_argument('--store', default=STORE_PATH, help="appended to when it exists")
+    parser.add_argument('--series', default=TIME_SERIES_PATH, help="updated when it exists")
+    parser.add_argument('--sketches', default=SKETCH_PATH, help="updated when it exists")
+    parser.add_argument('--ledger', default=LEDGER_PATH)
+    parser.add_argument('--chunk-size', type=int, default=engine.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    print("Starting Incremental Ingestion...")
+    start_time = time.perf_counter()
+    summary = ingest(args.batches, args.results, args.cube, args.store, args.ledger, args.chunk_size,
+                     args.series, args.sketches)
+    if summary['files']:
+        print(f"Ingested {summary['records']:,} records ({summary['bytes']:,} bytes) "
+              f"from {summary['files']} file(s)")
+        print(f"Malformed Records: {summary['malformed']}")
+        print("Rejected Records: " + ", ".join(f"{reason} {count}" for reason, count
+                                                in summary['rejected'].items()))
+    else:
+        print("Nothing new to ingest")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
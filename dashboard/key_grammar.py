@@ -0,0 +1,153 @@
+"""
+MapReduce Output Key Grammar
+zeli8888.ccproject.patient_behavior
+"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from rate_stats import rate_statistics
+
+# Every key written by PatientDemographicsMapper is <PREFIX><category>_<status>
+KeyPrefix = namedtuple('KeyPrefix', ['prefix', 'dimension', 'column', 'labels'])
+
+STATUSES = ('Attended', 'NoShow')
+
+KEY_PREFIXES = (
+    KeyPrefix('GENDER_', 'gender', 'Gender', {'F': 'Female', 'M': 'Male'}),
+    KeyPrefix('AGE_GROUP_', 'age_groups', 'Age_Group', None),
+    KeyPrefix('DETAILED_AGE_', 'detailed_age', 'Age_Range', None),
+    KeyPrefix('HEALTH_', 'health_conditions', 'Condition', None),
+    KeyPrefix('NEIGHBOURHOOD_', 'neighbourhoods', 'Neighborhood', None),
+    KeyPrefix('SMS_', 'sms_intervention', 'Intervention_Group',
+              {'SMS_RECEIVED': 'SMS Received', 'NO_SMS': 'No SMS'}),
+    KeyPrefix('LEAD_TIME_', 'lead_time', 'Lead_Time_Category', None),
+)
+
+PREFIXES_BY_DIMENSION = {p.dimension: p for p in KEY_PREFIXES}
+DIMENSIONS = tuple(p.dimension for p in KEY_PREFIXES)
+
+# Longer prefixes first so alternation never stops at a shorter match
+_KEY_PATTERN = re.compile(
+    '^(?P<prefix>' + '|'.join(re.escape(p.prefix) for p in
+                              sorted(KEY_PREFIXES, key=lambda p: -len(p.prefix))) + ')'
+    r'(?P<category>.+)_(?P<status>' + '|'.join(STATUSES) + ')$'
+)
+
+FRAME_COLUMNS = ['dimension', 'category', 'attended', 'noshow', 'total', 'rate',
+                 'rate_low', 'rate_high', 'z_score', 'p_value']
+
+VIEW_COLUMNS = {
+    'attended': 'Appointments_Attended',
+    'noshow': 'No_Shows',
+    'total': 'Total_Appointments',
+    'rate': 'No_Show_Rate',
+    'rate_low': 'Rate_CI_Low',
+    'rate_high': 'Rate_CI_High',
+    'p_value': 'P_Value'
+}
+
+# Every appointment has exactly one gender, so its rows total the whole population
+REFERENCE_DIMENSION = 'gender'
+
+
+def format_key(prefix, category, status):
+    """Build a result key the way the mapper does"""
+    return prefix + category + '_' + status
+
+
+def empty_frame():
+    """Tidy frame with no rows but the usual dtypes"""
+    return pd.DataFrame({
+        'dimension': pd.Categorical([], categories=DIMENSIONS),
+        'category': pd.Categorical([]),
+        'attended': np.array([], dtype='int64'),
+        'noshow': np.array([], dtype='int64'),
+        'total': np.array([], dtype='int64'),
+        'rate': np.array([], dtype='float64'),
+        'rate_low': np.array([], dtype='float64'),
+        'rate_high': np.array([], dtype='float64'),
+        'z_score': np.array([], dtype='float64'),
+        'p_value': np.array([], dtype='float64')
+    })
+
+
+def compute_rates(attended, noshow):
+    """Vectorized no-show rate in percent (0 for empty groups)"""
+    attended = np.asarray(attended, dtype='int64')
+    noshow = np.asarray(noshow, dtype='int64')
+    total = attended + noshow
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(total > 0, noshow / np.maximum(total, 1) * 100, 0.0)
+    return total, rate
+
+
+def add_rate_statistics(frame):
+    """Fill total, rate, Wilson interval and z-test columns of a tidy frame in one vectorized pass"""
+    attended = frame['attended'].to_numpy(dtype='int64')
+    noshow = frame['noshow'].to_numpy(dtype='int64')
+    reference = (frame['dimension'] == REFERENCE_DIMENSION).to_numpy()
+    population = (int(attended[reference].sum()), int(noshow[reference].sum())) if reference.any() else None
+    (frame['total'], frame['rate'], frame['rate_low'], frame['rate_high'],
+     frame['z_score'], frame['p_value']) = rate_statistics(attended, noshow, population)
+    return frame[FRAME_COLUMNS]
+
+
+def split_keys(keys):
+    """(positions, dimensions, categories, noshow flags) of the keys that match the grammar"""
+    # One linear pass over the keys; the regex does prefix, category and status at once
+    dimension_of = {p.prefix: p.dimension for p in KEY_PREFIXES}
+    match = _KEY_PATTERN.match
+    positions, dimensions, categories, noshow_flags = [], [], [], []
+    for position, key in enumerate(keys):
+        m = match(key)
+        if m is None:
+            continue
+        prefix, category, status = m.groups()
+        positions.append(position)
+        dimensions.append(dimension_of[prefix])
+        categories.append(category)
+        noshow_flags.append(status == 'NoShow')
+    return (np.asarray(positions, dtype='int64'), dimensions, categories,
+            np.asarray(noshow_flags, dtype=bool))
+
+
+def parse_results(counts):
+    """Parse a Series of key -> count into one tidy (dimension, category) frame"""
+    if len(counts) == 0:
+        return empty_frame()
+
+    positions, dimensions, categories, noshow_flags = split_keys(counts.index.tolist())
+    if not len(positions):
+        return empty_frame()
+
+    values = counts.to_numpy(dtype='int64')[positions]
+    long = pd.DataFrame({
+        'dimension': pd.Categorical(dimensions, categories=DIMENSIONS),
+        'category': pd.Categorical(categories),
+        'attended': np.where(noshow_flags, 0, values),
+        'noshow': np.where(noshow_flags, values, 0)
+    })
+    frame = (long.groupby(['dimension', 'category'], observed=True, sort=False)[['attended', 'noshow']]
+             .sum()
+             .reset_index())
+    frame['category'] = frame['category'].cat.remove_unused_categories()
+    return add_rate_statistics(frame)
+
+
+def dimension_view(frame, dimension):
+    """Display-ready slice of the tidy frame for one dimension"""
+    key_prefix = PREFIXES_BY_DIMENSION[dimension]
+    rows = frame[frame['dimension'] == dimension]
+    categories = rows['category'].astype('object')
+    if key_prefix.labels:
+        labels = categories.map(lambda c: key_prefix.labels.get(c, c))
+    else:
+        labels = categories.str.replace('_', ' ', regex=False)
+    view = pd.DataFrame({key_prefix.column: labels.to_numpy()})
+    for source, column in VIEW_COLUMNS.items():
+        view[column] = rows[source].to_numpy()
+    return view
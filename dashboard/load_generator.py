@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+JSON API Load Generator
+zeli8888.ccproject.patient_behavior
+
+Simulates many pollers against the headless JSON API: each virtual client
+holds one keep-alive connection and repeatedly fetches a path, optionally
+revalidating with the ETag of its last response as a real poller would.
+Reports throughput, latency percentiles and the status mix.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_URL = 'http://127.0.0.1:8502'
+DEFAULT_PATHS = ('/api/stats', '/api/rates', '/api/stats/neighbourhoods', '/api/cube?gender=F')
+DEFAULT_CLIENTS = 200
+DEFAULT_REQUESTS = 20000
+
+
+async def read_response(reader):
+    """(status, headers, body) of one HTTP/1.1 response"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', '0'))
+    body = await reader.readexactly(length) if length else b''
+    return status, headers, body
+
+
+async def client(host, port, paths, budget, conditional, latencies, statuses, offset):
+    """One keep-alive connection issuing requests until the shared budget is spent"""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    i = offset
+    try:
+        while budget[0] > 0:
+            budget[0] -= 1
+            path = paths[i % len(paths)]
+            i += 1
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+            if conditional and path in etags:
+                request += f"If-None-Match: {etags[path]}\r\n"
+            started = time.perf_counter()
+            writer.write((request + "\r\n").encode('latin-1'))
+            status, headers, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+            if 'etag' in headers:
+                etags[path] = headers['etag']
+    finally:
+        writer.close()
+
+
+async def run(url, paths, clients, requests, conditional):
+    """(latencies in seconds, status counts, wall seconds) of one load run"""
+    target = urlsplit(url)
+    host, port = target.hostname or '127.0.0.1', target.port or 80
+    latencies, statuses, budget = [], Counter(), [requests]
+    started = time.perf_counter()
+    results = await asyncio.gather(*(client(host, port, paths, budget, conditional, latencies, statuses, i)
+                                     for i in range(clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        statuses['connection errors'] += len(failures)
+    return np.array(latencies), statuses, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate polling load against the JSON API")
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help="path to request (repeatable; default: a mix of stats, rates and a cube slice)")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help="concurrent keep-alive connections")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="total requests across all clients")
+    parser.add_argument('--conditional', action='store_true',
+                        help="revalidate with If-None-Match like a polling client")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or list(DEFAULT_PATHS)
+    start_time = time.perf_counter()
+    print(f"Starting Load Generator: {args.clients} clients, {args.requests:,} requests to {args.url} ...")
+    latencies, statuses, elapsed = asyncio.run(run(args.url, paths, args.clients, args.requests,
+                                                   args.conditional))
+    if len(latencies):
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"Requests: {len(latencies):,} in {elapsed:.2f} s ({len(latencies) / elapsed:,.0f} req/s)")
+        print(f"Latency: p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {latencies.max() * 1000:.2f} ms")
+    print("Statuses: " + ", ".join(f"{status}: {count:,}" for status, count in sorted(statuses.items(), key=str)))
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
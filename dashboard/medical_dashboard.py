@@ -4,13 +4,19 @@ Medical Appointment Behavior Analysis Dashboard
 zeli8888.ccproject.patient_behavior
 """
 
+import math
+import os
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import warnings
+from perf_spans import get_recorder
+from render_cache import get_render_cache
+from result_shards import IncompleteOutputError
+from startup_artifact import load_overview
 warnings.filterwarnings('ignore')
 
+# pandas, plotly.express and the data modules are imported by the methods that
+# use them, so a cold start can paint the overview before loading any of them
+
 # Page configuration
 st.set_page_config(
     page_title="Medical Appointment Analysis System",
@@ -19,214 +25,299 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Result file, Hadoop output directory or glob of part files
+DATA_FILE = os.environ.get('DASHBOARD_RESULTS', 'patient_demographics_results.txt')
+
+# Groups are charted only when their 95% Wilson interval is at most this wide
+# (percentage points), instead of a fixed minimum appointment count
+MAX_INTERVAL_WIDTH = 20.0
+
+# Quarantined lines shown by the Data Quality view (read from the start of the file)
+QUARANTINE_PREVIEW_ROWS = 200
+
+# Sidebar cross-filters over the count cube: (cube axis, widget label)
+CROSS_FILTERS = [
+    ('gender', "Gender"),
+    ('age_group', "Age Group"),
+    ('decade', "Age Decade"),
+    ('neighbourhood', "Neighbourhood"),
+    ('lead_time', "Lead Time"),
+    ('sms', "SMS"),
+    ('health', "Health Conditions (all of)")
+]
+
+perf = get_recorder()
+
+def plotly_chart(fig, **kwargs):
+    """st.plotly_chart inside a span (covers Plotly JSON serialization)"""
+    with perf.span('plotly_chart'):
+        st.plotly_chart(fig, **kwargs)
+
+def dataframe(data, **kwargs):
+    """st.dataframe inside a span (covers Styler formatting and Arrow conversion)"""
+    with perf.span('dataframe'):
+        st.dataframe(data, **kwargs)
+
+def display_overview_cards(total_attended, total_noshow, noshow_rate):
+    """Overview metric cards"""
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total Appointments Attended", f"{total_attended:,}")
+    
+    with col2:
+        st.metric("Total No-Shows", f"{total_noshow:,}")
+    
+    with col3:
+        st.metric("Total Records", f"{total_attended + total_noshow:,}")
+    
+    with col4:
+        st.metric("Overall No-Show Rate", f"{noshow_rate:.1f}%")
+
+def overview_gauge(noshow_rate):
+    """Overall no-show rate gauge"""
+    import plotly.graph_objects as go
+    return go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = noshow_rate,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "Overall No-Show Rate"},
+        gauge = {
+            'axis': {'range': [None, 40]},
+            'bar': {'color': "darkblue"},
+            'steps': [
+                {'range': [0, 15], 'color': "lightgreen"},
+                {'range': [15, 25], 'color': "yellow"},
+                {'range': [25, 40], 'color': "red"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 25
+            }
+        }
+    )).update_layout(height=300)
+
+@perf.timed
+def display_startup_overview(overview):
+    """Overview painted from the startup artifact's payload, before any data is loaded"""
+    st.header("📊 Overview Dashboard")
+    display_overview_cards(overview['attended'], overview['noshow'], overview['rate'])
+    plotly_chart(overview['gauge'], use_container_width=True)
+
 class MedicalDashboard:
-    def __init__(self, data_file='patient_demographics_results.txt'):
+    # Rows per table page, None for paged_table.PAGE_ROWS (report_export.py raises it)
+    page_rows = None
+    
+    def __init__(self, data_file=DATA_FILE, cube_file=None, series_file=None, cache=None, renders=None):
+        """cube_file and series_file default to the built ones, '' skips them; caches default to the shared ones"""
+        from result_cache import get_result_cache
+        self.cache = cache if cache is not None else get_result_cache()
+        self.renders = renders if renders is not None else get_render_cache()
+        self.data_file = data_file
+        self.snapshot = None
+        self.cube_version = None
+        self.timeline_version = None
         self.data = self.load_data(data_file)
         self.processed_data = self.process_data()
+        self.cube = self.load_cube(cube_file)
+        self.timeline = self.load_time_series(series_file)
+        self.filters = ()
+        self.date_range = ()
+        self.filtered_views = None
         
+    @perf.timed
     def load_data(self, file_path):
-        """Load MapReduce output data"""
-        data = {}
+        """Load MapReduce output data from the shared result cache"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if '\t' in line:
-                        key, value = line.strip().split('\t')
-                        data[key] = int(value)
-            st.success(f"Successfully loaded {len(data)} analysis records")
+            self.snapshot = self.cache.get(file_path)
         except FileNotFoundError:
             st.error(f"Data file not found: {file_path}")
             st.info("Please ensure patient_demographics_results.txt is in the current directory")
             return {}
-        return data
+        except IncompleteOutputError as e:
+            st.error(f"Incomplete MapReduce output: {e}")
+            return {}
+        st.success(f"Successfully loaded {len(self.snapshot.data)} analysis records")
+        return self.snapshot.data
     
+    @perf.timed
     def process_data(self):
         """Process data for visualization"""
-        processed = {
-            'gender': {},
-            'age_groups': {},
-            'detailed_age': {},
-            'health_conditions': {},
-            'neighbourhoods': {},
-            'sms_intervention': {},
-            'lead_time': {}
-        }
-        
-        for key, value in self.data.items():
-            # Gender analysis
-            if key.startswith('GENDER'):
-                parts = key.split('_')
-                gender = '_'.join(parts[1:-1])
-                status = parts[-1]
-                if gender not in processed['gender']:
-                    processed['gender'][gender] = {'Attended': 0, 'NoShow': 0}
-                processed['gender'][gender][status] = value
-                
-            # Age group analysis
-            elif key.startswith('AGE_GROUP'):
-                parts = key.split('_')
-                age_group = '_'.join(parts[2:-1])
-                status = parts[-1]
-                if age_group not in processed['age_groups']:
-                    processed['age_groups'][age_group] = {'Attended': 0, 'NoShow': 0}
-                processed['age_groups'][age_group][status] = value
-                
-            # Detailed age analysis
-            elif key.startswith('DETAILED_AGE'):
-                parts = key.split('_')
-                age_range = '_'.join(parts[2:-1])
-                status = parts[-1]
-                if age_range not in processed['detailed_age']:
-                    processed['detailed_age'][age_range] = {'Attended': 0, 'NoShow': 0}
-                processed['detailed_age'][age_range][status] = value
-                
-            # Health conditions analysis
-            elif key.startswith('HEALTH_'):
-                parts = key.split('_')
-                condition = '_'.join(parts[1:-1])
-                status = parts[-1]
-                if condition not in processed['health_conditions']:
-                    processed['health_conditions'][condition] = {'Attended': 0, 'NoShow': 0}
-                processed['health_conditions'][condition][status] = value
-                
-            # Neighborhood analysis
-            elif key.startswith('NEIGHBOURHOOD_'):
-                parts = key.split('_')
-                neighborhood_parts = parts[1:-1]
-                neighborhood = '_'.join(neighborhood_parts)
-                status = parts[-1]
-                if neighborhood not in processed['neighbourhoods']:
-                    processed['neighbourhoods'][neighborhood] = {'Attended': 0, 'NoShow': 0}
-                processed['neighbourhoods'][neighborhood][status] = value
-                
-            # SMS intervention
-            elif key.startswith('SMS_'):
-                parts = key.split('_')
-                sms_group = '_'.join(parts[1:-1])
-                status = parts[-1]
-                if sms_group not in processed['sms_intervention']:
-                    processed['sms_intervention'][sms_group] = {'Attended': 0, 'NoShow': 0}
-                processed['sms_intervention'][sms_group][status] = value
-                
-            # Lead time analysis - FIXED
-            elif key.startswith('LEAD_TIME_'):
-                parts = key.split('_')
-                lead_time_parts = parts[2:-1]
-                lead_time = '_'.join(lead_time_parts)
-                status = parts[-1]
-                if lead_time not in processed['lead_time']:
-                    processed['lead_time'][lead_time] = {'Attended': 0, 'NoShow': 0}
-                processed['lead_time'][lead_time][status] = value
-                
-        return processed
+        if self.snapshot is None:
+            from key_grammar import empty_frame
+            return empty_frame()
+        return self.snapshot.frame
+    
+    def load_cube(self, file_path=None):
+        """Load the count cube used for cross-filtering, if one has been built"""
+        from count_cube import CUBE_PATH, get_cube_cache
+        from result_cache import file_version
+        file_path = CUBE_PATH if file_path is None else file_path
+        if not file_path:
+            return None
+        try:
+            cube = get_cube_cache().get(file_path)
+            self.cube_version = file_version(file_path)
+            return cube
+        except FileNotFoundError:
+            return None
+    
+    def load_time_series(self, file_path=None):
+        """Load the daily time series used for date-range filtering, if one has been built"""
+        from result_cache import file_version
+        from time_series import TIME_SERIES_PATH, get_time_series_cache
+        file_path = TIME_SERIES_PATH if file_path is None else file_path
+        if not file_path:
+            return None
+        try:
+            timeline = get_time_series_cache().get(file_path)
+            self.timeline_version = file_version(file_path)
+            return timeline
+        except FileNotFoundError:
+            return None
+    
+    def apply_filters(self, filters, date_range=()):
+        """Switch every view to the cube slice matching filters, or else to the date range"""
+        self.filters = tuple((axis, tuple(values)) for axis, values in filters if values)
+        self.date_range = ()
+        if self.cube is not None and self.filters:
+            self.processed_data = self.cube.frame(self.filters)
+            self.filtered_views = self.cube.views(self.filters)
+        elif self.timeline is not None and date_range:
+            self.date_range = date_range
+            self.filters = (('appointment_day', date_range),)
+            self.processed_data = self.timeline.frame(*date_range)
+            self.filtered_views = self.timeline.views(*date_range)
+        else:
+            self.filtered_views = None
+    
+    def display_cross_filters(self):
+        """Sidebar cross-filters; returns the selected (axis, labels) pairs"""
+        if self.cube is None:
+            return ()
+        filters = []
+        with st.sidebar.expander("Cross Filters", expanded=False):
+            for axis, label in CROSS_FILTERS:
+                selected = st.multiselect(label, self.cube.options(axis),
+                                          format_func=lambda v: v.replace('_', ' '),
+                                          key=f"filter_{axis}")
+                filters.append((axis, tuple(sorted(selected))))
+        return tuple(filters)
+    
+    def display_date_range(self):
+        """Sidebar appointment date slider; returns (first day, last day) or () for all dates"""
+        if self.timeline is None or self.timeline.days < 2:
+            return ()
+        from time_series import to_date, to_day
+        first, last = to_date(self.timeline.first_day), to_date(self.timeline.last_day)
+        selected = st.sidebar.slider("Appointment Dates", min_value=first, max_value=last,
+                                     value=(first, last), key='date_range')
+        if tuple(selected) == (first, last):
+            return ()
+        return to_day(selected[0]), to_day(selected[1])
+    
+    def view(self, dimension):
+        """Display-ready frame for one analysis dimension"""
+        if self.filtered_views is not None:
+            return self.filtered_views[dimension]
+        if self.snapshot is None:
+            from key_grammar import dimension_view
+            return dimension_view(self.processed_data, dimension)
+        return self.snapshot.views[dimension]
+    
+    def rendered(self, name, build):
+        """Figure or table for name under the current data version and filters, built once"""
+        version = self.snapshot.version if self.snapshot is not None else None
+        if self.filtered_views is not None:
+            version = (version, self.cube_version, self.timeline_version, self.filters)
+        return self.renders.get((name, version), build)
     
+    def paged_table(self, name, build, formats, rows=None):
+        """One sorted page of a table; paging and sorting never rebuild the view"""
+        from paged_table import DEFAULT_ORDER, PAGE_ROWS, TableView, page_count
+        page_rows = self.page_rows or PAGE_ROWS
+        table = self.rendered(name, lambda: TableView(build(), formats))
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            column = st.selectbox("Sort by", [DEFAULT_ORDER] + table.columns, key=f"{name}/sort")
+        with col2:
+            order = st.selectbox("Order", ["Ascending", "Descending"], key=f"{name}/order")
+        positions = table.select(rows, column, order == "Ascending")
+        pages = page_count(len(positions), page_rows)
+        with col3:
+            page = min(int(st.number_input("Page", min_value=1, step=1, key=f"{name}/page")), pages)
+        dataframe(table.page(positions, page, page_rows), use_container_width=True)
+        st.caption(f"Page {page:,} of {pages:,} ({len(positions):,} rows)")
+    
+    def precise(self, df):
+        """Rows whose no-show rate is estimated precisely enough to chart"""
+        return df[(df['Rate_CI_High'] - df['Rate_CI_Low']) <= MAX_INTERVAL_WIDTH]
+
     def calculate_no_show_rate(self, attended, noshow):
         """Calculate no-show rate"""
         total = attended + noshow
         return (noshow / total * 100) if total > 0 else 0
     
+    @perf.timed
     def display_overview(self):
         """Display overview dashboard"""
         st.header("📊 Overview Dashboard")
         
         # Calculate overall data
-        if not self.processed_data['gender']:
+        df = self.view('gender')
+        if df.empty:
             st.warning("No overview data available")
             return
-        total_attended = sum(self.processed_data['gender'][g]['Attended'] for g in self.processed_data['gender'])
-        total_noshow = sum(self.processed_data['gender'][g]['NoShow'] for g in self.processed_data['gender'])
-        
-        total = total_attended + total_noshow
+        total_attended = int(df['Appointments_Attended'].sum())
+        total_noshow = int(df['No_Shows'].sum())
         noshow_rate = self.calculate_no_show_rate(total_attended, total_noshow)
         
-        # Create metric cards
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("Total Appointments Attended", f"{total_attended:,}")
-        
-        with col2:
-            st.metric("Total No-Shows", f"{total_noshow:,}")
-        
-        with col3:
-            st.metric("Total Records", f"{total:,}")
-        
-        with col4:
-            st.metric("Overall No-Show Rate", f"{noshow_rate:.1f}%")
+        display_overview_cards(total_attended, total_noshow, noshow_rate)
         
         # Overall trend gauge
-        fig = go.Figure()
-        fig.add_trace(go.Indicator(
-            mode = "gauge+number+delta",
-            value = noshow_rate,
-            domain = {'x': [0, 1], 'y': [0, 1]},
-            title = {'text': "Overall No-Show Rate"},
-            gauge = {
-                'axis': {'range': [None, 40]},
-                'bar': {'color': "darkblue"},
-                'steps': [
-                    {'range': [0, 15], 'color': "lightgreen"},
-                    {'range': [15, 25], 'color': "yellow"},
-                    {'range': [25, 40], 'color': "red"}
-                ],
-                'threshold': {
-                    'line': {'color': "red", 'width': 4},
-                    'thickness': 0.75,
-                    'value': 25
-                }
-            }
-        ))
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
+        fig = self.rendered('overview/gauge', lambda: overview_gauge(noshow_rate))
+        plotly_chart(fig, use_container_width=True)
     
+    @perf.timed
     def display_gender_analysis(self):
         """Display gender analysis"""
         st.header("🚻 Gender Analysis")
+        import plotly.express as px
         
-        if not self.processed_data['gender']:
+        df = self.view('gender')
+        if df.empty:
             st.warning("No gender analysis data available")
             return
             
-        gender_data = []
-        normal_gender_map = {
-            'F': 'Female',
-            'M': 'Male',
-        }
-        for gender, stats in self.processed_data['gender'].items():
-            rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-            gender_data.append({
-                'Gender': normal_gender_map[gender] if gender in normal_gender_map else gender,
-                'Appointments_Attended': stats['Attended'],
-                'No_Shows': stats['NoShow'],
-                'No_Show_Rate': rate
-            })
-        
-        df = pd.DataFrame(gender_data)
+        df = df[['Gender', 'Appointments_Attended', 'No_Shows', 'No_Show_Rate']]
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Pie chart
-            fig = px.pie(df, values='Appointments_Attended', names='Gender', 
-                        title='Gender Distribution - Appointments Attended')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('gender/pie', lambda: px.pie(
+                df, values='Appointments_Attended', names='Gender',
+                title='Gender Distribution - Appointments Attended'))
+            plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Bar chart
-            fig = px.bar(df, x='Gender', y='No_Show_Rate',
-                        title='No-Show Rate by Gender',
-                        color='No_Show_Rate',
-                        color_continuous_scale='RdYlGn_r')
-            fig.update_layout(yaxis_title='No-Show Rate (%)')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('gender/bar', lambda: px.bar(
+                df, x='Gender', y='No_Show_Rate',
+                title='No-Show Rate by Gender',
+                color='No_Show_Rate',
+                color_continuous_scale='RdYlGn_r'
+            ).update_layout(yaxis_title='No-Show Rate (%)'))
+            plotly_chart(fig, use_container_width=True)
         
         # Data table
         st.subheader("Detailed Data")
-        st.dataframe(df.style.format({
+        dataframe(self.rendered('gender/table', lambda: df.style.format({
             'Appointments_Attended': '{:,}',
             'No_Shows': '{:,}', 
             'No_Show_Rate': '{:.1f}%'
-        }), use_container_width=True)
+        })), use_container_width=True)
     
     def sort_age_ranges(self, age_range):
         """Helper function to sort age ranges correctly"""
@@ -235,223 +326,217 @@ class MedicalDashboard:
         parts = age_range.split('-')
         return int(parts[0])
     
+    @perf.timed
     def display_age_analysis(self):
         """Display age analysis"""
         st.header("🎂 Age Group Analysis")
+        import plotly.express as px
         
-        if not self.processed_data['age_groups']:
+        df_ages = self.view('age_groups')
+        if df_ages.empty:
             st.warning("No age analysis data available")
             return
             
         # Main age group analysis
-        age_data = []
-        for age_group, stats in self.processed_data['age_groups'].items():
-            rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-            age_data.append({
-                'Age_Group': age_group.replace('_', ' '),
-                'Appointments_Attended': stats['Attended'],
-                'No_Shows': stats['NoShow'],
-                'No_Show_Rate': rate
-            })
-        
-        df_ages = pd.DataFrame(age_data).sort_values('No_Show_Rate', ascending=False)
+        df_ages = df_ages[['Age_Group', 'Appointments_Attended', 'No_Shows', 'No_Show_Rate']]
+        df_ages = df_ages.sort_values('No_Show_Rate', ascending=False)
         
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = px.bar(df_ages, x='Age_Group', y='No_Show_Rate',
-                        title='No-Show Rate by Age Group',
-                        color='No_Show_Rate',
-                        color_continuous_scale='RdYlGn_r')
-            fig.update_layout(xaxis_title='Age Group', yaxis_title='No-Show Rate (%)')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('age/bar', lambda: px.bar(
+                df_ages, x='Age_Group', y='No_Show_Rate',
+                title='No-Show Rate by Age Group',
+                color='No_Show_Rate',
+                color_continuous_scale='RdYlGn_r'
+            ).update_layout(xaxis_title='Age Group', yaxis_title='No-Show Rate (%)'))
+            plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Detailed age analysis
-            detailed_age_data = []
-            for age_range, stats in self.processed_data['detailed_age'].items():
-                if stats['Attended'] + stats['NoShow'] > 50:  # Filter small sample groups
-                    rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-                    detailed_age_data.append({
-                        'Age_Range': age_range,
-                        'Appointments_Attended': stats['Attended'],
-                        'No_Shows': stats['NoShow'],
-                        'No_Show_Rate': rate
-                    })
-            detailed_age_data.sort(key=lambda x: self.sort_age_ranges(x['Age_Range']))
+            df_detailed = self.view('detailed_age')
+            df_detailed = self.precise(df_detailed)  # Filter imprecise small sample groups
+            df_detailed = df_detailed.sort_values('Age_Range', key=lambda s: s.map(self.sort_age_ranges))
             
-            if detailed_age_data:
-                df_detailed = pd.DataFrame(detailed_age_data)
-                fig = px.line(df_detailed, x='Age_Range', y='No_Show_Rate',
-                             title='Detailed Age No-Show Rate Trend', markers=True)
-                fig.update_layout(xaxis_title='Age Range', yaxis_title='No-Show Rate (%)')
-                st.plotly_chart(fig, use_container_width=True)
+            if not df_detailed.empty:
+                fig = self.rendered('age/line', lambda: px.line(
+                    df_detailed, x='Age_Range', y='No_Show_Rate',
+                    title='Detailed Age No-Show Rate Trend', markers=True
+                ).update_layout(xaxis_title='Age Range', yaxis_title='No-Show Rate (%)'))
+                plotly_chart(fig, use_container_width=True)
         
         st.subheader("🚨 Age Detailed Data")
-        st.dataframe(df_ages.style.format({
+        self.paged_table('age/table', lambda: df_ages, {
             'Appointments_Attended': '{:,}',
             'No_Shows': '{:,}',
             'No_Show_Rate': '{:.1f}%'
-        }), use_container_width=True)
+        })
     
+    @perf.timed
     def display_health_analysis(self):
         """Display health conditions analysis"""
         st.header("🏥 Health Conditions Analysis")
+        import plotly.express as px
         
-        if not self.processed_data['health_conditions']:
+        df_health = self.view('health_conditions')
+        if df_health.empty:
             st.warning("No health conditions analysis data available")
             return
             
-        health_data = []
-        for condition, stats in self.processed_data['health_conditions'].items():
-            if stats['Attended'] + stats['NoShow'] > 50:  # Filter small sample groups
-                rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-                health_data.append({
-                    'Condition': condition.replace('_', ' '),
-                    'Appointments_Attended': stats['Attended'],
-                    'No_Shows': stats['NoShow'],
-                    'No_Show_Rate': rate
-                })
-        
-        if not health_data:
+        df_health = self.precise(df_health)  # Filter imprecise small sample groups
+        if df_health.empty:
             return
             
-        df_health = pd.DataFrame(health_data).sort_values('No_Show_Rate')
+        df_health = df_health[['Condition', 'Appointments_Attended', 'No_Shows', 'No_Show_Rate']]
+        df_health = df_health.sort_values('No_Show_Rate')
         
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = px.bar(df_health, x='No_Show_Rate', y='Condition', orientation='h',
-                        title='No-Show Rate by Health Condition',
-                        color='No_Show_Rate',
-                        color_continuous_scale='RdYlGn_r')
-            fig.update_layout(yaxis_title='Health Condition', xaxis_title='No-Show Rate (%)')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('health/bar', lambda: px.bar(
+                df_health, x='No_Show_Rate', y='Condition', orientation='h',
+                title='No-Show Rate by Health Condition',
+                color='No_Show_Rate',
+                color_continuous_scale='RdYlGn_r'
+            ).update_layout(yaxis_title='Health Condition', xaxis_title='No-Show Rate (%)'))
+            plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Appointment count comparison
-            fig = px.pie(df_health, values='Appointments_Attended', names='Condition',
-                        title='Appointment Distribution by Health Condition')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('health/pie', lambda: px.pie(
+                df_health, values='Appointments_Attended', names='Condition',
+                title='Appointment Distribution by Health Condition'))
+            plotly_chart(fig, use_container_width=True)
         
         st.subheader("Health Conditions Detailed Data")
-        st.dataframe(df_health.style.format({
+        self.paged_table('health/table', lambda: df_health, {
             'Appointments_Attended': '{:,}',
             'No_Shows': '{:,}',
             'No_Show_Rate': '{:.1f}%'
-        }), use_container_width=True)
+        })
     
+    @perf.timed
     def display_geographical_analysis(self):
         """Display geographical analysis"""
         st.header("🗺️ Geographical Analysis")
+        import plotly.express as px
+        from rate_stats import SIGNIFICANCE
         
-        if not self.processed_data['neighbourhoods']:
+        df_neighbourhood = self.view('neighbourhoods')
+        if df_neighbourhood.empty:
             st.warning("No geographical analysis data available")
             return
             
-        neighbourhood_data = []
-        for neighbourhood, stats in self.processed_data['neighbourhoods'].items():
-            total = stats['Attended'] + stats['NoShow']
-            if total > 50:  # Only show neighborhoods with sufficient samples
-                rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-                neighbourhood_data.append({
-                    'Neighborhood': neighbourhood.replace('_', ' '),
-                    'Appointments_Attended': stats['Attended'],
-                    'No_Shows': stats['NoShow'],
-                    'Total_Appointments': total,
-                    'No_Show_Rate': rate
-                })
-        
-        if not neighbourhood_data:
+        # Only show neighborhoods whose rate is known to within MAX_INTERVAL_WIDTH points
+        hidden = len(df_neighbourhood)
+        df_neighbourhood = self.precise(df_neighbourhood)
+        hidden -= len(df_neighbourhood)
+        
+        if df_neighbourhood.empty:
             st.warning("No neighborhoods with sufficient data to display")
             return
-            
-        df_neighbourhood = pd.DataFrame(neighbourhood_data)
+        if hidden:
+            st.caption(f"{hidden:,} neighborhoods with a 95% interval wider than "
+                       f"{MAX_INTERVAL_WIDTH:.0f} points are hidden")
+        
+        # Accent- and case-insensitive, typo-tolerant search drives the charts and the table
+        search_term = st.text_input("Search neighborhood name:")
+        df_all, matches = df_neighbourhood, None
+        if search_term:
+            from search_index import NameIndex
+            index = self.rendered('neighbourhoods/index', lambda: NameIndex(
+                df_neighbourhood['Neighborhood'], df_neighbourhood['Total_Appointments']))
+            matches = index.search(search_term)
+            st.caption(f"{len(matches):,} of {len(index):,} neighborhoods match '{search_term}'")
+            if not matches:
+                return
+            df_neighbourhood = df_neighbourhood.iloc[list(matches)]
+        
+        # Ranked by the interval bound, so a high rate must also be a confident one
+        def ranked(df):
+            return df.assign(CI_Plus=df['Rate_CI_High'] - df['No_Show_Rate'],
+                             CI_Minus=df['No_Show_Rate'] - df['Rate_CI_Low'])
         
-        # Sort and display highest and lowest neighborhoods
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("🚨 High No-Show Rate Neighborhoods (TOP10)")
-            high_risk_areas = df_neighbourhood.nlargest(10, 'No_Show_Rate')
-            high_risk_areas.sort_values('No_Show_Rate', ascending=True, inplace=True)
-            fig = px.bar(high_risk_areas, x='No_Show_Rate', y='Neighborhood', orientation='h',
-                        title='Top 10 High No-Show Rate Neighborhoods',
-                        color='No_Show_Rate', color_continuous_scale='Reds')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered(('neighbourhoods/high', search_term), lambda: px.bar(
+                ranked(df_neighbourhood.nlargest(10, 'Rate_CI_Low').sort_values('Rate_CI_Low', ascending=True)),
+                x='No_Show_Rate', y='Neighborhood', orientation='h', error_x='CI_Plus', error_x_minus='CI_Minus',
+                title='Top 10 High No-Show Rate Neighborhoods (by 95% lower bound)',
+                color='No_Show_Rate', color_continuous_scale='Reds'))
+            plotly_chart(fig, use_container_width=True)
         
         with col2:
             st.subheader("✅ Low No-Show Rate Neighborhoods (TOP10)")
-            low_risk_areas = df_neighbourhood.nsmallest(10, 'No_Show_Rate')
-            low_risk_areas.sort_values('No_Show_Rate', ascending=False, inplace=True)
-            fig = px.bar(low_risk_areas, x='No_Show_Rate', y='Neighborhood', orientation='h',
-                        title='Top 10 Low No-Show Rate Neighborhoods',
-                        color='No_Show_Rate', color_continuous_scale='Greens_r')
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Interactive data table
+            fig = self.rendered(('neighbourhoods/low', search_term), lambda: px.bar(
+                ranked(df_neighbourhood.nsmallest(10, 'Rate_CI_High').sort_values('Rate_CI_High', ascending=False)),
+                x='No_Show_Rate', y='Neighborhood', orientation='h', error_x='CI_Plus', error_x_minus='CI_Minus',
+                title='Top 10 Low No-Show Rate Neighborhoods (by 95% upper bound)',
+                color='No_Show_Rate', color_continuous_scale='Greens_r'))
+            plotly_chart(fig, use_container_width=True)
+        significant = int((df_neighbourhood['P_Value'] < SIGNIFICANCE).sum())
+        st.caption(f"{significant:,} of {len(df_neighbourhood):,} neighborhoods differ significantly "
+                   f"(p < {SIGNIFICANCE}) from the rest of the appointments")
+        
+        # Interactive data table, best matches first; the view is built once for every search
         st.subheader("Neighborhood Data Query")
-        search_term = st.text_input("Search neighborhood name:")
-        
-        if search_term:
-            filtered_data = df_neighbourhood[
-                df_neighbourhood['Neighborhood'].str.contains(search_term, case=False, na=False)
-            ]
-        else:
-            filtered_data = df_neighbourhood
-        
-        st.dataframe(filtered_data.style.format({
+        self.paged_table('neighbourhoods/table', lambda: df_all, {
             'Appointments_Attended': '{:,}',
             'No_Shows': '{:,}',
             'Total_Appointments': '{:,}',
-            'No_Show_Rate': '{:.1f}%'
-        }), use_container_width=True, height=400)
+            'No_Show_Rate': '{:.1f}%',
+            'Rate_CI_Low': '{:.1f}%',
+            'Rate_CI_High': '{:.1f}%',
+            'P_Value': '{:.3g}'
+        }, rows=matches)
     
+    @perf.timed
     def display_intervention_analysis(self):
         """Display intervention analysis"""
         st.header("📱 SMS Intervention Analysis")
+        import plotly.express as px
+        from rate_stats import SIGNIFICANCE
         
-        if not self.processed_data['sms_intervention']:
+        df_intervention = self.view('sms_intervention')
+        if df_intervention.empty:
             st.warning("No intervention analysis data available")
             return
-            
-        intervention_data = []
-        for intervention, stats in self.processed_data['sms_intervention'].items():
-            rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-            intervention_data.append({
-                'Intervention_Group': 'SMS Received' if 'SMS_RECEIVED' in intervention else 'No SMS',
-                'Appointments_Attended': stats['Attended'],
-                'No_Shows': stats['NoShow'],
-                'No_Show_Rate': rate
-            })
-        
-        df_intervention = pd.DataFrame(intervention_data)
         
         col1, col2 = st.columns(2)
         
         with col1:
-            fig = px.bar(df_intervention, x='Intervention_Group', y='No_Show_Rate',
-                        title='SMS Intervention Effectiveness',
-                        color='No_Show_Rate',
-                        color_continuous_scale='RdYlGn_r')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('sms/bar', lambda: px.bar(
+                df_intervention, x='Intervention_Group', y='No_Show_Rate',
+                title='SMS Intervention Effectiveness',
+                color='No_Show_Rate',
+                color_continuous_scale='RdYlGn_r'))
+            plotly_chart(fig, use_container_width=True)
         
         with col2:
             # SMS distribution
-            df_SMS_dist = pd.DataFrame({
-                'Count' : [
-                    df_intervention[df_intervention['Intervention_Group'] == 'SMS Received']['Appointments_Attended'].iloc[0] + df_intervention[df_intervention['Intervention_Group'] == 'SMS Received']['No_Shows'].iloc[0], 
-                    df_intervention[df_intervention['Intervention_Group'] == 'No SMS']['Appointments_Attended'].iloc[0] + df_intervention[df_intervention['Intervention_Group'] == 'No SMS']['No_Shows'].iloc[0]
-                ],
-                'Intervention_Group': ['SMS Received','No SMS']
-            })
-            fig = px.pie(df_SMS_dist, values='Count', names='Intervention_Group', title='SMS Distribution')
-            st.plotly_chart(fig, use_container_width=True)
+            fig = self.rendered('sms/pie', lambda: px.pie(
+                df_intervention[['Intervention_Group', 'Total_Appointments']].rename(
+                    columns={'Total_Appointments': 'Count'}),
+                values='Count', names='Intervention_Group', title='SMS Distribution'))
+            plotly_chart(fig, use_container_width=True)
         
         # Display key insights
+        groups = df_intervention.set_index('Intervention_Group')
+        rates = groups['No_Show_Rate']
+        if 'SMS Received' not in rates.index or 'No SMS' not in rates.index:
+            return
         st.subheader("Key Findings")
-        sms_received = df_intervention[df_intervention['Intervention_Group'] == 'SMS Received']['No_Show_Rate'].iloc[0]
-        no_sms = df_intervention[df_intervention['Intervention_Group'] == 'No SMS']['No_Show_Rate'].iloc[0]
+        sms_received = rates['SMS Received']
+        no_sms = rates['No SMS']
+        # Two groups: SMS Received against the rest is exactly SMS against no SMS
+        p_value = groups.loc['SMS Received', 'P_Value']
+        if p_value >= SIGNIFICANCE:
+            st.warning(f"The difference ({sms_received:.1f}% vs {no_sms:.1f}%) is not statistically "
+                       f"significant (two-proportion z-test p = {p_value:.3g})")
+            return
+        st.caption(f"Two-proportion z-test p = {p_value:.3g} (significant at {SIGNIFICANCE})")
         
         if sms_received > no_sms:
             st.error(f"🚨 Important Finding: Patients who received SMS had higher no-show rate ({sms_received:.1f}%) than those who didn't ({no_sms:.1f}%)")
@@ -464,32 +549,26 @@ class MedicalDashboard:
         else:
             st.success(f"✅ SMS Intervention Effective: Patients who received SMS had lower no-show rate ({sms_received:.1f}%) than those who didn't ({no_sms:.1f}%)")
     
+    @perf.timed
     def display_lead_time_analysis(self):
         """Display lead time analysis"""
         st.header("⏰ Appointment Lead Time Analysis")
+        import plotly.express as px
         
-        if not self.processed_data['lead_time']:
+        df_lead_time = self.view('lead_time')
+        if df_lead_time.empty:
             st.warning("No lead time analysis data available")
             return
             
-        lead_time_data = []
-        for lead_time, stats in self.processed_data['lead_time'].items():
-            rate = self.calculate_no_show_rate(stats['Attended'], stats['NoShow'])
-            lead_time_data.append({
-                'Lead_Time_Category': lead_time.replace('_', ' '),
-                'Appointments_Attended': stats['Attended'],
-                'No_Shows': stats['NoShow'],
-                'No_Show_Rate': rate
-            })
-        
-        df_lead_time = pd.DataFrame(lead_time_data).sort_values('No_Show_Rate', ascending=False)
-        
-        fig = px.bar(df_lead_time, x='Lead_Time_Category', y='No_Show_Rate',
-                    title='No-Show Rate by Lead Time',
-                    color='No_Show_Rate',
-                    color_continuous_scale='RdYlGn_r')
-        fig.update_layout(xaxis_title='Lead Time Category', yaxis_title='No-Show Rate (%)')
-        st.plotly_chart(fig, use_container_width=True)
+        df_lead_time = df_lead_time.sort_values('No_Show_Rate', ascending=False)
+        
+        fig = self.rendered('lead_time/bar', lambda: px.bar(
+            df_lead_time, x='Lead_Time_Category', y='No_Show_Rate',
+            title='No-Show Rate by Lead Time',
+            color='No_Show_Rate',
+            color_continuous_scale='RdYlGn_r'
+        ).update_layout(xaxis_title='Lead Time Category', yaxis_title='No-Show Rate (%)'))
+        plotly_chart(fig, use_container_width=True)
         
         # Display trend insights
         if len(df_lead_time) > 1:
@@ -506,18 +585,331 @@ class MedicalDashboard:
             - **Difference**: {max_rate - min_rate:.1f} percentage points
             """)
 
+    @perf.timed
+    def display_time_trends(self):
+        """Display daily and rolling no-show rates over the selected date range"""
+        st.header("📅 Time Trends")
+        from time_series import ALL_SERIES, TIME_SERIES_PATH
+        import plotly.express as px
+        
+        if self.timeline is None:
+            st.warning(f"No daily time series found at {TIME_SERIES_PATH}")
+            st.info("Build it from the raw CSV with: python dashboard/time_series.py --input <csv or zip>")
+            return
+        
+        names = [ALL_SERIES] + sorted(name for name in self.timeline.names if name != ALL_SERIES)
+        series = st.selectbox("Series", names, format_func=lambda name: name.replace('_', ' ').title(),
+                              key='time_series')
+        first_day, last_day = self.date_range or (self.timeline.first_day, self.timeline.last_day)
+        # The series file is rebuilt independently of the result file, so key on its own version too
+        key = (series, first_day, last_day, self.timeline_version)
+        
+        def daily():
+            # Rolling windows reach back before the range start, so slice after computing them
+            df = self.timeline.daily(series)
+            return df.iloc[first_day - self.timeline.first_day:last_day - self.timeline.first_day + 1]
+        
+        df_daily = self.rendered(('timeline/daily', key), daily)
+        
+        fig = self.rendered(('timeline/rates', key), lambda: px.line(
+            df_daily, x='Date', y=['No_Show_Rate', 'Rate_7d', 'Rate_28d'],
+            title='Daily and Rolling No-Show Rate'
+        ).update_layout(yaxis_title='No-Show Rate (%)', legend_title='Window'))
+        plotly_chart(fig, use_container_width=True)
+        
+        fig = self.rendered(('timeline/volume', key), lambda: px.bar(
+            df_daily, x='Date', y=['Appointments_Attended', 'No_Shows'],
+            title='Daily Appointments'
+        ).update_layout(yaxis_title='Appointments', legend_title='Status'))
+        plotly_chart(fig, use_container_width=True)
+        
+        if self.date_range == () and self.filtered_views is not None:
+            st.caption("Cross filters do not apply to the daily time series")
+
+    @perf.timed
+    def display_patient_history(self, history_file=None):
+        """Display no-show rates conditioned on each patient's earlier appointments"""
+        st.header("🔁 Patient History Analysis")
+        import plotly.express as px
+        from patient_history import HISTORY_PATH, get_history_cache
+        from result_cache import file_version
+        history_file = history_file or HISTORY_PATH
+        
+        try:
+            views, patients = get_history_cache().get(history_file)
+        except FileNotFoundError:
+            st.warning(f"No patient history results found at {history_file}")
+            st.info("Build them from the raw CSV with: python dashboard/patient_history.py --input <csv or zip>")
+            return
+        version = file_version(history_file)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Patients", f"{patients['PATIENTS_TOTAL']:,}")
+        with col2:
+            st.metric("Patients with Repeat No-Shows", f"{patients['PATIENTS_REPEAT_NOSHOW']:,}")
+        with col3:
+            share = patients['PATIENTS_REPEAT_NOSHOW'] / max(patients['PATIENTS_TOTAL'], 1) * 100
+            st.metric("Repeat No-Show Share", f"{share:.1f}%")
+        
+        charts = [
+            ('PREVIOUS_OUTCOME', "Previous Appointment Outcome"),
+            ('PRIOR_NOSHOW_RATE', "Prior No-Show Rate (%)"),
+            ('PRIOR_NOSHOWS', "Prior No-Shows"),
+            ('NOSHOW_STREAK', "Consecutive No-Shows Before the Appointment"),
+        ]
+        for row in range(0, len(charts), 2):
+            for column, (feature, title) in zip(st.columns(2), charts[row:row + 2]):
+                with column:
+                    fig = self.rendered(('history/' + feature, version), lambda: px.bar(
+                        views[feature], x='Category', y='No_Show_Rate',
+                        title=f'No-Show Rate by {title}',
+                        color='No_Show_Rate',
+                        color_continuous_scale='RdYlGn_r'
+                    ).update_layout(xaxis_title=title, yaxis_title='No-Show Rate (%)'))
+                    plotly_chart(fig, use_container_width=True)
+        
+        fig = self.rendered(('history/PRIOR_APPOINTMENTS', version), lambda: px.line(
+            views['PRIOR_APPOINTMENTS'], x='Category', y='No_Show_Rate',
+            title='No-Show Rate by Number of Prior Appointments', markers=True
+        ).update_layout(xaxis_title='Prior Appointments', yaxis_title='No-Show Rate (%)'))
+        plotly_chart(fig, use_container_width=True)
+        
+        if self.filtered_views is not None:
+            st.caption("Patient history is computed over all appointments; filters do not apply")
+
+    @perf.timed
+    def display_sketches(self, sketch_file=None):
+        """Display approximate unique patients and top no-show neighbourhoods from streaming sketches"""
+        st.header("🧮 Approximate Counts")
+        import plotly.express as px
+        from result_cache import file_version
+        from sketches import SKETCH_PATH, TOP_K, get_sketch_cache
+        sketch_file = sketch_file or SKETCH_PATH
+        
+        try:
+            sketches = get_sketch_cache().get(sketch_file)
+        except FileNotFoundError:
+            st.warning(f"No sketches found at {sketch_file}")
+            st.info("Build them with: python dashboard/sketches.py --input <csv or zip> "
+                    "(or aggregation_engine.py --sketches)")
+            return
+        version = file_version(sketch_file)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Records Sketched", f"{sketches.records:,}")
+        with col2:
+            st.metric("Sketch Memory", f"{sketches.nbytes() / 1024:,.0f} KB")
+        
+        st.subheader(f"🚨 Top {TOP_K} Neighborhoods by No-Shows")
+        df_top = self.rendered(('sketches/top', version),
+                               lambda: sketches.top_neighbourhoods().sort_values('No_Shows'))
+        fig = self.rendered(('sketches/top/bar', version), lambda: px.bar(
+            df_top, x='No_Shows', y='Neighborhood', orientation='h',
+            error_x='No_Shows_Error', error_x_minus=[0] * len(df_top),
+            title='Estimated No-Shows (Count-Min; bars may overcount by at most the error bar)',
+            color='No_Show_Rate', color_continuous_scale='Reds'
+        ).update_layout(xaxis_title='No-Shows', yaxis_title='Neighborhood'))
+        plotly_chart(fig, use_container_width=True)
+        
+        st.subheader("Unique Patients per Category")
+        df_patients = self.rendered(('sketches/patients', version), sketches.unique_patients)
+        dataframe(df_patients.style.format({
+            'Unique_Patients': '{:,}',
+            'Low': '{:,}',
+            'High': '{:,}'
+        }), use_container_width=True, hide_index=True)
+        st.caption(f"HyperLogLog estimates; Low-High is a 95% interval. Count-Min estimates never undercount "
+                   f"and exceed the true count by at most {df_top['No_Shows_Error'].max() if len(df_top) else 0:,.0f} "
+                   f"no-shows with probability {1 - math.exp(-sketches.noshows.table.shape[0]):.1%}.")
+
+    @perf.timed
+    def display_data_quality(self, quality_file=None):
+        """Display the rejected-line counters and quarantine published by the ingestion path"""
+        st.header("🧪 Data Quality")
+        import pandas as pd
+        import plotly.express as px
+        from data_quality import load_counters, quality_path, read_quarantine, reject_frame
+        from result_cache import file_version
+        quality_file = quality_file or quality_path(self.data_file)
+        
+        counters = load_counters(quality_file)
+        if counters is None:
+            st.warning(f"No data-quality counters found at {quality_file}")
+            st.info("They are published by: python dashboard/aggregation_engine.py "
+                    "(and updated by incremental_ingest.py)")
+            return
+        version = file_version(quality_file)
+        rejected = sum(counters['rejected'].values())
+        data_lines = counters['lines'] - counters['headers']
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Lines Read", f"{data_lines:,}")
+        with col2:
+            st.metric("Records Counted", f"{counters['records']:,}")
+        with col3:
+            st.metric("Rejected Lines", f"{rejected:,}")
+        with col4:
+            st.metric("Reject Rate", f"{rejected / max(data_lines, 1) * 100:.3f}%")
+        
+        df_rejects = self.rendered(('quality/rejects', version), lambda: reject_frame(counters))
+        fig = self.rendered(('quality/bar', version), lambda: px.bar(
+            df_rejects, x='Rejected_Lines', y='Reason', orientation='h',
+            title='Rejected Lines by Reason (in the order the mapper checks them)',
+            color='Rejected_Lines', color_continuous_scale='Reds'
+        ).update_layout(xaxis_title='Rejected Lines', yaxis_title='Reason', yaxis_autorange='reversed'))
+        plotly_chart(fig, use_container_width=True)
+        dataframe(df_rejects.style.format({
+            'Rejected_Lines': '{:,}',
+            'Share': '{:.3f}%'
+        }), use_container_width=True, hide_index=True)
+        st.caption(f"{len(counters['sources'])} input(s), last updated {counters['updated']}. "
+                   f"MISSING_FIELDS and INVALID_DATE make up Hadoop's MALFORMED_RECORDS counter.")
+        
+        quarantine = counters.get('quarantine')
+        if quarantine and counters['quarantined'] and os.path.exists(quarantine):
+            with st.expander(f"Quarantined Lines ({counters['quarantined']:,} in {quarantine})"):
+                rows = read_quarantine(quarantine, QUARANTINE_PREVIEW_ROWS)
+                dataframe(pd.DataFrame(rows, columns=['Source', 'Byte_Offset', 'Reason', 'Line']),
+                          use_container_width=True, hide_index=True)
+                if counters['quarantined'] > len(rows):
+                    st.caption(f"First {len(rows):,} lines shown")
+        
+        if self.filtered_views is not None:
+            st.caption("Data quality covers every input line; filters do not apply")
+
+    @perf.timed
+    def display_run_comparison(self, store_file=None):
+        """Display deltas, rate drift and key churn across indexed result runs"""
+        st.header("🔀 Run Comparison")
+        import pandas as pd
+        import plotly.express as px
+        from key_grammar import PREFIXES_BY_DIMENSION
+        from result_cache import file_version
+        from snapshot_store import SNAPSHOTS_PATH, get_snapshot_cache
+        store_file = store_file or SNAPSHOTS_PATH
+        
+        try:
+            store = get_snapshot_cache().get(store_file)
+        except FileNotFoundError:
+            st.warning(f"No snapshot store found at {store_file}")
+            st.info("Index result runs with: python dashboard/snapshot_store.py add <result file or output dir>")
+            return
+        version = file_version(store_file)
+        if len(store) < 2:
+            st.warning("At least two indexed runs are needed for a comparison")
+            return
+        
+        names = {run['id']: f"{run['id']} {run['label']}".strip() for run in store.runs}
+        run_ids = store.run_ids()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            base = st.selectbox("Baseline Run", run_ids, index=len(run_ids) - 2, format_func=names.get)
+        with col2:
+            other = st.selectbox("Compared Run", run_ids, index=len(run_ids) - 1, format_func=names.get)
+        with col3:
+            dimension = st.selectbox("Dimension", list(PREFIXES_BY_DIMENSION),
+                                     format_func=lambda d: PREFIXES_BY_DIMENSION[d].column.replace('_', ' '))
+        key_prefix = PREFIXES_BY_DIMENSION[dimension]
+        label = key_prefix.column
+        
+        def labelled(frame):
+            labels = frame['category'].astype('object')
+            if key_prefix.labels:
+                return labels.map(lambda c: key_prefix.labels.get(c, c))
+            return labels.str.replace('_', ' ', regex=False)
+        
+        def diff():
+            df = store.compare(base, other, dimension)
+            df.insert(0, label, labelled(df))
+            return df.reindex(df['rate_drift'].abs().sort_values(ascending=False).index)
+        
+        # Keyed on the store version and the selection, like the other views' data versions
+        pair = (version, base, other, dimension)
+        df_diff = self.rendered(('runs/diff', pair), diff)
+        fig = self.rendered(('runs/drift', pair), lambda: px.bar(
+            df_diff.head(20), x=label, y='rate_drift',
+            title='No-Show Rate Drift (largest 20)',
+            color='rate_drift',
+            color_continuous_scale='RdYlGn_r'
+        ).update_layout(xaxis_title=label.replace('_', ' '), yaxis_title='Rate Drift (percentage points)'))
+        plotly_chart(fig, use_container_width=True)
+        
+        st.subheader("Per-Category Deltas")
+        df_deltas = self.rendered(('runs/deltas', pair), lambda: df_diff.drop(columns=['dimension', 'category']).rename(
+            columns={
+                'base_total': 'Baseline_Appointments',
+                'total': 'Compared_Appointments',
+                'delta': 'Delta',
+                'delta_pct': 'Delta_%',
+                'base_rate': 'Baseline_Rate',
+                'rate': 'Compared_Rate',
+                'rate_drift': 'Rate_Drift'
+            }))
+        dataframe(df_deltas, use_container_width=True, hide_index=True)
+        
+        # Rate trend of the most populous categories across every run
+        def trend():
+            df = store.trend(dimension)
+            top = df.groupby('category')['total'].sum().nlargest(10).index
+            df = df[df['category'].isin(top) & (df['total'] > 0)]
+            return px.line(df.assign(**{label: labelled(df)}), x='run', y='rate', color=label, markers=True,
+                           title='No-Show Rate Across Runs'
+                           ).update_layout(xaxis_title='Run', yaxis_title='No-Show Rate (%)')
+        fig_trend = self.rendered(('runs/trend', version, dimension), trend)
+        plotly_chart(fig_trend, use_container_width=True)
+        
+        appeared, disappeared = self.rendered(('runs/keys', version, base, other),
+                                              lambda: store.key_changes(base, other))
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader(f"Appeared Keys ({len(appeared)})")
+            dataframe(pd.DataFrame({'Key': appeared}), use_container_width=True, hide_index=True)
+        with col2:
+            st.subheader(f"Disappeared Keys ({len(disappeared)})")
+            dataframe(pd.DataFrame({'Key': disappeared}), use_container_width=True, hide_index=True)
+        with st.expander("Key Churn Between Consecutive Runs"):
+            df_churn = self.rendered(('runs/churn', version), store.churn)
+            dataframe(df_churn, use_container_width=True, hide_index=True)
+
+def display_performance_panel(events):
+    """Optional sidebar panel with this run's spans and the metric exports"""
+    enabled = st.sidebar.checkbox("Performance", key='performance_panel',
+                                  help="Time load, processing, views, charts and tables on every rerun")
+    if not enabled:
+        return
+    with st.sidebar.expander("Performance", expanded=True):
+        if not events:
+            st.caption("Spans are recorded from the next rerun on")
+            return
+        import pandas as pd
+        df_spans = pd.DataFrame({
+            'Span': [e['span'] for e in events],
+            'ms': [e['seconds'] * 1000 for e in events],
+            'RSS_Delta_MB': [e['rss_delta_bytes'] / 2 ** 20 for e in events]
+        })
+        st.dataframe(df_spans.style.format({'ms': '{:.1f}', 'RSS_Delta_MB': '{:+.1f}'}),
+                     use_container_width=True, hide_index=True)
+        st.caption(f"Resident memory: {events[-1]['rss_bytes'] / 2 ** 20:,.0f} MB")
+        st.download_button("Prometheus metrics", perf.prometheus_text(),
+                           file_name='metrics.prom', mime='text/plain')
+        st.download_button("Span events (JSON lines)", perf.json_lines(events),
+                           file_name='spans.jsonl', mime='application/x-ndjson')
+
 def main():
+    perf.start_run(st.session_state.get('performance_panel', False))
+    try:
+        show_dashboard()
+    finally:
+        display_performance_panel(perf.end_run())
+
+def show_dashboard():
     st.title("🏥 Medical Appointment Behavior Analysis Dashboard")
     st.markdown("**Hadoop/MapReduce Based Patient No-Show Risk Analysis System**")
     st.markdown("---")
     
-    # Initialize dashboard
-    dashboard = MedicalDashboard()
-    
-    if not dashboard.data:
-        st.error("Unable to load data. Please check if data file exists.")
-        return
-    
     # Sidebar navigation
     st.sidebar.title("Navigation Menu")
     analysis_option = st.sidebar.selectbox(
@@ -529,13 +921,47 @@ def main():
             "Health Conditions Analysis",
             "Geographical Analysis",
             "Intervention Analysis",
-            "Lead Time Analysis"
+            "Lead Time Analysis",
+            "Time Trends",
+            "Patient History",
+            "Approximate Counts",
+            "Data Quality",
+            "Run Comparison"
         ]
     )
     
+    # Cold start: on a session's first run (no filters yet), paint the overview from the
+    # startup artifact before pandas or the result file are loaded
+    status = st.container()
+    startup_overview = None
+    if (analysis_option == "Overview Dashboard" and 'date_range' not in st.session_state
+            and not any(st.session_state.get(f"filter_{axis}") for axis, _ in CROSS_FILTERS)):
+        startup_overview = load_overview(DATA_FILE)
+        if startup_overview is not None:
+            display_startup_overview(startup_overview)
+    
+    # Initialize dashboard
+    with status:
+        dashboard = MedicalDashboard()
+    
+    if not dashboard.data:
+        st.error("Unable to load data. Please check if data file exists.")
+        return
+    
+    date_range = dashboard.display_date_range()
+    dashboard.apply_filters(dashboard.display_cross_filters(), date_range)
+    if dashboard.date_range:
+        from time_series import to_date
+        st.info(f"Date range view: appointments from {to_date(date_range[0])} to {to_date(date_range[1])}")
+    elif dashboard.filtered_views is not None:
+        st.info(f"Cross-filtered view: {len(dashboard.filters)} filter(s) applied to the count cube")
+        if date_range:
+            st.caption("The date range is ignored while cross filters are selected")
+    
     # Display selected analysis dimension
     if analysis_option == "Overview Dashboard":
-        dashboard.display_overview()
+        if startup_overview is None or dashboard.filtered_views is not None:
+            dashboard.display_overview()
     elif analysis_option == "Gender Analysis":
         dashboard.display_gender_analysis()
     elif analysis_option == "Age Analysis":
@@ -548,9 +974,30 @@ def main():
         dashboard.display_intervention_analysis()
     elif analysis_option == "Lead Time Analysis":
         dashboard.display_lead_time_analysis()
+    elif analysis_option == "Time Trends":
+        dashboard.display_time_trends()
+    elif analysis_option == "Patient History":
+        dashboard.display_patient_history()
+    elif analysis_option == "Approximate Counts":
+        dashboard.display_sketches()
+    elif analysis_option == "Data Quality":
+        dashboard.display_data_quality()
+    elif analysis_option == "Run Comparison":
+        dashboard.display_run_comparison()
     
     # Footer information
     st.sidebar.markdown("---")
+    cache_stats = dashboard.cache.stats()
+    st.sidebar.caption(
+        f"Result cache: {cache_stats['hits']:,} hits / {cache_stats['misses']:,} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate)"
+    )
+    render_stats = dashboard.renders.stats()
+    st.sidebar.caption(
+        f"Render cache: {render_stats['hits']:,} hits / {render_stats['misses']:,} misses, "
+        f"{render_stats['bytes'] / 2 ** 20:.1f} MB; "
+        f"{render_stats['cold_ms']:.1f} ms cold vs {render_stats['warm_ms']:.3f} ms warm per element"
+    )
     st.sidebar.info(
         """
         **Development Information**
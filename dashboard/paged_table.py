@@ -0,0 +1,79 @@
+"""
+Server-Side Paged Tables
+zeli8888.ccproject.patient_behavior
+
+Tables kept as one NumPy array per column, sorted and filtered on the
+server, of which only the visible page is formatted and sent to the
+browser. Sort orders are computed once per column and direction, so
+paging, re-sorting and filtering never rebuild the underlying view and
+the payload stays one page whatever the row count.
+"""
+
+import numpy as np
+import pandas as pd
+
+PAGE_ROWS = 50
+DEFAULT_ORDER = 'Default'
+
+
+class TableView:
+    """Columnar table with cached sort orders and per-page lazy formatting"""
+
+    def __init__(self, frame, formats=None):
+        self.columns = list(frame.columns)
+        self.arrays = {column: frame[column].to_numpy() for column in self.columns}
+        self.formats = dict(formats or {})
+        self.rows = len(frame)
+        self._orders = {}
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns and cached orders"""
+        total = sum(array.nbytes for array in self.arrays.values())
+        return total + sum(order.nbytes for order in self._orders.values())
+
+    def order(self, column=DEFAULT_ORDER, ascending=True):
+        """Row positions sorted by column (stable; the original order for DEFAULT_ORDER)"""
+        if column == DEFAULT_ORDER:
+            positions = np.arange(self.rows)
+            return positions if ascending else positions[::-1]
+        key = (column, ascending)
+        if key not in self._orders:
+            # Sorting dense ranks keeps ties in their original order in both directions
+            _, ranks = np.unique(self.arrays[column], return_inverse=True)
+            self._orders[key] = np.argsort(ranks if ascending else -ranks, kind='stable')
+        return self._orders[key]
+
+    def select(self, rows=None, column=DEFAULT_ORDER, ascending=True):
+        """Ordered row positions, restricted to rows when given
+
+        With DEFAULT_ORDER the order of rows itself is kept (e.g. search ranking).
+        """
+        if rows is None:
+            return self.order(column, ascending)
+        rows = np.asarray(rows, dtype='int64')
+        if column == DEFAULT_ORDER:
+            return rows if ascending else rows[::-1]
+        order = self.order(column, ascending)
+        keep = np.zeros(self.rows, dtype=bool)
+        keep[rows] = True
+        return order[keep[order]]
+
+    def page(self, positions, page=1, page_rows=PAGE_ROWS):
+        """DataFrame of display strings for one page of positions"""
+        start = (page - 1) * page_rows
+        positions = positions[start:start + page_rows]
+        data = {}
+        for column in self.columns:
+            values = self.arrays[column][positions]
+            fmt = self.formats.get(column)
+            data[column] = [fmt.format(v) for v in values.tolist()] if fmt else values
+        return pd.DataFrame(data, index=pd.RangeIndex(start + 1, start + 1 + len(positions)))
+
+
+def page_count(rows, page_rows=PAGE_ROWS):
+    """Number of pages for rows rows (at least one)"""
+    return max(1, -(-rows // page_rows))
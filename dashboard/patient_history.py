@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Patient-Level Repeat No-Show Analysis
+zeli8888.ccproject.patient_behavior
+
+Orders every appointment by PatientId and appointment date with a
+bounded-memory external sort (sorted runs spilled to disk, then a blocked
+k-way merge) and derives per-patient history features: prior appointments,
+prior no-shows, the no-show streak leading into an appointment and the
+previous outcome. Attended/no-show counts per feature bucket are written
+in the MapReduce result format.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from key_grammar import STATUSES, VIEW_COLUMNS, compute_rates, format_key
+from result_cache import ResultCache, read_results
+
+HISTORY_PATH = 'data/patient_history_results.txt'
+DEFAULT_MEMORY_MB = 256
+MAX_FAN_IN = 64
+
+# One record per appointment; order = appointment day << SEQ_BITS | file position
+RUN_DTYPE = np.dtype([('patient', '<i8'), ('order', '<i8'), ('noshow', 'i1')])
+SEQ_BITS = 40
+# Bytes alive per record of a merged block while its features are computed
+FEATURE_BYTES = 192
+
+# Feature -> (upper bounds of every bucket but the last, bucket labels)
+FEATURES = {
+    'PRIOR_APPOINTMENTS': ((0, 1, 4, 9), ('0', '1', '2-4', '5-9', '10+')),
+    'PRIOR_NOSHOWS': ((0, 1, 2, 4), ('0', '1', '2', '3-4', '5+')),
+    'NOSHOW_STREAK': ((0, 1, 2), ('0', '1', '2', '3+')),
+}
+PREVIOUS_OUTCOMES = ('FIRST_VISIT', 'ATTENDED', 'NOSHOW')
+PRIOR_RATE_BOUNDS = (0, 24, 49, 74)
+PRIOR_RATE_LABELS = ('FIRST_VISIT', '0', '1-24', '25-49', '50-74', '75-100')
+FEATURE_LABELS = dict({name: labels for name, (_, labels) in FEATURES.items()},
+                      PREVIOUS_OUTCOME=PREVIOUS_OUTCOMES, PRIOR_NOSHOW_RATE=PRIOR_RATE_LABELS)
+PATIENT_KEYS = ('PATIENTS_TOTAL', 'PATIENTS_REPEAT_NOSHOW')
+
+
+def budget_rows(memory_bytes, copies):
+    """Records that fit in memory_bytes when copies of them are alive at once"""
+    return max(1024, memory_bytes // (RUN_DTYPE.itemsize * copies))
+
+
+def sort_block(block):
+    return block[np.lexsort((block['order'], block['patient']))]
+
+
+def _write_run(blocks, run_dir, paths):
+    path = os.path.join(run_dir, f"run-{len(paths):05d}.bin")
+    sort_block(np.concatenate(blocks)).tofile(path)
+    paths.append(path)
+
+
+def spill_runs(input_path, run_dir, memory_bytes, member=engine.CSV_MEMBER):
+    """Parse the CSV in bounded chunks and write sorted runs; returns the run paths"""
+    # Half the budget for parsing, which expands text about 32-fold, and half
+    # for the run being filled, of which a sort holds about three copies
+    chunk_size = max(256 * 1024, memory_bytes // 64)
+    run_rows = budget_rows(memory_bytes // 2, 3)
+    paths, blocks, buffered = [], [], 0
+    seq = 0
+    with engine.open_appointments(input_path, member) as stream:
+        for text in engine.iter_text_chunks(stream, chunk_size):
+            records, _ = engine.parse_chunk(text)
+            records = records[records['patient_id'].to_numpy() >= 0]
+            block = np.empty(len(records), dtype=RUN_DTYPE)
+            block['patient'] = records['patient_id'].to_numpy()
+            block['order'] = ((records['appointment_day'].to_numpy().astype('int64') << SEQ_BITS)
+                              + np.arange(seq, seq + len(records)))
+            block['noshow'] = records['noshow'].to_numpy()
+            seq += len(records)
+            del records, text
+            while buffered + len(block) >= run_rows:
+                take = run_rows - buffered
+                _write_run(blocks + [block[:take]], run_dir, paths)
+                blocks, buffered, block = [], 0, block[take:]
+            blocks.append(block)
+            buffered += len(block)
+    if buffered:
+        _write_run(blocks, run_dir, paths)
+    return paths
+
+
+def _at_most(block, patient, order):
+    """Length of the sorted block's prefix with keys <= (patient, order)"""
+    return int(((block['patient'] < patient) |
+                ((block['patient'] == patient) & (block['order'] <= order))).sum())
+
+
+def iter_merged(paths, block_rows):
+    """Sorted blocks of the k-way merge of sorted run files
+
+    Each step emits every buffered record up to the smallest last key among
+    runs that still have data on disk, so no later record can precede it.
+    """
+    files = [open(path, 'rb') for path in paths]
+    try:
+        buffers = [np.fromfile(f, RUN_DTYPE, block_rows) for f in files]
+        exhausted = [len(b) < block_rows for b in buffers]
+        while any(len(b) for b in buffers):
+            pending = [b[-1] for b, done in zip(buffers, exhausted) if len(b) and not done]
+            bound = min((int(r['patient']), int(r['order'])) for r in pending) if pending else None
+            parts = []
+            for i, buffer in enumerate(buffers):
+                n = len(buffer) if bound is None else _at_most(buffer, *bound)
+                parts.append(buffer[:n])
+                buffers[i] = buffer[n:]
+                if not len(buffers[i]) and not exhausted[i]:
+                    buffers[i] = np.fromfile(files[i], RUN_DTYPE, block_rows)
+                    exhausted[i] = len(buffers[i]) < block_rows
+            yield sort_block(np.concatenate(parts))
+    finally:
+        for f in files:
+            f.close()
+
+
+def merge_runs(paths, run_dir, memory_bytes):
+    """Merge runs in passes of at most MAX_FAN_IN until one pass can finish the merge"""
+    generation = 0
+    while len(paths) > MAX_FAN_IN:
+        merged = []
+        block_rows = budget_rows(memory_bytes, 3 * (MAX_FAN_IN + 1))
+        for start in range(0, len(paths), MAX_FAN_IN):
+            group = paths[start:start + MAX_FAN_IN]
+            path = os.path.join(run_dir, f"merge-{generation}-{len(merged):05d}.bin")
+            with open(path, 'wb') as f:
+                for block in iter_merged(group, block_rows):
+                    block.tofile(f)
+            for old in group:
+                os.remove(old)
+            merged.append(path)
+        paths = merged
+        generation += 1
+    return paths
+
+
+def _bucket(values, bounds):
+    return np.searchsorted(np.asarray(bounds), values, side='left')
+
+
+class HistoryAccumulator:
+    """Per-appointment history features over patient-ordered blocks, carrying the open patient"""
+
+    def __init__(self):
+        self.sizes = {name: np.zeros((len(labels), 2), dtype='int64') for name, labels in FEATURE_LABELS.items()}
+        self.patients = 0
+        self.repeat_noshow_patients = 0
+        # Open patient at the end of the last block: (id, appointments, no-shows, streak, last no-show)
+        self._patient = None
+
+    def _count(self, name, codes, noshow):
+        self.sizes[name] += np.bincount(codes * 2 + noshow,
+                                        minlength=2 * len(FEATURE_LABELS[name])).reshape(-1, 2)
+
+    def add(self, block):
+        """Fold one block of records sorted by (patient, order)"""
+        n = len(block)
+        if not n:
+            return
+        patient = block['patient']
+        noshow = block['noshow'].astype('int64')
+        index = np.arange(n)
+        starts = np.ones(n, dtype=bool)
+        starts[1:] = patient[1:] != patient[:-1]
+        group_start = np.maximum.accumulate(np.where(starts, index, 0))
+
+        prior = index - group_start
+        noshow_before = np.cumsum(noshow) - noshow
+        prior_noshows = noshow_before - noshow_before[group_start]
+        # Consecutive no-shows since the last attended appointment of the same patient
+        last_attended = np.maximum.accumulate(np.where(noshow == 0, index + 1, 0))
+        run_start = np.maximum(group_start, np.concatenate([[0], last_attended[:-1]]))
+        streak = index - run_start
+
+        previous = np.where(prior == 0, 0, 1 + np.concatenate([[0], noshow[:-1]]))
+        # The first patient of the block may continue the open patient of the previous one
+        carried = self._patient is not None and self._patient[0] == patient[0]
+        if carried:
+            _, carry_prior, carry_noshows, carry_streak, carry_last = self._patient
+            first = group_start == 0
+            prior[first] += carry_prior
+            prior_noshows[first] += carry_noshows
+            streak[first & (run_start == 0)] += carry_streak
+            previous[0] = 1 + carry_last
+        elif self._patient is not None:
+            self.finish()
+        self._count('PRIOR_APPOINTMENTS', _bucket(prior, FEATURES['PRIOR_APPOINTMENTS'][0]), noshow)
+        self._count('PRIOR_NOSHOWS', _bucket(prior_noshows, FEATURES['PRIOR_NOSHOWS'][0]), noshow)
+        self._count('NOSHOW_STREAK', _bucket(streak, FEATURES['NOSHOW_STREAK'][0]), noshow)
+        self._count('PREVIOUS_OUTCOME', previous, noshow)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prior_rate = np.where(prior > 0, np.ceil(prior_noshows * 100 / np.maximum(prior, 1)), 0)
+        rate_codes = np.where(prior == 0, 0, 1 + _bucket(prior_rate, PRIOR_RATE_BOUNDS))
+        self._count('PRIOR_NOSHOW_RATE', rate_codes, noshow)
+
+        # Close every patient that ends inside the block; the last one stays open
+        self.patients += int(starts.sum()) - int(carried)
+        ends = np.flatnonzero(np.append(starts[1:], True))
+        patient_noshows = prior_noshows[ends] + noshow[ends]
+        self.repeat_noshow_patients += int((patient_noshows[:-1] >= 2).sum())
+        self._patient = (int(patient[-1]), int(prior[-1]) + 1, int(patient_noshows[-1]),
+                         int(streak[-1]) + 1 if noshow[-1] else 0, int(noshow[-1]))
+
+    def finish(self):
+        """Close the open patient"""
+        if self._patient is not None:
+            self.repeat_noshow_patients += int(self._patient[2] >= 2)
+            self._patient = None
+
+    def counts(self):
+        """Result-file counts keyed like the mapper's <FEATURE>_<bucket>_<status>"""
+        counts = {}
+        for name, sizes in self.sizes.items():
+            for label, pair in zip(FEATURE_LABELS[name], sizes.tolist()):
+                for status, value in zip(STATUSES, pair):
+                    if value:
+                        counts[format_key(name + '_', label, status)] = value
+        counts['PATIENTS_TOTAL'] = self.patients
+        counts['PATIENTS_REPEAT_NOSHOW'] = self.repeat_noshow_patients
+        return counts
+
+
+def analyze(input_path=engine.ARCHIVE_PATH, memory_mb=DEFAULT_MEMORY_MB, member=engine.CSV_MEMBER,
+            work_dir=None):
+    """External sort of the appointments by patient and date; return (counts, runs spilled)"""
+    memory_bytes = int(memory_mb * 1024 * 1024)
+    run_dir = tempfile.mkdtemp(prefix='patient-runs-', dir=work_dir)
+    try:
+        paths = spill_runs(input_path, run_dir, memory_bytes, member)
+        spilled = len(paths)
+        paths = merge_runs(paths, run_dir, memory_bytes)
+        accumulator = HistoryAccumulator()
+        block_rows = max(1024, memory_bytes // (FEATURE_BYTES * (len(paths) + 1)))
+        for block in iter_merged(paths, block_rows):
+            accumulator.add(block)
+        accumulator.finish()
+        return accumulator.counts(), spilled
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def history_views(counts):
+    """{feature: display frame in bucket order} and {patient key: count} from history counts"""
+    views = {}
+    for name, labels in FEATURE_LABELS.items():
+        attended = np.array([counts.get(format_key(name + '_', label, 'Attended'), 0) for label in labels])
+        noshow = np.array([counts.get(format_key(name + '_', label, 'NoShow'), 0) for label in labels])
+        total, rate = compute_rates(attended, noshow)
+        view = pd.DataFrame({'Category': [label.replace('_', ' ') for label in labels],
+                             VIEW_COLUMNS['attended']: attended,
+                             VIEW_COLUMNS['noshow']: noshow,
+                             VIEW_COLUMNS['total']: total,
+                             VIEW_COLUMNS['rate']: rate})
+        views[name] = view[view[VIEW_COLUMNS['total']] > 0].reset_index(drop=True)
+    patients = {key: int(counts.get(key, 0)) for key in PATIENT_KEYS}
+    return views, patients
+
+
+def load_history(file_path, version=None):
+    """ResultCache loader for patient history result files"""
+    counts = read_results(file_path)
+    return history_views(dict(zip(counts.index.tolist(), counts.tolist())))
+
+
+_shared_history_cache = ResultCache(loader=load_history)
+
+
+def get_history_cache():
+    """Return the patient history cache shared by every session in this process"""
+    return _shared_history_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Patient-level repeat no-show features via an external sort")
+    parser.add_argument('--input', default=engine.ARCHIVE_PATH, help="appointment CSV or zip archive")
+    parser.add_argument('--member', default=engine.CSV_MEMBER)
+    parser.add_argument('--output', default=HISTORY_PATH)
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_MB,
+                        help="memory budget for sorted runs and merge buffers")
+    parser.add_argument('--work-dir', default=None, help="directory for spilled runs (default: system temp)")
+    args = parser.parse_args(argv)
+
+    print("Starting Patient History Analysis...")
+    start_time = time.perf_counter()
+    counts, spilled = analyze(args.input, args.memory_mb, args.member, args.work_dir)
+    engine.write_results(counts, args.output)
+    print(f"Patients: {counts['PATIENTS_TOTAL']:,} ({counts['PATIENTS_REPEAT_NOSHOW']:,} with repeat no-shows)")
+    print(f"Sorted Runs: {spilled:,}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Dashboard Performance Spans
+zeli8888.ccproject.patient_behavior
+
+Timing and memory spans around the dashboard's hot paths, collected per
+script run for the sidebar Performance panel and aggregated per process
+for export as Prometheus text-format metrics and JSON lines. When a run
+is not instrumented a span costs one thread-local lookup.
+"""
+
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+METRIC_PREFIX = 'dashboard_span'
+# When set, every instrumented run appends to spans.jsonl and rewrites metrics.prom here
+METRICS_DIR = os.environ.get('DASHBOARD_METRICS_DIR')
+ALWAYS_ON = os.environ.get('DASHBOARD_METRICS', '') not in ('', '0')
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class SpanRecorder:
+    """Per-run span events plus process-wide totals per span name"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.totals = {}    # name -> [count, seconds, max seconds, max rss delta, last rss]
+
+    def active(self):
+        return getattr(self._local, 'events', None) is not None
+
+    def start_run(self, enabled):
+        """Begin a script run; spans are only recorded when enabled"""
+        self._local.events = [] if enabled or ALWAYS_ON else None
+        self._local.stack = []
+
+    def end_run(self):
+        """Finish the run, export it if configured and return its events"""
+        events = getattr(self._local, 'events', None)
+        self._local.events = None
+        if events and METRICS_DIR:
+            self.export(METRICS_DIR, events)
+        return events or []
+
+    @contextmanager
+    def _record(self, name):
+        stack = self._local.stack
+        path = '/'.join(stack + [name])
+        stack.append(name)
+        rss_before = rss_bytes()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            rss_after = rss_bytes()
+            stack.pop()
+            event = {
+                'timestamp': time.time(),
+                'span': path,
+                'seconds': seconds,
+                'rss_bytes': rss_after,
+                'rss_delta_bytes': rss_after - rss_before,
+            }
+            self._local.events.append(event)
+            with self._lock:
+                total = self.totals.setdefault(path, [0, 0.0, 0.0, 0, 0])
+                total[0] += 1
+                total[1] += seconds
+                total[2] = max(total[2], seconds)
+                total[3] = max(total[3], event['rss_delta_bytes'])
+                total[4] = rss_after
+
+    def span(self, name):
+        """Context manager timing name (nested under any open span)"""
+        if getattr(self._local, 'events', None) is None:
+            return _NULL_SPAN
+        return self._record(name)
+
+    def timed(self, fn):
+        """Decorator recording a span named after the function"""
+        name = fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(self._local, 'events', None) is None:
+                return fn(*args, **kwargs)
+            with self._record(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def prometheus_text(self):
+        """Process totals in Prometheus text exposition format"""
+        with self._lock:
+            totals = sorted(self.totals.items())
+        lines = [
+            f"# HELP {METRIC_PREFIX}_seconds Wall time spent in dashboard spans.",
+            f"# TYPE {METRIC_PREFIX}_seconds summary",
+        ]
+        for name, (count, seconds, _, _, _) in totals:
+            label = _label(name)
+            lines.append(f"{METRIC_PREFIX}_seconds_count{{span=\"{label}\"}} {count}")
+            lines.append(f"{METRIC_PREFIX}_seconds_sum{{span=\"{label}\"}} {seconds:.6f}")
+        for metric, index, kind, text in (
+                ('max_seconds', 2, 'gauge', "Slowest single execution of the span."),
+                ('max_rss_delta_bytes', 3, 'gauge', "Largest resident set growth during the span."),
+                ('rss_bytes', 4, 'gauge', "Resident set size after the last execution of the span.")):
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {kind}")
+            for name, total in totals:
+                lines.append(f"{METRIC_PREFIX}_{metric}{{span=\"{_label(name)}\"}} {total[index]}")
+        return '\n'.join(lines) + '\n'
+
+    def json_lines(self, events):
+        """One JSON object per span event"""
+        return ''.join(json.dumps(event) + '\n' for event in events)
+
+    def export(self, directory, events):
+        """Append events to spans.jsonl and atomically rewrite metrics.prom"""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'spans.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(self.json_lines(events))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.prom.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, os.path.join(directory, 'metrics.prom'))
+
+
+def _label(name):
+    return name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_recorder = SpanRecorder()
+
+
+def get_recorder():
+    """Return the span recorder shared by every session in this process"""
+    return _recorder
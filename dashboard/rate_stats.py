@@ -0,0 +1,96 @@
+"""
+Vectorized Rate Statistics
+zeli8888.ccproject.patient_behavior
+
+No-show rates with Wilson score intervals and a two-proportion z-test of
+each category against the rest of the appointments, computed for whole
+count arrays (every category of every dimension, or every cube cell) in
+one NumPy pass.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+
+CONFIDENCE = 0.95
+SIGNIFICANCE = 0.05
+
+# Abramowitz & Stegun 7.1.26: erfc(x) = t * P(t) * exp(-x^2), t = 1 / (1 + 0.3275911 x); |error| < 1.5e-7
+_ERFC_T = 0.3275911
+_ERFC_COEFFICIENTS = (1.061405429, -1.453152027, 1.421413741, -0.284496736, 0.254829592)
+
+
+def normal_two_sided_p(z):
+    """Two-sided p-value of standard normal scores, P(|Z| >= |z|)"""
+    x = np.abs(np.asarray(z, dtype='float64')) * np.sqrt(0.5)
+    t = 1.0 / (1.0 + _ERFC_T * x)
+    poly = np.full_like(t, _ERFC_COEFFICIENTS[0])
+    for coefficient in _ERFC_COEFFICIENTS[1:]:
+        poly *= t
+        poly += coefficient
+    poly *= t
+    np.square(x, out=x)
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    poly *= x
+    return np.minimum(poly, 1.0, out=poly)
+
+
+def rate_statistics(attended, noshow, reference=None, confidence=CONFIDENCE):
+    """(total, rate, rate_low, rate_high, z_score, p_value) arrays for per-category counts
+
+    Rates and Wilson interval bounds are in percent. Each category is tested
+    against the rest of reference, the (attended, noshow) totals of the
+    population the categories are drawn from (default: the sums of the
+    inputs). Empty categories get rate 0, interval [0, 100] and p-value 1.
+    """
+    attended = np.asarray(attended, dtype='int64')
+    noshow = np.asarray(noshow, dtype='int64')
+    total = attended + noshow
+    if reference is None:
+        reference = (int(attended.sum()), int(noshow.sum()))
+    population = float(reference[0] + reference[1])
+    population_noshow = float(reference[1])
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    # In-place float64 arithmetic throughout: a few passes over memory per output
+    empty = total == 0
+    n = np.maximum(total, 1).astype('float64')
+    p = noshow / n
+    # Wilson score interval
+    z2n = (z * z) / n
+    scale = 1.0 / (1.0 + z2n)
+    centre = z2n * 0.5
+    centre += p
+    centre *= scale
+    half = p * (1.0 - p)
+    half += z2n * 0.25
+    half /= n
+    np.sqrt(half, out=half)
+    half *= z * 100
+    half *= scale
+    centre *= 100
+    low = np.clip(centre - half, 0.0, 100.0)
+    high = np.clip(centre + half, 0.0, 100.0, out=centre)
+    # Pooled two-proportion z-test: the category versus everyone else
+    rest = population - total
+    np.maximum(rest, 0.0, out=rest)
+    rest_rate = population_noshow - noshow
+    np.maximum(rest_rate, 0.0, out=rest_rate)
+    rest_rate /= np.maximum(rest, 1.0)
+    pooled = population_noshow / population if population > 0 else 0.0
+    np.reciprocal(np.maximum(rest, 1.0, out=z2n), out=z2n)
+    z2n += 1.0 / n
+    z2n *= pooled * (1 - pooled)
+    se = np.sqrt(z2n, out=z2n)
+    z_score = p - rest_rate
+    untestable = empty | (rest <= 0) | (se <= 0)
+    se[untestable] = 1.0
+    z_score /= se
+    z_score[untestable] = 0.0
+    p *= 100
+    if empty.any():
+        p[empty] = 0.0
+        low[empty] = 0.0
+        high[empty] = 100.0
+    return total, p, low, high, z_score, normal_two_sided_p(z_score)
@@ -0,0 +1,98 @@
+"""
+Rendered Figure and Table Cache
+zeli8888.ccproject.patient_behavior
+
+Plotly figures and formatted tables keyed by (element, data version,
+filters), shared by every session and evicted least-recently-used once
+their serialized size passes a byte budget. Build times of misses and
+lookup times of hits are kept so cold and warm renders can be compared.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io as pio
+
+RENDER_CACHE_BYTES = int(os.environ.get('DASHBOARD_RENDER_CACHE_MB', '64')) * 1024 * 1024
+
+
+def element_size(value):
+    """Approximate bytes held by a cached figure or table"""
+    if hasattr(value, 'to_plotly_json'):
+        return len(pio.to_json(value, validate=False))
+    if hasattr(value, 'nbytes'):           # search indexes and arrays
+        return int(value.nbytes)
+    data = getattr(value, 'data', value)     # pandas Styler wraps its frame
+    if hasattr(data, 'memory_usage'):
+        return int(data.memory_usage(deep=True).sum())
+    return 1024
+
+
+class RenderCache:
+    """Size-bounded LRU cache of built display elements"""
+
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.cold_seconds = 0.0
+        self.warm_seconds = 0.0
+
+    def get(self, key, build):
+        """Cached element for key, calling build() only on a miss"""
+        start_time = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.warm_seconds += time.perf_counter() - start_time
+                return entry[0]
+
+        value = build()
+        size = element_size(value)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, size)
+                self.bytes += size
+                # Always keep the newest entry, even when it alone exceeds the budget
+                while self.bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.bytes -= evicted
+                    self.evictions += 1
+            self.misses += 1
+            self.cold_seconds += time.perf_counter() - start_time
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters plus mean cold (build) and warm (hit) time per element in ms"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'evictions': self.evictions,
+            'cold_ms': self.cold_seconds * 1000 / self.misses if self.misses else 0.0,
+            'warm_ms': self.warm_seconds * 1000 / self.hits if self.hits else 0.0,
+        }
+
+
+_shared_render_cache = RenderCache()
+
+
+def get_render_cache():
+    """Return the render cache shared by every session in this process"""
+    return _shared_render_cache
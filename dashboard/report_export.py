@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Batch Report Export
+zeli8888.ccproject.patient_behavior
+
+Renders the dashboard's analysis views (overview, gender, age, health,
+geographical, SMS and lead time) for one or many result snapshots and
+cross-filters into self-contained HTML and JSON reports, without a
+browser. Display methods run against a recording stand-in for Streamlit.
+Reports are fanned out across a process pool, and each result file and
+count cube is parsed once; forked workers share the parent's parsed copy.
+"""
+
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+
+from count_cube import CUBE_PATH, FILTER_AXES, parse_filters
+from time_series import TIME_SERIES_PATH
+
+REPORT_DIR = 'data/reports'
+DATA_FILE = 'patient_demographics_results.txt'
+TABLE_ROWS = 500
+
+# (display method, section title) of every view in a report
+VIEWS = [
+    ('display_overview', "Overview Dashboard"),
+    ('display_gender_analysis', "Gender Analysis"),
+    ('display_age_analysis', "Age Analysis"),
+    ('display_health_analysis', "Health Conditions Analysis"),
+    ('display_geographical_analysis', "Geographical Analysis"),
+    ('display_intervention_analysis', "Intervention Analysis"),
+    ('display_lead_time_analysis', "Lead Time Analysis")
+]
+
+STYLE = """
+body { font-family: sans-serif; margin: 2em auto; max-width: 1200px; color: #262730; }
+nav a { margin-right: 1em; }
+section { border-top: 1px solid #ddd; margin-top: 2em; }
+.metrics { display: flex; gap: 2em; }
+.metric .value { font-size: 1.8em; }
+.message { white-space: pre-line; padding: 0.6em 1em; border-radius: 0.4em; margin: 0.6em 0; }
+.info { background: #e8f0fe; } .success { background: #e6f4ea; }
+.warning { background: #fef7e0; } .error { background: #fce8e6; }
+table { border-collapse: collapse; font-size: 0.9em; }
+th, td { border: 1px solid #ddd; padding: 0.2em 0.6em; text-align: right; }
+"""
+
+
+class _ReportBlock:
+    """Stand-in for st and its containers: records every element in page order"""
+
+    def __init__(self, elements):
+        self._elements = elements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    @property
+    def sidebar(self):
+        return self
+
+    def columns(self, spec, **kwargs):
+        return [self for _ in range(spec if isinstance(spec, int) else len(spec))]
+
+    def expander(self, *args, **kwargs):
+        return self
+
+    def container(self, *args, **kwargs):
+        return self
+
+    def selectbox(self, label, options, index=0, **kwargs):
+        options = list(options)
+        return options[index] if options else None
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return list(default or [])
+
+    def number_input(self, label, min_value=None, value='min', **kwargs):
+        return min_value if value == 'min' else value
+
+    def text_input(self, label, value='', **kwargs):
+        return value
+
+    def header(self, text, **kwargs):
+        self._elements.append(('header', text))
+
+    def subheader(self, text, **kwargs):
+        self._elements.append(('subheader', text))
+
+    def caption(self, text, **kwargs):
+        self._elements.append(('caption', text))
+
+    def metric(self, label, value, *args, **kwargs):
+        self._elements.append(('metric', (label, value)))
+
+    def info(self, text, **kwargs):
+        self._elements.append(('info', text))
+
+    def success(self, text, **kwargs):
+        self._elements.append(('success', text))
+
+    def warning(self, text, **kwargs):
+        self._elements.append(('warning', text))
+
+    def error(self, text, **kwargs):
+        self._elements.append(('error', text))
+
+    def plotly_chart(self, figure, *args, **kwargs):
+        self._elements.append(('chart', figure))
+
+    def dataframe(self, data, *args, **kwargs):
+        self._elements.append(('table', data))
+
+    table = dataframe
+
+
+def report_name(result_file, filters):
+    """File-system safe report name for a snapshot and its filters"""
+    base = os.path.splitext(os.path.basename(os.path.normpath(result_file)))[0] or 'results'
+    if filters:
+        base += '__' + urlencode([(axis, ','.join(values)) for axis, values in filters])
+    return re.sub(r'[^\w.=-]+', '_', base)
+
+
+def plan_reports(result_files, filter_sets, each_axis=None, options=None):
+    """(result file, filters, name) of every report, grouped by result file"""
+    tasks, names = [], set()
+    for result_file in result_files:
+        for filters in filter_sets:
+            variants = [filters]
+            if each_axis:
+                variants = [tuple(sorted(filters + ((each_axis, (label,)),))) for label in options]
+            for variant in variants:
+                name = report_name(result_file, variant)
+                if name in names:
+                    name = f"{name}_{len(tasks)}"
+                names.add(name)
+                tasks.append((result_file, variant, name))
+    return tasks
+
+
+def _table_frame(data):
+    """(display frame, raw frame) of a recorded table or Styler"""
+    from pandas.io.formats.style import Styler
+    if isinstance(data, Styler):
+        return data, data.data
+    return data, data
+
+
+def render_html(title, sections, plotlyjs='inline'):
+    """Self-contained HTML page for the recorded sections"""
+    import plotly.io as pio
+    include = True if plotlyjs == 'inline' else 'cdn'
+    parts = [f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>",
+             f"<style>{STYLE}</style></head><body><h1>{html.escape(title)}</h1><nav>"]
+    parts += [f"<a href=\"#{method}\">{html.escape(label)}</a>" for method, label, _ in sections]
+    parts.append("</nav>")
+    for method, label, elements in sections:
+        parts.append(f"<section id=\"{method}\">")
+        metrics = []
+        for kind, value in elements + [('end', None)]:
+            if kind == 'metric':
+                metrics.append(f"<div class=\"metric\"><div>{html.escape(value[0])}</div>"
+                               f"<div class=\"value\">{html.escape(str(value[1]))}</div></div>")
+                continue
+            if metrics:
+                parts.append("<div class=\"metrics\">" + "".join(metrics) + "</div>")
+                metrics = []
+            if kind == 'header':
+                parts.append(f"<h2>{html.escape(value)}</h2>")
+            elif kind == 'subheader':
+                parts.append(f"<h3>{html.escape(value)}</h3>")
+            elif kind == 'caption':
+                parts.append(f"<p><small>{html.escape(value)}</small></p>")
+            elif kind in ('info', 'success', 'warning', 'error'):
+                parts.append(f"<div class=\"message {kind}\">{html.escape(value.strip())}</div>")
+            elif kind == 'chart':
+                # plotly.js goes into the page once, ahead of the first chart
+                parts.append(pio.to_html(value, full_html=False, include_plotlyjs=include, default_height=450))
+                include = False
+            elif kind == 'table':
+                display, _ = _table_frame(value)
+                parts.append(display.to_html())
+        parts.append("</section>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def report_payload(result_file, filters, sections):
+    """JSON-ready metrics, messages, tables and chart specs of the recorded sections"""
+    views = {}
+    for method, label, elements in sections:
+        view = {'title': label, 'metrics': {}, 'messages': [], 'tables': [], 'charts': []}
+        for kind, value in elements:
+            if kind == 'metric':
+                view['metrics'][value[0]] = value[1]
+            elif kind in ('info', 'success', 'warning', 'error', 'caption'):
+                view['messages'].append({'level': kind, 'text': value.strip()})
+            elif kind == 'chart':
+                view['charts'].append(json.loads(value.to_json()))
+            elif kind == 'table':
+                _, frame = _table_frame(value)
+                view['tables'].append({'columns': [str(c) for c in frame.columns],
+                                       'rows': json.loads(frame.to_json(orient='values'))})
+        views[method[len('display_'):]] = view
+    return {'results': os.path.basename(os.path.normpath(result_file)),
+            'filters': {axis: list(values) for axis, values in filters},
+            'views': views}
+
+
+def _dashboard_module():
+    """medical_dashboard imported in bare mode, without the missing ScriptRunContext warnings"""
+    import streamlit.logger
+    streamlit.logger.set_log_level('ERROR')
+    import medical_dashboard
+    return medical_dashboard
+
+
+def preload(result_files, cube_file, series_file):
+    """Parse every snapshot, the cube and the time series into this process's shared caches"""
+    from count_cube import get_cube_cache
+    from result_cache import get_result_cache
+    from result_shards import IncompleteOutputError
+    from time_series import get_time_series_cache
+    _dashboard_module()
+    for result_file in result_files:
+        try:
+            get_result_cache().get(result_file)
+        except (FileNotFoundError, IncompleteOutputError):
+            pass    # reported by the report's own load
+    for cache, path in ((get_cube_cache(), cube_file), (get_time_series_cache(), series_file)):
+        if os.path.exists(path):
+            cache.get(path)
+
+
+def render_report(task):
+    """Render one report to <output>/<name>.html and .json; returns (name, views, ms, error)"""
+    result_file, filters, name, output_dir, cube_file, series_file, table_rows, plotlyjs = task
+    start_time = time.perf_counter()
+    medical_dashboard = _dashboard_module()
+    elements = []
+    medical_dashboard.st = _ReportBlock(elements)
+    # Snapshots, cube and rendered figures come from this process's shared caches
+    dashboard = medical_dashboard.MedicalDashboard(result_file, cube_file, series_file)
+    dashboard.page_rows = table_rows
+    if not dashboard.data:
+        return name, 0, 0.0, next((text for kind, text in elements if kind == 'error'), "No data")
+    if filters and dashboard.cube is None:
+        return name, 0, 0.0, f"Filters need a count cube at {cube_file}"
+    dashboard.apply_filters(filters)
+    sections = []
+    for method, label in VIEWS:
+        del elements[:]
+        getattr(dashboard, method)()
+        sections.append((method, label, list(elements)))
+    title = f"Medical Appointment Analysis - {os.path.basename(os.path.normpath(result_file))}"
+    if filters:
+        title += " (" + "; ".join(f"{axis}: {', '.join(values)}" for axis, values in filters) + ")"
+    path = os.path.join(output_dir, name)
+    with open(path + '.html', 'w', encoding='utf-8') as f:
+        f.write(render_html(title, sections, plotlyjs))
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report_payload(result_file, filters, sections), f, ensure_ascii=False)
+    return name, len(sections), (time.perf_counter() - start_time) * 1000, None
+
+
+def export_reports(tasks, output_dir=REPORT_DIR, cube_file=CUBE_PATH, series_file=TIME_SERIES_PATH,
+                   workers=None, table_rows=TABLE_ROWS, plotlyjs='inline'):
+    """Render every (result file, filters, name) task across a process pool; yields render_report results"""
+    os.makedirs(output_dir, exist_ok=True)
+    result_files = list(dict.fromkeys(result_file for result_file, _, _ in tasks))
+    jobs = [(result_file, filters, name, output_dir, cube_file, series_file, table_rows, plotlyjs)
+            for result_file, filters, name in tasks]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        for job in jobs:
+            yield render_report(job)
+        return
+    # Forked workers inherit the parsed data; elsewhere each worker parses a snapshot once
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    if context.get_start_method() == 'fork':
+        preload(result_files, cube_file, series_file)
+    # Contiguous chunks keep a worker on one snapshot
+    chunk_size = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        yield from pool.map(render_report, jobs, chunksize=chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the dashboard analysis views as HTML and JSON reports")
+    parser.add_argument('--results', nargs='+', default=[DATA_FILE],
+                        help="result files, output directories or globs; one report set each")
+    parser.add_argument('--filter', action='append', dest='filters', default=[],
+                        help="cross filter in query form, e.g. gender=F&age_group=SENIORS (repeatable)")
+    parser.add_argument('--each', metavar='AXIS',
+                        help="one report per label of a cube axis, e.g. neighbourhood for every clinic")
+    parser.add_argument('--cube', default=CUBE_PATH)
+    parser.add_argument('--series', default=TIME_SERIES_PATH)
+    parser.add_argument('--output', default=REPORT_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--table-rows', type=int, default=TABLE_ROWS, help="rows per table in a report")
+    parser.add_argument('--plotlyjs', choices=['inline', 'cdn'], default='inline',
+                        help="embed plotly.js in every page (self-contained) or load it from the CDN")
+    args = parser.parse_args(argv)
+
+    filter_sets = [parse_filters(text) for text in args.filters] or [()]
+    options = None
+    if any(filter_sets) or args.each:
+        if not os.path.exists(args.cube):
+            parser.error(f"--filter and --each need a count cube; none found at {args.cube}")
+        from count_cube import get_cube_cache
+        if args.each and args.each not in FILTER_AXES:
+            parser.error(f"Unknown axis '{args.each}'; expected one of {', '.join(FILTER_AXES)}")
+        cube = get_cube_cache().get(args.cube)
+        for filters in filter_sets:
+            try:
+                cube.check_filters(filters)
+            except ValueError as e:
+                parser.error(str(e))
+        if args.each:
+            options = cube.options(args.each)
+
+    tasks = plan_reports(args.results, filter_sets, args.each, options)
+    print(f"Starting Report Export: {len(tasks):,} reports with {args.workers} workers...")
+    start_time = time.perf_counter()
+    failures = 0
+    for name, views, ms, error in export_reports(tasks, args.output, args.cube, args.series, args.workers,
+                                                 args.table_rows, args.plotlyjs):
+        if error:
+            failures += 1
+            print(f"FAILED {name}: {error}")
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(tasks) - failures:,} reports written to {args.output} ({len(tasks) / elapsed:,.1f} reports/s)")
+    print(f"Execution Time: {elapsed * 1000:.0f} ms")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Shared MapReduce Result Cache
+zeli8888.ccproject.patient_behavior
+"""
+
+import csv
+import os
+import threading
+from types import MappingProxyType
+
+import pandas as pd
+
+from key_grammar import DIMENSIONS, dimension_view, parse_results
+from result_shards import is_sharded, list_shards, read_shards, shards_signature
+
+
+def read_results(file_path):
+    """Read a result file, output directory or glob of part files into a key -> count Series"""
+    if is_sharded(file_path):
+        return read_shards(file_path, read_result_table)
+    return read_result_table(file_path)
+
+
+def read_result_table(file_path):
+    """Read one MapReduce key/value file (or buffer) in one pass"""
+    try:
+        table = pd.read_csv(file_path, sep='\t', header=None, names=['key', 'count'],
+                            dtype={'key': 'object'}, quoting=csv.QUOTE_NONE,
+                            keep_default_na=False, na_values={'count': ['']},
+                            encoding='utf-8', engine='c')
+    except pd.errors.EmptyDataError:
+        return pd.Series([], dtype='int64')
+    table = table.dropna(subset=['count'])
+    table['key'] = table['key'].str.strip()
+    counts = table.groupby('key', sort=False)['count'].sum().astype('int64')
+    counts.index.name = None
+    return counts
+
+
+def freeze(value):
+    """Wrap nested dicts in read-only views so snapshots can be shared"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    return value
+
+
+def file_version(file_path):
+    """Identify a result file by absolute path, mtime and size"""
+    if is_sharded(file_path):
+        return (os.path.abspath(file_path),) + shards_signature(list_shards(file_path))
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+class ResultSnapshot:
+    """Immutable parsed view of one version of a result file"""
+
+    __slots__ = ('path', 'version', 'data', 'frame', 'views')
+
+    def __init__(self, path, version, counts, frame):
+        object.__setattr__(self, 'path', path)
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'data', freeze(dict(zip(counts.index.tolist(), counts.tolist()))))
+        object.__setattr__(self, 'frame', frame)
+        object.__setattr__(self, 'views', freeze({d: dimension_view(frame, d) for d in DIMENSIONS}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ResultSnapshot is immutable")
+
+    def __reduce__(self):
+        return _restore_snapshot, (self.path, self.version, dict(self.data), self.frame, dict(self.views))
+
+    def restamp(self, version):
+        """The same parsed data under another file version (e.g. from a prebuilt artifact)"""
+        return _restore_snapshot(version[0], version, self.data, self.frame, self.views)
+
+
+def _restore_snapshot(path, version, data, frame, views):
+    """Rebuild a snapshot from its parsed parts, without reparsing"""
+    snapshot = object.__new__(ResultSnapshot)
+    for name, value in (('path', path), ('version', version), ('data', freeze(dict(data))),
+                        ('frame', frame), ('views', freeze(dict(views)))):
+        object.__setattr__(snapshot, name, value)
+    return snapshot
+
+
+def load_snapshot(file_path, version):
+    """Parse a result file into a ResultSnapshot"""
+    counts = read_results(file_path)
+    return ResultSnapshot(version[0], version, counts, parse_results(counts))
+
+
+def load_prebuilt_snapshot(file_path, version):
+    """load_snapshot, served from the startup artifact when it was built from this file's contents"""
+    from startup_artifact import artifact_snapshot
+    snapshot = artifact_snapshot(file_path, version)
+    return snapshot if snapshot is not None else load_snapshot(file_path, version)
+
+
+class ResultCache:
+    """Process-wide cache of file-backed objects, reloaded when the file changes"""
+
+    def __init__(self, loader=load_snapshot):
+        self.loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Separate from _lock so counting a hit never waits behind a load
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path):
+        """Return the loaded object for file_path, loading only if the file changed"""
+        version = file_version(file_path)
+        path = version[0]
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == version:
+            with self._stats_lock:
+                self.hits += 1
+            return entry[1]
+
+        with self._lock:
+            # Another session may have loaded this version while we waited
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                with self._stats_lock:
+                    self.hits += 1
+                return entry[1]
+            value = self.loader(file_path, version)
+            self._entries[path] = (version, value)
+            with self._stats_lock:
+                self.misses += 1
+            return value
+
+    def invalidate(self, file_path=None):
+        """Drop cached entries so the next get() reloads"""
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(file_path), None)
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'files': len(self._entries)
+        }
+
+
+_shared_cache = ResultCache(loader=load_prebuilt_snapshot)
+
+
+def get_result_cache():
+    """Return the cache shared by every session in this process"""
+    return _shared_cache
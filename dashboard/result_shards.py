@@ -0,0 +1,106 @@
+"""
+Multi-Part MapReduce Output Reader
+zeli8888.ccproject.patient_behavior
+
+Loads a Hadoop output directory (or a glob of part files) the way the
+job left it: part-r-NNNNN shards, optionally gzip or bz2 compressed, next
+to a _SUCCESS marker. Shards are decompressed on a thread pool, parsed in
+one pass and sum-merged; an output without _SUCCESS, with a gap in the
+shard numbers or with a truncated shard is refused rather than half-read.
+"""
+
+import bz2
+import glob
+import gzip
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+SUCCESS_MARKER = '_SUCCESS'
+MAX_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# part-r-00000, part-m-00000 (map-only jobs) and part-00000 (streaming / old API)
+_SHARD_PATTERN = re.compile(r'^part-(?:[rm]-)?(?P<index>\d+)(?P<codec>\.gz|\.bz2)?$')
+
+DECOMPRESSORS = {
+    None: lambda data: data,
+    '.gz': gzip.decompress,
+    '.bz2': bz2.decompress,
+}
+
+
+class IncompleteOutputError(ValueError):
+    """The output is missing, still being written or has damaged shards"""
+
+
+def is_sharded(path):
+    """True for an output directory or a glob of part files"""
+    return os.path.isdir(path) or glob.has_magic(path)
+
+
+def list_shards(path):
+    """Sorted (path, index, codec) of every shard, after completeness checks"""
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, name) for name in os.listdir(path)]
+    else:
+        candidates = glob.glob(path)
+    shards = []
+    for candidate in candidates:
+        name = os.path.basename(candidate)
+        # Hadoop marker, temporary and checksum files all start with _ or .
+        if name.startswith(('_', '.')):
+            continue
+        match = _SHARD_PATTERN.match(name)
+        if match is None or not os.path.isfile(candidate):
+            continue
+        shards.append((candidate, int(match.group('index')), match.group('codec')))
+    if not shards:
+        raise FileNotFoundError(f"No part files found in {path}")
+    shards.sort(key=lambda shard: (os.path.dirname(shard[0]), shard[1]))
+
+    for directory in sorted({os.path.dirname(shard[0]) for shard in shards}):
+        if not os.path.exists(os.path.join(directory, SUCCESS_MARKER)):
+            raise IncompleteOutputError(f"{directory or '.'} has no {SUCCESS_MARKER} marker; the job "
+                                        f"has not finished committing its output")
+    if os.path.isdir(path):
+        indices = [shard[1] for shard in shards]
+        if indices != list(range(len(indices))):
+            missing = sorted(set(range(max(indices) + 1)) - set(indices))
+            raise IncompleteOutputError(f"{path} is missing shards {missing[:10]}")
+    return shards
+
+
+def shards_signature(shards):
+    """(mtime_ns, size) over the shards and their markers, used as the cache version"""
+    files = [shard[0] for shard in shards]
+    files += [os.path.join(d, SUCCESS_MARKER) for d in {os.path.dirname(f) for f in files}]
+    stats = [os.stat(f) for f in files]
+    return max(s.st_mtime_ns for s in stats), sum(s.st_size for s in stats)
+
+
+def read_shard(shard):
+    """Decompressed bytes of one shard, verified to end on a complete line"""
+    path, _, codec = shard
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        data = DECOMPRESSORS[codec](data)
+    except (EOFError, OSError, ValueError) as e:
+        raise IncompleteOutputError(f"{path} is truncated or corrupt: {e}") from e
+    if data and not data.endswith(b'\n'):
+        raise IncompleteOutputError(f"{path} does not end with a complete line")
+    return data
+
+
+def read_shards(path, reader, max_workers=MAX_WORKERS):
+    """Decompress every shard in parallel, then parse and sum-reduce them with reader"""
+    shards = list_shards(path)
+    signature = shards_signature(shards)
+    # zlib and bz2 release the GIL, so threads decompress shards concurrently
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(shards))) as pool:
+        parts = list(pool.map(read_shard, shards))
+    if shards_signature(shards) != signature:
+        raise IncompleteOutputError(f"{path} changed while it was being read")
+    # One parse over the concatenation; reader sums keys repeated across shards
+    return reader(io.BytesIO(b''.join(parts)))
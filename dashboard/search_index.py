@@ -0,0 +1,166 @@
+"""
+Neighbourhood Name Search Index
+zeli8888.ccproject.patient_behavior
+
+Prebuilt index over dimension labels (neighbourhood names): a prefix index
+over every word, kept as a sorted token array so the names below any
+prefix form one contiguous range (a flattened trie), plus a trigram index
+for substring and typo-tolerant matches. Matching ignores case and
+accents; results are ranked exact > prefix > word prefix > substring >
+fuzzy, then by weight. A query that extends the previous one (the user
+typing on) searches only the previous token range and updates its trigram
+counts with the grams that changed.
+"""
+
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+import numpy as np
+
+QUERY_CACHE_SIZE = 1024
+FUZZY_MIN_SIMILARITY = 0.35
+
+# Rank classes, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+def normalize(text):
+    """Case- and accent-insensitive form with single spaces"""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().replace('_', ' ').split())
+
+
+def trigrams(text):
+    """Trigrams of a normalized string, padded so word starts count"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Immutable search index over a list of names"""
+
+    def __init__(self, names, weights=None):
+        self.names = list(names)
+        self.normalized = [normalize(name) for name in self.names]
+        self.weights = (np.zeros(len(self.names)) if weights is None
+                        else np.asarray(weights, dtype='float64'))
+
+        # Prefix index: every (word suffix of the name, id), sorted
+        tokens = []
+        for i, name in enumerate(self.normalized):
+            words = name.split(' ')
+            for start in range(len(words)):
+                tokens.append((' '.join(words[start:]), start, i))
+        tokens.sort()
+        self._tokens = [token for token, _, _ in tokens]
+        self._token_ids = np.array([i for _, _, i in tokens], dtype='int64')
+        self._token_whole = np.array([start == 0 for _, start, _ in tokens], dtype=bool)
+
+        postings = {}
+        for i, name in enumerate(self.normalized):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(ids, dtype='int64') for gram, ids in postings.items()}
+        self._gram_counts = np.array([len(trigrams(name)) for name in self.normalized], dtype='int64')
+        self._lengths = np.array([len(name) for name in self.normalized], dtype='int64')
+        self._by_weight = np.lexsort((np.arange(len(self.names)), -self.weights))
+        # Last query's token range and trigram counts, each replaced as one tuple
+        self._previous_range = ('', 0, len(self._tokens))
+        self._previous_grams = ('', None)
+        self.search = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._search)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index"""
+        return (sum(len(t) for t in self._tokens) * 2 + self._token_ids.nbytes
+                + sum(ids.nbytes for ids in self._postings.values()) + self._gram_counts.nbytes)
+
+    def _token_range(self, query):
+        """[lo, hi) range of the tokens starting with query"""
+        previous, lo, hi = self._previous_range
+        if not query.startswith(previous):
+            lo, hi = 0, len(self._tokens)
+        # Tokens starting with query are a sub-range of those starting with any prefix of it
+        lo = bisect_left(self._tokens, query, lo, hi)
+        hi = bisect_right(self._tokens, query + '\uffff', lo, hi)
+        self._previous_range = (query, lo, hi)
+        return lo, hi
+
+    def _shared_grams(self, query):
+        """Trigrams every name shares with query"""
+        previous, shared = self._previous_grams
+        grams = trigrams(query)
+        if shared is not None and query.startswith(previous):
+            # Typing on only swaps the trailing grams: update a copy of the previous
+            # counts (a name appears once per posting list, so += is exact)
+            shared = shared.copy()
+            for gram in grams - trigrams(previous):
+                if gram in self._postings:
+                    shared[self._postings[gram]] += 1
+            for gram in trigrams(previous) - grams:
+                if gram in self._postings:
+                    shared[self._postings[gram]] -= 1
+        else:
+            ids = [self._postings[g] for g in grams if g in self._postings]
+            shared = (np.bincount(np.concatenate(ids), minlength=len(self.names)) if ids
+                      else np.zeros(len(self.names), dtype='int64'))
+        self._previous_grams = (query, shared)
+        return shared
+
+    def _prefix_matches(self, query, lo, hi):
+        """(ids, rank) of names with a word sequence starting with query (the token range [lo, hi))"""
+        # A name can match through several of its words but only once as a whole
+        ids = np.unique(self._token_ids[lo:hi])
+        rank = np.full(len(ids), WORD_PREFIX, dtype='int8')
+        whole = np.flatnonzero(self._token_whole[lo:hi])
+        rank[np.searchsorted(ids, self._token_ids[lo:hi][whole])] = PREFIX
+        # Tokens are sorted, so an exact match can only be the first whole token
+        if len(whole) and self._tokens[lo + whole[0]] == query:
+            rank[np.searchsorted(ids, self._token_ids[lo + whole[0]])] = EXACT
+        return ids, rank
+
+    def _search(self, query, limit=None):
+        """Ranked ids matching query; limit=None returns every match"""
+        query = normalize(query)
+        if not query:
+            return tuple(self._by_weight[:limit].tolist())
+
+        # Substring and fuzzy matches rank below every prefix match, so skip
+        # the trigram pass when the prefix matches already fill the page
+        ids, rank = self._prefix_matches(query, *self._token_range(query))
+        secondary = self._lengths[ids].astype('float64')    # shorter names first
+        if len(query) >= 3 and (limit is None or len(ids) < limit):
+            shared = self._shared_grams(query).copy()
+            shared[ids] = 0
+            candidates = np.flatnonzero(shared)
+            if len(candidates):
+                shared = shared[candidates]
+                query_grams = len(trigrams(query))
+                similarity = 2 * shared / (query_grams + self._gram_counts[candidates])
+                # All query trigrams present is necessary for a substring; confirm exactly
+                substring = np.zeros(len(candidates), dtype=bool)
+                for k in np.flatnonzero(shared == query_grams).tolist():
+                    substring[k] = query in self.normalized[candidates[k]]
+                keep = substring | (similarity >= FUZZY_MIN_SIMILARITY)
+                candidates, substring, similarity = candidates[keep], substring[keep], similarity[keep]
+                ids = np.concatenate([ids, candidates])
+                rank = np.concatenate([rank, np.where(substring, SUBSTRING, FUZZY).astype('int8')])
+                secondary = np.concatenate([secondary, np.where(substring, self._lengths[candidates],
+                                                                -similarity)])
+
+        if limit is not None and len(ids) > 4 * limit:
+            # Only rows in a rank class up to that of the limit-th best can make the page
+            keep = rank <= np.partition(rank, limit - 1)[limit - 1]
+            ids, rank, secondary = ids[keep], rank[keep], secondary[keep]
+        # Busier names first within a rank class, then shorter or more similar ones
+        order = np.lexsort((ids, secondary, -self.weights[ids], rank))
+        return tuple(ids[order][:limit].tolist())
+
+    def lookup(self, query, limit=None):
+        """Ranked names matching query"""
+        return [self.names[i] for i in self.search(query, limit)]
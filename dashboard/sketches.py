@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Streaming Sketches for Unique Patients and Heavy-Hitter Neighbourhoods
+zeli8888.ccproject.patient_behavior
+
+Fixed-size, mergeable summaries of the appointment stream: a HyperLogLog
+of distinct PatientIds for every series the mapper counts (except the
+unbounded NEIGHBOURHOOD_* ones), and Count-Min sketches of no-shows and
+appointments per neighbourhood with a bounded candidate set for the top-k
+no-show neighbourhoods. States built by parallel workers merge exactly.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from result_cache import ResultCache
+from time_series import record_series
+
+SKETCH_PATH = 'data/sketches.npz'
+HLL_PRECISION = 14
+CM_WIDTH = 1 << 14
+CM_DEPTH = 5
+TOP_K = 20
+# Candidates kept per requested top-k entry, so late risers are not dropped
+CANDIDATE_FACTOR = 10
+
+
+def mix64(values):
+    """splitmix64 finalizer: well-spread 64-bit hashes of integers"""
+    with np.errstate(over='ignore'):
+        z = np.asarray(values).astype('uint64') + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def hash_labels(labels):
+    """Stable 64-bit hashes of strings (independent of PYTHONHASHSEED)"""
+    return np.array([int.from_bytes(hashlib.blake2b(str(label).encode('utf-8'), digest_size=8).digest(),
+                                    'little') for label in labels], dtype='uint64')
+
+
+def _sigma(x):
+    if x == 1:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x == 0 or x == 1:
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision one-byte registers"""
+
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.registers = (np.zeros(1 << precision, dtype='uint8') if registers is None
+                          else np.asarray(registers, dtype='uint8'))
+
+    @property
+    def relative_error(self):
+        """Standard error of count() relative to the true cardinality"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add_hashes(self, hashes):
+        """Fold 64-bit hashes: register from the top bits, rank from the leading zeros of the rest"""
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype='uint64')
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype('int64')
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Bit length via float log2, corrected where rounding reached the next power of two
+        length = np.zeros(len(rest), dtype='int64')
+        nonzero = rest > 0
+        length[nonzero] = np.floor(np.log2(rest[nonzero].astype('float64'))).astype('int64') + 1
+        high = nonzero & ((rest >> np.maximum(length - 1, 0).astype('uint64')) == 0)
+        length[high] -= 1
+        rank = (bits - length + 1).astype('uint8')
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self):
+        """Cardinality estimate (Ertl's improved estimator: no bias tables, no range switch)"""
+        m = len(self.registers)
+        q = 64 - self.precision
+        histogram = np.bincount(self.registers, minlength=q + 2).astype('float64')
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        return m * m / (2 * math.log(2)) / z
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+
+class CountMinSketch:
+    """Frequency sketch: estimates never undercount and overcount by at most
+    error_rate * total with probability 1 - exp(-depth)"""
+
+    def __init__(self, width=CM_WIDTH, depth=CM_DEPTH, table=None):
+        self.table = np.zeros((depth, width), dtype='int64') if table is None else np.asarray(table, dtype='int64')
+        self.total = int(self.table[0].sum())
+
+    @property
+    def error_rate(self):
+        return math.e / self.table.shape[1]
+
+    def _columns(self, hashes, row):
+        return (mix64(np.asarray(hashes, dtype='uint64') ^ np.uint64(row + 1)) %
+                np.uint64(self.table.shape[1])).astype('int64')
+
+    def add(self, hashes, counts):
+        width = self.table.shape[1]
+        for row in range(self.table.shape[0]):
+            self.table[row] += np.bincount(self._columns(hashes, row), weights=counts,
+                                           minlength=width).astype('int64')
+        self.total += int(np.sum(counts))
+
+    def estimate(self, hashes):
+        return np.min([self.table[row, self._columns(hashes, row)] for row in range(self.table.shape[0])], axis=0)
+
+    def error_bound(self):
+        """Additive overcount bound of every estimate"""
+        return self.error_rate * self.total
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SketchState:
+    """Mergeable sketches of one part of the appointment stream"""
+
+    def __init__(self, capacity=TOP_K * CANDIDATE_FACTOR):
+        self.patients = {}                  # series name -> HyperLogLog of PatientIds
+        self.noshows = CountMinSketch()     # per neighbourhood
+        self.appointments = CountMinSketch()
+        self.candidates = {}                # neighbourhood -> hash, at most capacity entries
+        self.capacity = capacity
+        self.records = 0
+
+    def add(self, records):
+        """Fold one batch of records (aggregation_engine / columnar store schema)"""
+        self.records += len(records)
+        patient_hashes = mix64(records['patient_id'].to_numpy())
+        for prefix, categories, mask in record_series(records):
+            if prefix == 'NEIGHBOURHOOD_':
+                continue
+            hashes = patient_hashes if mask is None else patient_hashes[mask]
+            if isinstance(categories, str):
+                groups = [(categories, hashes)]
+            else:
+                codes, uniques = pd.factorize(categories if mask is None else categories[mask])
+                order = np.argsort(codes, kind='stable')
+                bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+                groups = [(str(u), hashes[order[bounds[i]:bounds[i + 1]]]) for i, u in enumerate(uniques)]
+            for category, group in groups:
+                name = prefix + category
+                if name not in self.patients:
+                    self.patients[name] = HyperLogLog()
+                self.patients[name].add_hashes(group)
+
+        neighbourhood = records['neighbourhood'].to_numpy(dtype=object)
+        countable = (neighbourhood != '') & (neighbourhood != 'NULL')
+        codes, uniques = pd.factorize(neighbourhood[countable])
+        if not len(uniques):
+            return
+        noshow = records['noshow'].to_numpy()[countable]
+        hashes = hash_labels(uniques)
+        self.appointments.add(hashes, np.bincount(codes, minlength=len(uniques)))
+        self.noshows.add(hashes, np.bincount(codes[noshow], minlength=len(uniques)))
+        self._refresh(dict(zip(uniques.tolist(), hashes.tolist())))
+
+    def _refresh(self, labels):
+        """Keep the capacity candidates with the highest estimated no-shows"""
+        labels = {**self.candidates, **labels}
+        names = list(labels)
+        estimates = self.noshows.estimate(np.array([labels[n] for n in names], dtype='uint64'))
+        keep = np.argsort(-estimates, kind='stable')[:self.capacity]
+        self.candidates = {names[i]: labels[names[i]] for i in keep.tolist()}
+
+    def merge(self, other):
+        """Fold another state into this one (order of merges does not matter)"""
+        for name, hll in other.patients.items():
+            if name in self.patients:
+                self.patients[name].merge(hll)
+            else:
+                self.patients[name] = HyperLogLog(hll.precision, hll.registers.copy())
+        self.noshows.merge(other.noshows)
+        self.appointments.merge(other.appointments)
+        self.records += other.records
+        self._refresh(other.candidates)
+        return self
+
+    def unique_patients(self):
+        """Frame of estimated distinct patients per series with a 95% interval"""
+        names = sorted(self.patients)
+        estimates = np.array([self.patients[n].count() for n in names])
+        error = np.array([self.patients[n].relative_error for n in names]) * 1.96
+        return pd.DataFrame({
+            'Series': names,
+            'Unique_Patients': np.round(estimates).astype('int64'),
+            'Low': np.round(estimates * (1 - error)).astype('int64'),
+            'High': np.round(estimates * (1 + error)).astype('int64'),
+        })
+
+    def top_neighbourhoods(self, k=TOP_K):
+        """Top-k neighbourhoods by estimated no-shows, with Count-Min overcount bounds"""
+        names = list(self.candidates)
+        hashes = np.array([self.candidates[n] for n in names], dtype='uint64')
+        noshows = self.noshows.estimate(hashes) if names else np.zeros(0, dtype='int64')
+        appointments = self.appointments.estimate(hashes) if names else np.zeros(0, dtype='int64')
+        frame = pd.DataFrame({
+            'Neighborhood': names,
+            'No_Shows': noshows,
+            'No_Shows_Error': self.noshows.error_bound(),
+            'Total_Appointments': appointments,
+            'Total_Error': self.appointments.error_bound(),
+        })
+        frame['No_Show_Rate'] = frame['No_Shows'] / frame['Total_Appointments'].clip(lower=1) * 100
+        return frame.sort_values('No_Shows', ascending=False, kind='stable').head(k).reset_index(drop=True)
+
+    def nbytes(self):
+        """Memory held by the sketches (fixed once every series has been seen)"""
+        return (sum(h.registers.nbytes for h in self.patients.values()) +
+                self.noshows.table.nbytes + self.appointments.table.nbytes)
+
+    def save(self, path=SKETCH_PATH):
+        """Write the state as a compressed .npz (atomically)"""
+        names = sorted(self.patients)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(
+            tmp_path,
+            registers=np.stack([self.patients[n].registers for n in names]) if names
+            else np.zeros((0, 1 << HLL_PRECISION), dtype='uint8'),
+            noshows=self.noshows.table, appointments=self.appointments.table,
+            meta=np.array(json.dumps({'series': names, 'records': self.records, 'capacity': self.capacity,
+                                      'candidates': list(self.candidates)}, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=SKETCH_PATH):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            state = cls(meta['capacity'])
+            precision = int(math.log2(data['registers'].shape[1]))
+            state.patients = {name: HyperLogLog(precision, registers)
+                              for name, registers in zip(meta['series'], data['registers'])}
+            state.noshows = CountMinSketch(table=data['noshows'])
+            state.appointments = CountMinSketch(table=data['appointments'])
+        state.records = meta['records']
+        state.candidates = dict(zip(meta['candidates'], hash_labels(meta['candidates']).tolist()))
+        return state
+
+
+def load_sketches(file_path, version=None):
+    """ResultCache loader for sketch files"""
+    return SketchState.load(file_path)
+
+
+_shared_sketch_cache = ResultCache(loader=load_sketches)
+
+
+def get_sketch_cache():
+    """Return the sketch cache shared by every session in this process"""
+    return _shared_sketch_cache
+
+
+def sketch_chunk(text):
+    """Worker task: the sketch state of one block of CSV lines"""
+    state = SketchState()
+    state.add(engine.parse_chunk(text)[0])
+    return state
+
+
+def build_sketches(input_path=engine.ARCHIVE_PATH, chunk_size=engine.DEFAULT_CHUNK_SIZE,
+                   member=engine.CSV_MEMBER, workers=1):
+    """Sketch the raw CSV/zip, merging per-chunk states from up to workers processes"""
+    state = SketchState()
+    with engine.open_appointments(input_path, member) as stream:
+        chunks = engine.iter_text_chunks(stream, chunk_size)
+        if workers <= 1:
+            for text in chunks:
+                state.add(engine.parse_chunk(text)[0])
+            return state
+        # At most two chunks per worker in flight keeps memory bounded
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            pending = []
+            for text in chunks:
+                pending.append(pool.submit(sketch_chunk, text))
+                if len(pending) >= 2 * workers:
+                    state.merge(pending.pop(0).result())
+            for future in pending:
+                state.merge(future.result())
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fixed-size sketches of the appointment stream")
+    parser.add_argument('--input', default=engine.ARCHIVE_PATH, help="appointment CSV or zip archive")
+    parser.add_argument('--member', default=engine.CSV_MEMBER)
+    parser.add_argument('--output', default=SKETCH_PATH)
+    parser.add_argument('--chunk-size', type=int, default=engine.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--merge', nargs='*', default=[], help="existing sketch files to fold in")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    state = build_sketches(args.input, args.chunk_size, args.member, args.workers) if args.input else SketchState()
+    for path in args.merge:
+        state.merge(SketchState.load(path))
+    state.save(args.output)
+    print(f"Sketched {state.records:,} records into {state.nbytes() / 1024:,.0f} KB: {args.output}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
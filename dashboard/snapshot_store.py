@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Result Snapshot Store
+zeli8888.ccproject.patient_behavior
+
+Indexes many result runs (local, EMR, monthly refreshes) into one shared
+key dictionary and a keys x runs counts matrix. Every comparison across
+runs is a single vectorized operation over the matrix instead of one
+reload per file.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from aggregation_engine import format_results
+from key_grammar import DIMENSIONS, compute_rates, split_keys
+from result_cache import ResultCache, file_version, read_results
+
+SNAPSHOTS_PATH = 'data/snapshots.npz'
+
+
+class SnapshotStore:
+    """Shared key dictionary plus a keys x runs int64 counts matrix"""
+
+    def __init__(self, keys=(), counts=None, runs=()):
+        self.keys = list(keys)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+        self.counts = counts if counts is not None else np.zeros((len(self.keys), 0), dtype='int64')
+        self.runs = list(runs)
+        self._groups = None
+
+    def __len__(self):
+        return len(self.runs)
+
+    def run_ids(self):
+        return [run['id'] for run in self.runs]
+
+    def column(self, run_id):
+        """Matrix column of a run id (or unique id prefix)"""
+        matches = [i for i, run in enumerate(self.runs) if run['id'].startswith(run_id)]
+        if len(matches) != 1:
+            raise KeyError(f"Unknown or ambiguous run: {run_id}")
+        return matches[0]
+
+    def add(self, counts, label=None, timestamp=None, source=None):
+        """Index a key -> count Series as a new run; returns its id (existing id for a duplicate)"""
+        content_hash = hashlib.sha256(format_results(counts.to_dict())).hexdigest()
+        for run in self.runs:
+            if run['hash'] == content_hash:
+                return run['id']
+        new_keys = [key for key in counts.index if key not in self.index]
+        for key in new_keys:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+        column = np.zeros(len(self.keys), dtype='int64')
+        column[[self.index[key] for key in counts.index]] = counts.to_numpy(dtype='int64')
+        matrix = np.zeros((len(self.keys), len(self.runs) + 1), dtype='int64')
+        matrix[:self.counts.shape[0], :-1] = self.counts
+        matrix[:, -1] = column
+        self.counts = matrix
+        timestamp = timestamp or datetime.now(timezone.utc).isoformat(timespec='seconds')
+        run = {
+            'id': f"{timestamp[:10].replace('-', '')}-{content_hash[:8]}",
+            'hash': content_hash,
+            'timestamp': timestamp,
+            'label': label or '',
+            'source': source,
+        }
+        self.runs.append(run)
+        self._sort_runs()
+        self._groups = None
+        return run['id']
+
+    def add_file(self, file_path, label=None, timestamp=None):
+        """Index a result file, output directory or glob; timestamp defaults to its mtime"""
+        if timestamp is None:
+            mtime_ns = file_version(file_path)[1]
+            timestamp = datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).isoformat(timespec='seconds')
+        return self.add(read_results(file_path), label or os.path.basename(os.path.normpath(file_path)),
+                        timestamp, os.path.abspath(file_path))
+
+    def _sort_runs(self):
+        """Keep runs (and matrix columns) in timestamp order"""
+        order = sorted(range(len(self.runs)), key=lambda i: self.runs[i]['timestamp'])
+        self.runs = [self.runs[i] for i in order]
+        self.counts = self.counts[:, order]
+
+    def groups(self):
+        """Per-key (dimension, category) group codes, computed once per key set"""
+        if self._groups is None:
+            positions, dimensions, categories, noshow = split_keys(self.keys)
+            labels = pd.MultiIndex.from_arrays([dimensions, categories], names=['dimension', 'category'])
+            codes, uniques = pd.factorize(labels)
+            self._groups = positions, codes, noshow, uniques
+        return self._groups
+
+    def totals(self):
+        """(groups index, attended matrix, noshow matrix), groups x runs"""
+        positions, codes, noshow, uniques = self.groups()
+        attended = np.zeros((len(uniques), len(self.runs)), dtype='int64')
+        noshows = np.zeros_like(attended)
+        counts = self.counts[positions]
+        np.add.at(attended, codes[~noshow], counts[~noshow])
+        np.add.at(noshows, codes[noshow], counts[noshow])
+        return uniques, attended, noshows
+
+    def trend(self, dimension=None):
+        """Tidy (dimension, category, run, attended, noshow, total, rate) frame over all runs"""
+        uniques, attended, noshows = self.totals()
+        total, rate = compute_rates(attended, noshows)
+        frame = pd.DataFrame({
+            'dimension': np.repeat(uniques.get_level_values(0), len(self.runs)),
+            'category': np.repeat(uniques.get_level_values(1), len(self.runs)),
+            'run': np.tile(self.run_ids(), len(uniques)),
+            'attended': attended.ravel(),
+            'noshow': noshows.ravel(),
+            'total': total.ravel(),
+            'rate': rate.ravel(),
+        })
+        if dimension is not None:
+            frame = frame[frame['dimension'] == dimension].reset_index(drop=True)
+        return frame
+
+    def compare(self, base, other, dimension=None):
+        """Per (dimension, category) counts, deltas and rate drift of run other against base"""
+        uniques, attended, noshows = self.totals()
+        columns = [self.column(base), self.column(other)]
+        total, rate = compute_rates(attended[:, columns], noshows[:, columns])
+        frame = pd.DataFrame({
+            'dimension': uniques.get_level_values(0),
+            'category': uniques.get_level_values(1),
+            'base_total': total[:, 0],
+            'total': total[:, 1],
+            'delta': total[:, 1] - total[:, 0],
+            'base_rate': rate[:, 0],
+            'rate': rate[:, 1],
+            'rate_drift': rate[:, 1] - rate[:, 0],
+        })
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frame['delta_pct'] = np.where(total[:, 0] > 0, frame['delta'] / np.maximum(total[:, 0], 1) * 100,
+                                          np.nan)
+        frame = frame[(frame['base_total'] > 0) | (frame['total'] > 0)]
+        if dimension is not None:
+            frame = frame[frame['dimension'] == dimension]
+        return frame.reset_index(drop=True)
+
+    def key_changes(self, base, other):
+        """(appeared, disappeared) keys of run other relative to base"""
+        present = self.counts[:, [self.column(base), self.column(other)]] > 0
+        keys = np.array(self.keys, dtype=object)
+        return list(keys[~present[:, 0] & present[:, 1]]), list(keys[present[:, 0] & ~present[:, 1]])
+
+    def churn(self):
+        """Keys appearing / disappearing between consecutive runs, for every run at once"""
+        present = self.counts > 0
+        appeared = (~present[:, :-1] & present[:, 1:]).sum(axis=0)
+        disappeared = (present[:, :-1] & ~present[:, 1:]).sum(axis=0)
+        return pd.DataFrame({
+            'run': self.run_ids()[1:],
+            'keys': present[:, 1:].sum(axis=0),
+            'appeared': appeared,
+            'disappeared': disappeared,
+        })
+
+    def save(self, path=SNAPSHOTS_PATH):
+        """Write keys, matrix and run metadata to one .npz (atomically)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, counts=self.counts,
+                            keys=np.array(json.dumps(self.keys, ensure_ascii=False)),
+                            runs=np.array(json.dumps(self.runs, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=SNAPSHOTS_PATH):
+        with np.load(path) as data:
+            return cls(json.loads(str(data['keys'])), data['counts'], json.loads(str(data['runs'])))
+
+
+def load_store(file_path, version=None):
+    """ResultCache loader for snapshot stores"""
+    return SnapshotStore.load(file_path)
+
+
+_shared_store_cache = ResultCache(loader=load_store)
+
+
+def get_snapshot_cache():
+    """Return the snapshot store cache shared by every session in this process"""
+    return _shared_store_cache
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and compare MapReduce result runs")
+    parser.add_argument('--store', default=SNAPSHOTS_PATH)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add_parser = subparsers.add_parser('add', help="index result files or output directories")
+    add_parser.add_argument('results', nargs='+')
+    add_parser.add_argument('--label')
+    add_parser.add_argument('--timestamp', help="ISO timestamp of the run (default: file mtime)")
+    subparsers.add_parser('list', help="list indexed runs")
+    diff_parser = subparsers.add_parser('diff', help="compare two runs")
+    diff_parser.add_argument('base')
+    diff_parser.add_argument('other')
+    diff_parser.add_argument('--dimension', choices=DIMENSIONS)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    store = SnapshotStore.load(args.store) if os.path.exists(args.store) else SnapshotStore()
+    if args.command == 'add':
+        for path in args.results:
+            print(f"{path}: {store.add_file(path, args.label, args.timestamp)}")
+        store.save(args.store)
+        print(f"{len(store)} runs x {len(store.keys):,} keys in {args.store}")
+    elif args.command == 'list':
+        for run in store.runs:
+            print(f"{run['id']}\t{run['timestamp']}\t{run['label']}")
+    else:
+        try:
+            frame = store.compare(args.base, args.other, args.dimension)
+        except KeyError as e:
+            parser.error(e.args[0])
+        frame = frame.reindex(frame['rate_drift'].abs().sort_values(ascending=False).index)
+        print(frame.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+        appeared, disappeared = store.key_changes(args.base, args.other)
+        print(f"Appeared keys: {len(appeared)}  Disappeared keys: {len(disappeared)}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
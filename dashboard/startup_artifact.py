@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Dashboard Startup Artifact
+zeli8888.ccproject.patient_behavior
+
+The parsed result snapshot plus the overview payload (totals and gauge
+figure) pickled once, e.g. at image build time. A cold dashboard paints
+the overview from the payload before pandas is imported and takes its
+snapshot from the artifact instead of parsing the result file. Both are
+only used while the artifact's content digest matches the result file.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+from result_shards import is_sharded, list_shards
+
+# Empty disables the artifact
+STARTUP_ARTIFACT_PATH = os.environ.get('DASHBOARD_STARTUP_ARTIFACT', 'startup_artifact.pkl')
+DATA_FILE = 'patient_demographics_results.txt'
+ARTIFACT_FORMAT = 2
+DIGEST_BLOCK = 1 << 20
+
+_digests = {}
+_artifacts = {}
+
+
+def source_digest(file_path):
+    """Content digest of a result file, or of every part file of an output directory"""
+    paths = [shard[0] for shard in list_shards(file_path)] if is_sharded(file_path) else [file_path]
+    stats = tuple((os.path.abspath(path), os.stat(path).st_mtime_ns, os.stat(path).st_size) for path in paths)
+    if stats not in _digests:
+        digest = hashlib.blake2b(digest_size=16)
+        for path in paths:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(DIGEST_BLOCK), b''):
+                    digest.update(block)
+        _digests[stats] = digest.hexdigest()
+    return _digests[stats]
+
+
+def read_artifact(artifact_path=STARTUP_ARTIFACT_PATH):
+    """The unpickled artifact envelope (snapshot still serialized), or None; memoized per file version"""
+    if not artifact_path or not os.path.exists(artifact_path):
+        return None
+    stat = os.stat(artifact_path)
+    key = (os.path.abspath(artifact_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _artifacts:
+        try:
+            with open(artifact_path, 'rb') as f:
+                artifact = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            artifact = None
+        if not isinstance(artifact, dict) or artifact.get('format') != ARTIFACT_FORMAT:
+            artifact = None
+        _artifacts.clear()
+        _artifacts[key] = artifact
+    return _artifacts[key]
+
+
+def matching_artifact(file_path, artifact_path=STARTUP_ARTIFACT_PATH):
+    """The artifact if it was built from the current contents of file_path, else None"""
+    artifact = read_artifact(artifact_path)
+    if artifact is None:
+        return None
+    try:
+        if source_digest(file_path) != artifact['digest']:
+            return None
+    except (OSError, ValueError):
+        # Missing or incomplete output; the regular load reports it
+        return None
+    return artifact
+
+
+def load_overview(file_path, artifact_path=STARTUP_ARTIFACT_PATH):
+    """Overview payload for file_path from a matching artifact, or None (needs no pandas)"""
+    artifact = matching_artifact(file_path, artifact_path)
+    return None if artifact is None else artifact['overview']
+
+
+def artifact_snapshot(file_path, version, artifact_path=STARTUP_ARTIFACT_PATH):
+    """ResultSnapshot for file_path from a matching artifact, stamped with version, or None"""
+    artifact = matching_artifact(file_path, artifact_path)
+    if artifact is None:
+        return None
+    try:
+        snapshot = pickle.loads(artifact['snapshot'])
+    except Exception:
+        # Built against other library versions; parsing is the fallback
+        return None
+    return snapshot.restamp(version)
+
+
+def overview_payload(snapshot):
+    """Totals, rate and gauge figure (as plotly JSON) of the unfiltered overview"""
+    import medical_dashboard
+    df = snapshot.views['gender']
+    attended, noshow = int(df['Appointments_Attended'].sum()), int(df['No_Shows'].sum())
+    total = attended + noshow
+    rate = noshow / total * 100 if total > 0 else 0
+    return {
+        'attended': attended,
+        'noshow': noshow,
+        'rate': rate,
+        'gauge': medical_dashboard.overview_gauge(rate).to_plotly_json(),
+    }
+
+
+def build_artifact(file_path=DATA_FILE, artifact_path=STARTUP_ARTIFACT_PATH):
+    """Parse file_path and write its startup artifact (atomically)"""
+    # Bare mode: silence the missing ScriptRunContext warnings
+    import streamlit.logger
+    streamlit.logger.set_log_level('ERROR')
+    from result_cache import file_version, load_snapshot
+    snapshot = load_snapshot(file_path, file_version(file_path))
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'source': os.path.basename(os.path.normpath(file_path)),
+        'digest': source_digest(file_path),
+        'overview': overview_payload(snapshot),
+        # Nested so the overview can be read before pandas is imported
+        'snapshot': pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL),
+    }
+    tmp_path = artifact_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, artifact_path)
+    return artifact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prebuild the dashboard startup artifact")
+    parser.add_argument('--results', default=DATA_FILE, help="result file, output directory or glob")
+    parser.add_argument('--output', default=STARTUP_ARTIFACT_PATH or 'startup_artifact.pkl')
+    parser.add_argument('--if-present', action='store_true',
+                        help="exit quietly when the result file does not exist (image builds without data)")
+    args = parser.parse_args(argv)
+
+    if args.if_present and not (os.path.exists(args.results) or is_sharded(args.results)):
+        print(f"No result file at {args.results}; skipping the startup artifact")
+        return 0
+    start_time = time.perf_counter()
+    artifact = build_artifact(args.results, args.output)
+    print(f"Startup artifact for {artifact['source']} ({len(artifact['snapshot']) / 1024:,.0f} KB snapshot) "
+          f"written to {args.output}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Hadoop Streaming Patient Demographics Job
+zeli8888.ccproject.patient_behavior
+
+Python mapper/combiner/reducer equivalent to PatientDemographicsMapper and
+PatientDemographicsReducer. Only the standard library is used so the file
+can be shipped to EMR nodes as-is:
+
+    hadoop jar hadoop-streaming.jar -files streaming_job.py \
+        -mapper "python3 streaming_job.py map" \
+        -combiner "python3 streaming_job.py reduce" \
+        -reducer "python3 streaming_job.py reduce" \
+        -input <input path> -output <output path>
+
+It can also run locally on a multiprocess runner:
+
+    python3 streaming_job.py run data/medical_appointments.csv results/ --mappers 4 --reducers 2
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import zlib
+from collections import Counter
+from datetime import date
+from multiprocessing import Pool
+
+# PatientId,AppointmentID,Gender,ScheduledDay,AppointmentDay,Age,Neighbourhood,Scholarship,Hipertension,Diabetes,Alcoholism,Handcap,SMS_received,No-show
+JAVA_WHITESPACE = ''.join(chr(c) for c in range(0x21))
+INT_PATTERN = re.compile(r'[+-]?\d+')
+DATE_PATTERN = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+# Flush the in-mapper combiner before it grows past this many keys
+COMBINER_MAX_KEYS = 100_000
+# DATA_QUALITY counters of PatientDemographicsMapper, in the order it checks them
+DATA_QUALITY_COUNTERS = ('EMPTY_FIELDS', 'INVALID_AGE', 'NEGATIVE_LEAD_TIME', 'MALFORMED_RECORDS')
+
+
+class SkippedRecord(Exception):
+    """Record PatientDemographicsMapper.map writes nothing for, counted as DATA_QUALITY,counter"""
+
+    def __init__(self, counter, reason=None):
+        super().__init__(reason or counter)
+        self.counter = counter
+
+
+class MalformedRecord(SkippedRecord):
+    """Record that makes PatientDemographicsMapper.map throw"""
+
+    def __init__(self, reason):
+        super().__init__('MALFORMED_RECORDS', reason)
+
+
+def java_split(line):
+    """String.split(",") semantics: trailing empty strings are dropped"""
+    if line == '':
+        return ['']
+    fields = line.split(',')
+    while fields and fields[-1] == '':
+        fields.pop()
+    return fields
+
+
+def parse_date(text):
+    """LocalDate.parse on the first 10 characters"""
+    if len(text) < 10:
+        raise MalformedRecord("date too short")
+    match = DATE_PATTERN.fullmatch(text[:10])
+    if match is None:
+        raise MalformedRecord("unparseable date")
+    try:
+        return date(*map(int, match.groups()))
+    except ValueError:
+        raise MalformedRecord("invalid date")
+
+
+def categorize_lead_time(lead_time_days):
+    """Categorize lead time into meaningful groups"""
+    if lead_time_days == 0:
+        return 'SAME_DAY'
+    elif lead_time_days <= 3:
+        return 'SHORT'
+    elif lead_time_days <= 7:
+        return 'MEDIUM'
+    elif lead_time_days <= 30:
+        return 'LONG'
+    elif lead_time_days <= 90:
+        return 'VERY_LONG'
+    else:
+        return 'EXTREMELY_LONG'
+
+
+def categorize_age(age):
+    """Age categorization"""
+    if age <= 18:
+        return 'CHILDREN_YOUTH'
+    elif age <= 35:
+        return 'YOUNG_ADULTS'
+    elif age <= 55:
+        return 'MIDDLE_AGED'
+    else:
+        return 'SENIORS'
+
+
+def detailed_age_group(age):
+    """Detailed age grouping (10-year intervals)"""
+    group_start = (age // 10) * 10
+    return f"{group_start}-{group_start + 9}"
+
+
+def map_record(line):
+    """Keys PatientDemographicsMapper.map writes for one line; raises SkippedRecord"""
+    fields = java_split(line)
+    if fields and fields[0] == 'PatientId':
+        return []
+    if len(fields) < 14:
+        raise MalformedRecord("missing fields")
+
+    gender, scheduled_day, appointment_day, age_str, neighbourhood = (
+        f.strip(JAVA_WHITESPACE) for f in fields[2:7])
+    hypertension, diabetes, alcoholism, handicap, sms_received, no_show = (
+        f.strip(JAVA_WHITESPACE) for f in fields[8:14])
+
+    # Validate data completeness
+    if not gender or not age_str or not no_show or not scheduled_day or not appointment_day:
+        raise SkippedRecord('EMPTY_FIELDS')
+
+    # Filter invalid ages
+    if INT_PATTERN.fullmatch(age_str) is None:
+        raise SkippedRecord('INVALID_AGE')
+    age = int(age_str)
+    if age < 0 or age > 120:
+        raise SkippedRecord('INVALID_AGE')
+
+    status = 'NoShow' if no_show.lower() == 'yes' else 'Attended'
+
+    lead_time_days = (parse_date(appointment_day) - parse_date(scheduled_day)).days
+    if lead_time_days < 0:
+        raise SkippedRecord('NEGATIVE_LEAD_TIME')
+
+    keys = [
+        f"LEAD_TIME_{categorize_lead_time(lead_time_days)}_{status}",
+        f"GENDER_{gender}_{status}",
+        f"AGE_GROUP_{categorize_age(age)}_{status}",
+        f"DETAILED_AGE_{detailed_age_group(age)}_{status}",
+    ]
+    if neighbourhood and neighbourhood != 'NULL':
+        keys.append(f"NEIGHBOURHOOD_{neighbourhood}_{status}")
+
+    if hypertension == '1':
+        keys.append(f"HEALTH_HYPERTENSION_{status}")
+    if diabetes == '1':
+        keys.append(f"HEALTH_DIABETES_{status}")
+    if alcoholism == '1':
+        keys.append(f"HEALTH_ALCOHOLISM_{status}")
+    if handicap != '0':
+        keys.append(f"HEALTH_HANDICAP_{status}")
+    if hypertension == '0' and diabetes == '0' and alcoholism == '0' and handicap == '0':
+        keys.append(f"HEALTH_HEALTHY_{status}")
+    disease_count = ((hypertension == '1') + (diabetes == '1') +
+                     (alcoholism == '1') + (handicap != '0'))
+    if disease_count >= 2:
+        keys.append(f"HEALTH_MULTIPLE_DISEASES_{disease_count}_{status}")
+
+    sms_status = 'SMS_RECEIVED' if sms_received == '1' else 'NO_SMS'
+    keys.append(f"SMS_{sms_status}_{status}")
+    return keys
+
+
+class MapperStats:
+    """Records seen, skipped records per DATA_QUALITY counter and (key, 1) pairs the Java mapper would emit"""
+
+    def __init__(self):
+        self.records = 0
+        self.skipped = Counter()
+        self.emitted = 0
+
+    @property
+    def malformed(self):
+        return self.skipped['MALFORMED_RECORDS']
+
+
+def map_lines(lines, counts, stats):
+    """Map lines into counts with in-mapper combining"""
+    for line in lines:
+        stats.records += 1
+        try:
+            keys = map_record(line.rstrip('\r\n'))
+        except SkippedRecord as e:
+            stats.skipped[e.counter] += 1
+            continue
+        stats.emitted += len(keys)
+        for key in keys:
+            counts[key] += 1
+
+
+def write_counts(counts, out):
+    """Write key<TAB>count lines"""
+    for key, value in counts.items():
+        out.write(f"{key}\t{value}\n")
+
+
+def stream_map(stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr):
+    """Streaming mapper: CSV lines in, combined key<TAB>count lines out"""
+    counts = Counter()
+    stats = MapperStats()
+    for line in stdin:
+        map_lines((line,), counts, stats)
+        if len(counts) >= COMBINER_MAX_KEYS:
+            write_counts(counts, stdout)
+            counts.clear()
+    write_counts(counts, stdout)
+    for counter in DATA_QUALITY_COUNTERS:
+        if stats.skipped[counter]:
+            stderr.write(f"reporter:counter:DATA_QUALITY,{counter},{stats.skipped[counter]}\n")
+
+
+def stream_reduce(stdin=sys.stdin, stdout=sys.stdout):
+    """Streaming combiner/reducer: sum counts of adjacent (sorted) keys"""
+    current_key = None
+    total = 0
+    for line in stdin:
+        key, _, value = line.rstrip('\r\n').rpartition('\t')
+        if key != current_key:
+            if current_key is not None:
+                stdout.write(f"{current_key}\t{total}\n")
+            current_key = key
+            total = 0
+        total += int(value)
+    if current_key is not None:
+        stdout.write(f"{current_key}\t{total}\n")
+
+
+# === Local multiprocess runner ===
+
+def compute_splits(path, mappers):
+    """Byte ranges [start, end) covering the file, one per mapper"""
+    size = os.path.getsize(path)
+    split_size = max(1, -(-size // max(1, mappers)))
+    return [(start, min(start + split_size, size)) for start in range(0, size, split_size)]
+
+
+def read_split(path, start, end):
+    """Lines owned by a byte range: those that start inside [start, end)"""
+    with open(path, 'rb') as f:
+        if start:
+            # Skip the partial line; it belongs to the previous split
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode('utf-8', errors='replace')
+
+
+def partition(key, reducers):
+    """Stable hash partitioner (Python's str hash is salted per process)"""
+    return zlib.crc32(key.encode('utf-8')) % reducers
+
+
+def map_split(task):
+    """Map one byte range and hash-partition the combined output"""
+    path, start, end, reducers = task
+    counts = Counter()
+    stats = MapperStats()
+    map_lines(read_split(path, start, end), counts, stats)
+    partitions = [{} for _ in range(reducers)]
+    for key, value in counts.items():
+        partitions[partition(key, reducers)][key] = value
+    return partitions, stats.records, stats.malformed, stats.emitted, stats.skipped
+
+
+def reduce_partition(task):
+    """Merge one partition from every mapper and write it as a part file"""
+    output_dir, index, shards = task
+    totals = Counter()
+    for shard in shards:
+        totals.update(shard)
+    path = os.path.join(output_dir, f"part-{index:05d}")
+    with open(path, 'wb') as f:
+        for key in sorted(totals, key=lambda k: k.encode('utf-8')):
+            f.write(f"{key}\t{totals[key]}\n".encode('utf-8'))
+    return path
+
+
+def run_local(input_path, output_dir, mappers=None, reducers=1):
+    """Run map, shuffle and reduce on a local process pool"""
+    mappers = mappers or os.cpu_count() or 1
+    if os.path.exists(output_dir) and os.listdir(output_dir):
+        raise FileExistsError(f"Output directory {output_dir} already exists")
+    os.makedirs(output_dir, exist_ok=True)
+
+    splits = compute_splits(input_path, mappers)
+    start_time = time.perf_counter()
+    with Pool(processes=mappers) as pool:
+        map_results = pool.map(map_split, [(input_path, start, end, reducers) for start, end in splits])
+        map_time = time.perf_counter()
+        shuffled = [(output_dir, r, [result[0][r] for result in map_results]) for r in range(reducers)]
+        part_files = pool.map(reduce_partition, shuffled)
+    end_time = time.perf_counter()
+    open(os.path.join(output_dir, '_SUCCESS'), 'w').close()
+
+    records = sum(result[1] for result in map_results)
+    return {
+        'part_files': part_files,
+        'records': records,
+        'malformed': sum(result[2] for result in map_results),
+        'skipped': sum((result[4] for result in map_results), Counter()),
+        'pairs_without_combiner': sum(result[3] for result in map_results),
+        'pairs_shuffled': sum(len(p) for result in map_results for p in result[0]),
+        'map_seconds': map_time - start_time,
+        'total_seconds': end_time - start_time,
+        'records_per_second': records / (map_time - start_time) if map_time > start_time else 0.0
+    }
+
+
+def benchmark(input_path, max_workers=None):
+    """Map-phase throughput for 1, 2, 4, ... worker processes"""
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    results = []
+    while True:
+        splits = compute_splits(input_path, workers)
+        start_time = time.perf_counter()
+        with Pool(processes=workers) as pool:
+            map_results = pool.map(map_split, [(input_path, s, e, 1) for s, e in splits])
+        elapsed = time.perf_counter() - start_time
+        records = sum(result[1] for result in map_results)
+        results.append((workers, records, elapsed, records / elapsed))
+        if workers >= max_workers:
+            return results
+        workers = min(workers * 2, max_workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Patient demographics job for Hadoop Streaming")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('map', help="streaming mapper (stdin -> stdout)")
+    subparsers.add_parser('reduce', help="streaming combiner/reducer (sorted stdin -> stdout)")
+    run_parser = subparsers.add_parser('run', help="run the whole job on a local process pool")
+    run_parser.add_argument('input', help="plain-text appointment CSV")
+    run_parser.add_argument('output', nargs='?', help="output directory for part files")
+    run_parser.add_argument('--mappers', type=int, default=None, help="map processes (default: CPU count)")
+    run_parser.add_argument('--reducers', type=int, default=1)
+    run_parser.add_argument('--benchmark', action='store_true',
+                            help="measure map throughput against the number of cores instead")
+    args = parser.parse_args(argv)
+
+    if args.command in ('map', 'reduce'):
+        sys.stdin.reconfigure(encoding='utf-8', errors='replace')
+        sys.stdout.reconfigure(encoding='utf-8')
+    if args.command == 'map':
+        stream_map()
+        return 0
+    if args.command == 'reduce':
+        stream_reduce()
+        return 0
+
+    if args.benchmark:
+        print(f"{'Workers':>8} {'Records':>12} {'Seconds':>9} {'Records/s':>12}")
+        for workers, records, elapsed, rate in benchmark(args.input, args.mappers):
+            print(f"{workers:>8} {records:>12,} {elapsed:>9.3f} {rate:>12,.0f}")
+        return 0
+
+    if not args.output:
+        parser.error("run needs an output directory unless --benchmark is given")
+    print("Starting Patient Demographics Analysis Job...")
+    print("Input Path: " + args.input)
+    print("Output Path: " + args.output)
+    stats = run_local(args.input, args.output, args.mappers, args.reducers)
+    print("Job completed successfully!")
+    print(f"Execution Time: {stats['total_seconds'] * 1000:.0f} ms")
+    print(f"Malformed Records: {stats['malformed']}")
+    print("Skipped Records: " + ", ".join(f"{counter} {stats['skipped'][counter]}"
+                                           for counter in DATA_QUALITY_COUNTERS[:-1]))
+    print(f"Shuffle: {stats['pairs_shuffled']:,} combined pairs instead of "
+          f"{stats['pairs_without_combiner']:,} (key, 1) pairs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
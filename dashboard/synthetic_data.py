@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Synthetic Benchmark Data
+zeli8888.ccproject.patient_behavior
+
+Deterministic generators for result files of any key count (mostly
+high-cardinality NEIGHBOURHOOD_* keys) and for appointment CSVs with the
+KaggleV2-May-2016 schema at any row count, written in bounded chunks.
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from key_grammar import format_key
+
+CSV_HEADER = ('PatientId,AppointmentID,Gender,ScheduledDay,AppointmentDay,Age,Neighbourhood,'
+              'Scholarship,Hipertension,Diabetes,Alcoholism,Handcap,SMS_received,No-show\n')
+CSV_CHUNK_ROWS = 1000000
+
+NEIGHBOURHOOD_WORDS = (
+    'JARDIM', 'SANTA', 'SÃO', 'VILA', 'PARQUE', 'ILHA', 'BELA', 'MORADA', 'FORTE', 'ENSEADA',
+    'PENHA', 'CAMBURI', 'VITÓRIA', 'CONSOLAÇÃO', 'MARUÍPE', 'CARATOÍRA', 'HORTO', 'CENTRO',
+    'GOIABEIRAS', 'ANDORINHAS', 'BONFIM', 'ESTRELINHA', 'FRADINHOS', 'GURIGICA', 'MÁRIO', 'JOÃO',
+    'LOURDES', 'CRUZAMENTO', 'REPÚBLICA', 'INHANGUETÁ', 'TABUAZEIRO', 'CONQUISTA', 'ROMÃO', 'SOLON',
+)
+CONNECTORS = ('', 'DA ', 'DO ', 'DE ', 'DOS ', 'DAS ')
+
+
+def neighbourhood_names(count, seed=0):
+    """count distinct upper-case, partly accented neighbourhood names"""
+    rng = np.random.default_rng(seed)
+    words = np.array(NEIGHBOURHOOD_WORDS, dtype=object)
+    connectors = np.array(CONNECTORS, dtype=object)
+    first = words[rng.integers(0, len(words), count)]
+    middle = connectors[rng.integers(0, len(connectors), count)]
+    last = words[rng.integers(0, len(words), count)]
+    names = first + ' ' + middle + last
+    # Suffix a district number once the word combinations run out
+    seen = Counter()
+    unique = []
+    for name in names:
+        seen[name] += 1
+        unique.append(name if seen[name] == 1 else f"{name} {seen[name]}")
+    return unique
+
+
+def make_result_counts(keys, seed=0):
+    """Counter of roughly keys result keys shaped like the real job output"""
+    rng = np.random.default_rng(seed)
+    counts = Counter()
+
+    def add(prefix, category, size):
+        attended = int(size)
+        counts[format_key(prefix, category, 'Attended')] = attended
+        counts[format_key(prefix, category, 'NoShow')] = max(1, int(attended * rng.uniform(0.1, 0.35)))
+
+    for category in ('F', 'M'):
+        add('GENDER_', category, rng.integers(10 ** 4, 10 ** 5))
+    for category in engine.AGE_GROUP_CATEGORIES:
+        add('AGE_GROUP_', category, rng.integers(10 ** 4, 10 ** 5))
+    for start in range(0, 120, 10):
+        add('DETAILED_AGE_', f"{start}-{start + 9}", rng.integers(10, 10 ** 4))
+    for category in ('HYPERTENSION', 'DIABETES', 'ALCOHOLISM', 'HANDICAP', 'HEALTHY',
+                     'MULTIPLE_DISEASES_2', 'MULTIPLE_DISEASES_3', 'MULTIPLE_DISEASES_4'):
+        add('HEALTH_', category, rng.integers(10, 10 ** 4))
+    for category in ('SMS_RECEIVED', 'NO_SMS'):
+        add('SMS_', category, rng.integers(10 ** 4, 10 ** 5))
+    for category in engine.LEAD_TIME_CATEGORIES:
+        add('LEAD_TIME_', category, rng.integers(10 ** 3, 10 ** 4))
+
+    # Zipf-like sizes: a few busy neighbourhoods and a long tail
+    remaining = max(0, (keys - len(counts)) // 2)
+    sizes = np.maximum(1, (5000 / np.arange(1, remaining + 1) ** 0.8)).astype('int64')
+    for name, size in zip(neighbourhood_names(remaining, seed), sizes):
+        add('NEIGHBOURHOOD_', name, size)
+    return counts
+
+
+def write_result_file(path, keys, seed=0):
+    """Write a synthetic result file with about keys keys"""
+    engine.write_results(make_result_counts(keys, seed), path)
+    return path
+
+
+def _time_strings():
+    seconds = np.arange(86400)
+    return np.array([f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in
+                     zip(seconds // 3600, seconds // 60 % 60, seconds % 60)], dtype=object)
+
+
+def csv_chunk(rng, rows, first_id, names, weights, day_strings, time_strings):
+    """One block of KaggleV2-schema CSV text"""
+    scheduled = rng.integers(0, 180, rows)
+    lead = np.minimum(rng.geometric(0.08, rows) - 1, 179)
+    # A handful of the oddities the real file has: impossible ages and negative lead times
+    age = rng.integers(0, 100, rows)
+    age[rng.random(rows) < 1e-4] = -1
+    lead[rng.random(rows) < 5e-5] = -1
+    appointment = np.maximum(scheduled + lead, 0)
+    handicap = np.where(rng.random(rows) < 0.02, rng.integers(1, 5, rows), 0)
+    frame = pd.DataFrame({
+        'PatientId': rng.integers(10 ** 10, 10 ** 15, rows),
+        'AppointmentID': np.arange(first_id, first_id + rows),
+        'Gender': np.where(rng.random(rows) < 0.65, 'F', 'M'),
+        'ScheduledDay': day_strings[scheduled] + 'T' + time_strings[rng.integers(0, 86400, rows)] + 'Z',
+        'AppointmentDay': day_strings[appointment] + 'T00:00:00Z',
+        'Age': age,
+        'Neighbourhood': names[rng.choice(len(names), rows, p=weights)],
+        'Scholarship': (rng.random(rows) < 0.1).astype('int8'),
+        'Hipertension': (rng.random(rows) < 0.2).astype('int8'),
+        'Diabetes': (rng.random(rows) < 0.07).astype('int8'),
+        'Alcoholism': (rng.random(rows) < 0.03).astype('int8'),
+        'Handcap': handicap,
+        'SMS_received': (rng.random(rows) < 0.32).astype('int8'),
+        'No-show': np.where(rng.random(rows) < 0.2, 'Yes', 'No'),
+    })
+    negative = lead < 0
+    if negative.any():
+        frame.loc[negative, 'ScheduledDay'] = day_strings[appointment[negative] + 1] + 'T08:00:00Z'
+    return frame.to_csv(header=False, index=False, lineterminator='\n')
+
+
+def write_csv(path, rows, seed=0, neighbourhoods=81, chunk_rows=CSV_CHUNK_ROWS):
+    """Write a synthetic appointment CSV with rows records"""
+    rng = np.random.default_rng(seed)
+    names = np.array(neighbourhood_names(neighbourhoods, seed), dtype=object)
+    weights = 1 / np.arange(1, neighbourhoods + 1) ** 0.7
+    weights /= weights.sum()
+    day_strings = np.array([str(engine.EPOCH + np.timedelta64(16801 + d, 'D')) for d in range(400)], dtype=object)
+    time_strings = _time_strings()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(CSV_HEADER)
+        for first in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - first)
+            f.write(csv_chunk(rng, n, 5000000 + first, names, weights, day_strings, time_strings))
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    results_parser = subparsers.add_parser('results', help="result file with about --keys keys")
+    results_parser.add_argument('output')
+    results_parser.add_argument('--keys', type=int, default=10 ** 4)
+    results_parser.add_argument('--seed', type=int, default=0)
+    csv_parser = subparsers.add_parser('csv', help="KaggleV2-schema appointment CSV")
+    csv_parser.add_argument('output')
+    csv_parser.add_argument('--rows', type=int, default=10 ** 5)
+    csv_parser.add_argument('--neighbourhoods', type=int, default=81)
+    csv_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    if args.command == 'results':
+        write_result_file(args.output, args.keys, args.seed)
+    else:
+        write_csv(args.output, args.rows, args.seed, args.neighbourhoods)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output):,} bytes)")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
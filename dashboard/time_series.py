@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Daily No-Show Time Series
+zeli8888.ccproject.patient_behavior
+
+Attended and no-show counts per appointment day for every series the
+mapper counts (GENDER_F, NEIGHBOURHOOD_<name>, HEALTH_DIABETES, ...) plus
+all appointments, built in one pass from raw appointments. Counts are kept
+as prefix sums over days, so the totals of any date range cost two lookups
+per series and a date-range filter never rescans records.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import aggregation_engine as engine
+from count_cube import DECADE_LABELS
+from key_grammar import DIMENSIONS, add_rate_statistics, compute_rates, dimension_view, empty_frame, split_keys
+from result_cache import ResultCache
+
+TIME_SERIES_PATH = 'data/time_series.npz'
+RANGE_CACHE_SIZE = 256
+ROLLING_WINDOWS = (7, 28)
+ALL_SERIES = 'ALL_APPOINTMENTS'
+
+# Radix of the day number in the (series, day, status) cell index used while building
+DAY_RADIX = 1 << 20
+
+
+def to_day(date):
+    """Day number (days since 1970-01-01) of a date"""
+    return int((np.datetime64(date, 'D') - engine.EPOCH).astype('int64'))
+
+
+def to_date(day):
+    """datetime.date of a day number"""
+    return (engine.EPOCH + np.timedelta64(int(day), 'D')).item()
+
+
+def record_series(records):
+    """(prefix, categories, mask) for every series a batch of records counts towards
+
+    Categories may be a single label shared by the masked records; mask=None
+    selects every record. Mirrors aggregation_engine.aggregate_records.
+    """
+    age = records['age'].to_numpy().astype('int64')
+    neighbourhood = records['neighbourhood'].to_numpy(dtype=object)
+    diseases = engine.disease_count(records)
+    yield '', ALL_SERIES, None
+    yield 'GENDER_', records['gender'].to_numpy(dtype=object), None
+    yield 'AGE_GROUP_', engine.categorize_age(age), None
+    yield 'DETAILED_AGE_', DECADE_LABELS[age // 10], None
+    yield 'NEIGHBOURHOOD_', neighbourhood, (neighbourhood != '') & (neighbourhood != 'NULL')
+    for flag, condition in (('hypertension', 'HYPERTENSION'), ('diabetes', 'DIABETES'),
+                            ('alcoholism', 'ALCOHOLISM'), ('handicap', 'HANDICAP'),
+                            ('healthy', 'HEALTHY')):
+        yield 'HEALTH_', condition, records[flag].to_numpy()
+    yield 'HEALTH_MULTIPLE_DISEASES_', diseases.astype('int64'), diseases >= 2
+    yield 'SMS_', np.where(records['sms'].to_numpy(), 'SMS_RECEIVED', 'NO_SMS'), None
+    yield 'LEAD_TIME_', engine.categorize_lead_time(records['lead_days'].to_numpy()), None
+
+
+class SeriesBuilder:
+    """Accumulate record batches into sparse (series, day, status) counts"""
+
+    def __init__(self):
+        self.names = {}
+        self.partials = []
+
+    def _codes(self, prefix, categories, mask, n):
+        if isinstance(categories, str):
+            return np.full(n if mask is None else int(mask.sum()), self.names.setdefault(prefix + categories,
+                                                                                      len(self.names)))
+        if mask is not None:
+            categories = categories[mask]
+        codes, uniques = pd.factorize(categories)
+        lookup = np.array([self.names.setdefault(prefix + str(u), len(self.names)) for u in uniques],
+                          dtype='int64')
+        return lookup[codes] if len(lookup) else codes.astype('int64')
+
+    def add(self, records):
+        """Fold one batch of records (aggregation_engine / columnar store schema)"""
+        n = len(records)
+        day = records['appointment_day'].to_numpy().astype('int64')
+        noshow = records['noshow'].to_numpy().astype('int64')
+        for prefix, categories, mask in record_series(records):
+            codes = self._codes(prefix, categories, mask, n)
+            days = day if mask is None else day[mask]
+            status = noshow if mask is None else noshow[mask]
+            cells, counts = np.unique((codes * DAY_RADIX + days) * 2 + status, return_counts=True)
+            self.partials.append((cells, counts))
+
+    def add_series(self, series):
+        """Fold the per-day counts of an existing DailySeries, remapping its series names"""
+        codes = np.array([self.names.setdefault(name, len(self.names)) for name in series.names], dtype='int64')
+        for status, cumulative in enumerate((series.attended, series.noshow)):
+            daily = np.diff(cumulative, axis=1)
+            rows, days = np.nonzero(daily)
+            self.partials.append(((codes[rows] * DAY_RADIX + series.first_day + days) * 2 + status,
+                                  daily[rows, days]))
+
+    def build(self):
+        """Merge partial counts into dense per-day prefix sums"""
+        names = list(self.names)
+        if not self.partials:
+            empty = np.zeros((len(names), 1), dtype='int64')
+            return DailySeries(0, names, empty, empty.copy())
+        cells = np.concatenate([p[0] for p in self.partials])
+        weights = np.concatenate([p[1] for p in self.partials])
+        cells, inverse = np.unique(cells, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights).astype('int64')
+        status = cells % 2
+        day = cells // 2 % DAY_RADIX
+        series = cells // 2 // DAY_RADIX
+        first_day = int(day.min())
+        days = int(day.max()) - first_day + 1
+        daily = np.zeros((2, len(names), days), dtype='int64')
+        daily[status, series, day - first_day] = counts
+        # Column j holds the total of the first j days
+        cumulative = np.zeros((2, len(names), days + 1), dtype='int64')
+        np.cumsum(daily, axis=2, out=cumulative[:, :, 1:])
+        return DailySeries(first_day, names, cumulative[0], cumulative[1])
+
+
+class DailySeries:
+    """Immutable per-day prefix sums of attended and no-show counts per series"""
+
+    def __init__(self, first_day, names, attended, noshow):
+        self.first_day = int(first_day)
+        self.names = list(names)
+        self.attended = attended
+        self.noshow = noshow
+        for array in (attended, noshow):
+            array.flags.writeable = False
+        self.index = {name: i for i, name in enumerate(self.names)}
+        # Series that map onto an analysis dimension, e.g. GENDER_F -> (gender, F)
+        positions, dimensions, categories, _ = split_keys([name + '_Attended' for name in self.names])
+        self._positions = positions
+        self._dimensions = pd.Categorical(dimensions, categories=DIMENSIONS)
+        self._categories = np.array(categories, dtype=object)
+        self.frame = lru_cache(maxsize=RANGE_CACHE_SIZE)(self._frame)
+        self.views = lru_cache(maxsize=RANGE_CACHE_SIZE)(self._views)
+
+    @classmethod
+    def from_records(cls, records):
+        builder = SeriesBuilder()
+        builder.add(records)
+        return builder.build()
+
+    @property
+    def days(self):
+        return self.attended.shape[1] - 1
+
+    @property
+    def last_day(self):
+        return self.first_day + self.days - 1
+
+    @property
+    def dates(self):
+        """Calendar date of every day in the series"""
+        return engine.EPOCH + np.arange(self.first_day, self.first_day + self.days).astype('timedelta64[D]')
+
+    def _bounds(self, first_day=None, last_day=None):
+        """Prefix-sum columns (start, stop) for an inclusive day range, clipped to the data"""
+        start = 0 if first_day is None else min(max(int(first_day) - self.first_day, 0), self.days)
+        stop = self.days if last_day is None else min(max(int(last_day) - self.first_day + 1, start), self.days)
+        return start, stop
+
+    def totals(self, first_day=None, last_day=None):
+        """(attended, noshow) of every series over the inclusive day range"""
+        start, stop = self._bounds(first_day, last_day)
+        return (self.attended[:, stop] - self.attended[:, start],
+                self.noshow[:, stop] - self.noshow[:, start])
+
+    def _frame(self, first_day=None, last_day=None):
+        """Tidy (dimension, category, ...) frame for the day range"""
+        attended, noshow = self.totals(first_day, last_day)
+        attended, noshow = attended[self._positions], noshow[self._positions]
+        keep = (attended + noshow) > 0
+        if not keep.any():
+            return empty_frame()
+        frame = pd.DataFrame({
+            'dimension': self._dimensions[keep],
+            'category': pd.Categorical(self._categories[keep]),
+            'attended': attended[keep],
+            'noshow': noshow[keep]
+        })
+        return add_rate_statistics(frame)
+
+    def _views(self, first_day=None, last_day=None):
+        """Display frames for every dimension over the day range"""
+        frame = self.frame(first_day, last_day)
+        return {dimension: dimension_view(frame, dimension) for dimension in DIMENSIONS}
+
+    def daily(self, name, windows=ROLLING_WINDOWS):
+        """Per-day counts and no-show rates of one series, plus trailing-window rates"""
+        i = self.index[name]
+        attended, noshow = self.attended[i], self.noshow[i]
+        frame = pd.DataFrame({
+            'Date': self.dates,
+            'Appointments_Attended': np.diff(attended),
+            'No_Shows': np.diff(noshow),
+        })
+        _, frame['No_Show_Rate'] = compute_rates(frame['Appointments_Attended'], frame['No_Shows'])
+        stop = np.arange(1, self.days + 1)
+        for window in windows:
+            start = np.maximum(stop - window, 0)
+            _, frame[f"Rate_{window}d"] = compute_rates(attended[stop] - attended[start],
+                                                        noshow[stop] - noshow[start])
+        return frame
+
+    def cache_info(self):
+        return self.frame.cache_info()
+
+    def save(self, path=TIME_SERIES_PATH):
+        """Write the prefix sums as a compressed .npz (atomically)"""
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, attended=self.attended, noshow=self.noshow,
+                            first_day=np.array(self.first_day),
+                            names=np.array(json.dumps(self.names, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=TIME_SERIES_PATH):
+        with np.load(path) as data:
+            return cls(int(data['first_day']), json.loads(str(data['names'])), data['attended'], data['noshow'])
+
+
+def load_time_series(file_path, version=None):
+    """ResultCache loader for time series files"""
+    return DailySeries.load(file_path)
+
+
+_shared_time_series_cache = ResultCache(loader=load_time_series)
+
+
+def get_time_series_cache():
+    """Return the time series cache shared by every session in this process"""
+    return _shared_time_series_cache
+
+
+def build_time_series(input_path=engine.ARCHIVE_PATH, chunk_size=engine.DEFAULT_CHUNK_SIZE,
+                      member=engine.CSV_MEMBER):
+    """Build the daily series from a columnar store directory or the raw CSV/zip"""
+    builder = SeriesBuilder()
+    if os.path.isdir(input_path):
+        from columnar_store import ColumnarStore
+        builder.add(ColumnarStore(input_path).records())
+    else:
+        with engine.open_appointments(input_path, member) as stream:
+            for text in engine.iter_text_chunks(stream, chunk_size):
+                records, _ = engine.parse_chunk(text)
+                builder.add(records)
+    return builder.build()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the daily no-show time series")
+    parser.add_argument('--input', default=engine.ARCHIVE_PATH,
+                        help="appointment CSV, zip archive or columnar store directory")
+    parser.add_argument('--member', default=engine.CSV_MEMBER)
+    parser.add_argument('--output', default=TIME_SERIES_PATH)
+    parser.add_argument('--chunk-size', type=int, default=engine.DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    series = build_time_series(args.input, args.chunk_size, args.member)
+    series.save(args.output)
+    print(f"{len(series.names):,} series over {series.days:,} days "
+          f"({series.dates[0]} to {series.dates[-1]}) written to {args.output}")
+    print(f"Execution Time: {(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())